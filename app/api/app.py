@@ -1,4 +1,4 @@
-# app/api/main.py
+# app/api/app.py
 # -*- coding: utf-8 -*-
 """
 AI Server main entry (FastAPI)
@@ -20,60 +20,112 @@ AI Server main entry (FastAPI)
 
 from __future__ import annotations
 
+import asyncio
 import os
-import sys
+import secrets
+import threading
+from contextlib import asynccontextmanager
+from functools import partial
 from typing import Any, Dict, List, Optional
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse, Response
+import anyio
+from cachetools import TTLCache
+from fastapi import FastAPI, UploadFile, File, Header, HTTPException
+from fastapi.responses import ORJSONResponse, Response
 from pydantic import BaseModel, HttpUrl
 
-# 패키지 루트 인식용 (app/ 기준)
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 # --- 내부 모듈 import ---
 from ..utils.image_io import load_image_bgr_from_bytes
+from ..utils.result_cache import content_key, get_cached, set_cached, clear_cache
 from ..classifiers import face as face_mod
 from ..classifiers import body as body_mod
 from ..classifiers import skin as skin_mod
+from ..classifiers import _detectors
+from ..classifiers._detectors import detect_face_landmarks
 
-from ..services.clothes_analyzer import analyze_clothes_from_url
-from ..services.outfit_analyzer import analyze_outfit_with_gpt
-from ..services.url_analyzer import analyze_image_from_url
-from ..services.image_searcher import search_reference_images
-from ..services.outfit_embedding import style_vec_from_dict
-from ..services.quick_web_outfit import quick_outfit_from_web
-from ..services.appearance_gpt import analyze_image_from_url_gpt
+from ..services.clothes_analyzer import analyze_clothes_from_url, clear_clothes_cache
 from ..services.feature_builder import build_feature_vector
+from ..services.outfit_analyzer import analyze_outfit_with_gpt_async, clear_image_cache, clear_outfit_cache
+from ..services.url_analyzer import analyze_image_from_url, clear_url_cache
+from ..services.url_loader import clear_http_cache
+from ..services.image_searcher import search_reference_images_async, clear_search_cache
+from ..services.outfit_embedding import style_vec_from_dicts
+from ..services.quick_web_outfit import quick_outfit_from_web, clear_select_cache
+from ..services.appearance_gpt import analyze_image_from_url_gpt
 
 
 from ..api.dto import UserAnalysisDTO, UserAnalyzeResponse, ClothesAnalyzeRequest, ClothesAnalyzeResponse, GarmentDTO, LookDTO, StyleAnalyzeResponse, StyleAnalyzeRequest
 
-# feature_builder가 아직 없을 수 있으니 fallback 제공
-try:
-    from ..services.feature_builder import build_feature_vector
-except ImportError:
-    def build_feature_vector(face_res: Dict[str, Any],
-                             body_res: Dict[str, Any],
-                             skin_res: Dict[str, Any]) -> List[float]:
-        """
-        임시 fallback: face/body/skin 문자열을 해시해서 간단한 3D 벡터 생성.
-        나중에 실제 feature_builder 구현하면 이 함수는 자동으로 대체됨.
-        """
-        def _h(s: str) -> float:
-            return (hash(s) % 1000) / 1000.0
-
-        return [
-            _h(face_res.get("face_shape", "unknown")),
-            _h(body_res.get("body_shape", "unknown")),
-            _h(skin_res.get("skin_tone", "unknown")),
-        ]
+
+# 업로드 이미지 최대 크기 (초과 시 413)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+
+# (얼굴 URL, 전신 URL) → GPT 분석 결과 캐시
+# - 같은 URL 에 프로필 사진을 다시 올리는 경우가 있어서 url_analyzer 의 URL 캐시처럼 TTL 로 만료 (기본 5분)
+USER_URL_GPT_CACHE_SIZE = int(os.getenv("USER_URL_GPT_CACHE_SIZE", "256"))
+USER_URL_GPT_CACHE_TTL = float(os.getenv("USER_URL_GPT_CACHE_TTL", "300"))
+
+_user_url_gpt_cache: TTLCache = TTLCache(maxsize=USER_URL_GPT_CACHE_SIZE, ttl=USER_URL_GPT_CACHE_TTL)
+_user_url_gpt_cache_lock = threading.Lock()
+
+
+# /cache/invalidate 관리용 토큰
+# - 캐시를 비우면 다음 요청부터 OpenAI / SerpAPI 유료 호출이 다시 나가므로 아무나 부르지 못하게 막음
+# - 비어 있으면 엔드포인트 비활성 (404), 설정하면 X-Admin-Token 헤더가 일치할 때만 허용
+CACHE_ADMIN_TOKEN = os.getenv("CACHE_ADMIN_TOKEN", "")
+
+
+def clear_user_url_gpt_cache() -> int:
+    """URL GPT 분석 결과 캐시 전체 삭제. 삭제된 항목 수 반환."""
+    with _user_url_gpt_cache_lock:
+        n = len(_user_url_gpt_cache)
+        _user_url_gpt_cache.clear()
+    return n
+
+
+async def _read_upload(upload: UploadFile) -> bytes:
+    """
+    UploadFile → bytes.
+    - 크기를 알면 읽기 전에 413, 모르면 MAX_UPLOAD_BYTES+1 까지만 읽어서 판정
+      (큰 업로드를 통째로 메모리에 올리지 않도록)
+    """
+    if upload.size is not None and upload.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Uploaded image is too large.")
+    data = await upload.read(MAX_UPLOAD_BYTES + 1)
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Uploaded image is too large.")
+    return data
+
+
+def _classify_face_and_skin(bgr):
+    """같은 얼굴 사진에 대해 FaceMesh 는 한 번만 돌리고 face/skin 이 결과를 공유."""
+    faces = detect_face_landmarks(bgr)
+    face_res, _ = face_mod.classify(bgr, landmarks=faces)
+    skin_res, _ = skin_mod.classify(bgr, landmarks=faces)
+    return face_res, skin_res
+
+
+def _warmup_models() -> None:
+    """MediaPipe 풀 인스턴스마다 첫 process() 를 미리 실행 (그래프 지연 초기화)."""
+    _detectors.warmup()   # face / skin 공용 FaceMesh
+    body_mod.warmup()     # Pose + segmentation
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 첫 요청이 모델 초기화 비용을 떠안지 않도록 서버 시작 시점에 워밍업
+    # (여기서 실패하면 서버가 뜨지 않으므로 배포 환경에서 바로 드러남)
+    await anyio.to_thread.run_sync(_warmup_models)
+    print("[startup] MediaPipe models warmed up")
+    yield
 
 
 app = FastAPI(
     title="Style Pipeline AI Server",
     version="1.0.0",
     description="User/Celeb analysis + Clothes/Style analysis",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,  # 중첩 DTO(벡터 리스트) 직렬화를 orjson으로
 )
 
 # ======================================================
@@ -94,15 +146,26 @@ async def analyze_user_photo_multi(
     최종적으로 face/body/skin + vector 를 한 번에 리턴.
     """
 
-    # 1) 얼굴/피부용 이미지 로드
-    face_bgr = load_image_bgr_from_bytes(await face_image.read())
-    face_res, _ = face_mod.classify(face_bgr, return_debug=False)
-    # 피부톤도 얼굴 위주 샷에서 뽑는 게 자연스럽다면:
-    skin_res, _ = skin_mod.classify(face_bgr, return_debug=False)
-
-    # 2) 체형용 이미지 로드
-    body_bgr = load_image_bgr_from_bytes(await body_image.read())
-    body_res, _ = body_mod.classify(body_bgr, return_debug=False)
+    # 1) 얼굴/피부용, 체형용 이미지 로드
+    face_bytes, body_bytes = await asyncio.gather(_read_upload(face_image), _read_upload(body_image))
+
+    # 같은 사진 조합이면 캐시된 결과 그대로 반환
+    cache_key = content_key(face_bytes, body_bytes)
+    cached = get_cached("user_photo", cache_key)
+    if cached is not None:
+        return cached
+
+    face_bgr = load_image_bgr_from_bytes(face_bytes)
+    body_bgr = load_image_bgr_from_bytes(body_bytes)
+    del face_bytes, body_bytes  # 디코딩 끝난 원본 bytes는 MediaPipe 돌기 전에 해제
+
+    # 2) face/skin 과 body 분류는 서로 독립이라 threadpool 에서 동시에 실행
+    #    (MediaPipe 추론은 CPU-bound 라서 event loop 블로킹 방지)
+    #    피부톤도 얼굴 위주 샷에서 뽑는 게 자연스러우므로 face_bgr 사용
+    (face_res, skin_res), (body_res, _) = await asyncio.gather(
+        anyio.to_thread.run_sync(_classify_face_and_skin, face_bgr),
+        anyio.to_thread.run_sync(body_mod.classify, body_bgr),
+    )
 
     # 3) 공통 feature vector 생성 (기존 build_feature_vector 재사용)
     vec = build_feature_vector(face_res, body_res, skin_res)
@@ -116,7 +179,9 @@ async def analyze_user_photo_multi(
         vector=vec,
     )
 
-    return UserAnalyzeResponse(analysis=analysis)
+    resp = UserAnalyzeResponse(analysis=analysis)
+    set_cached("user_photo", cache_key, resp)
+    return resp
 
 class AnalyzeUserUrlMultiRequest(BaseModel):
     face_image_url: str
@@ -124,15 +189,20 @@ class AnalyzeUserUrlMultiRequest(BaseModel):
 
 @app.post("/user/analyze-url-multi", response_model=UserAnalyzeResponse)
 async def analyze_user_url_multi(payload: AnalyzeUserUrlMultiRequest):
+    # 얼굴/전신 URL 다운로드 + 분석을 threadpool 에서 동시에 실행
+    # (URL 별 결과는 analyze_image_from_url 안의 TTL 캐시가 재사용)
+    face_data, body_data = await asyncio.gather(
+        anyio.to_thread.run_sync(analyze_image_from_url, payload.face_image_url),
+        anyio.to_thread.run_sync(analyze_image_from_url, payload.body_image_url),
+    )
+
     # 1) 얼굴/피부
-    face_data = analyze_image_from_url(payload.face_image_url)
     # 여기선 face_data 안에 face/body/skin 다 있지만,
     # 얼굴샷이니까 face/skin만 쓰고 body는 무시해도 됨
     face_res = face_data["face"]
     skin_res = face_data["skin"]
 
     # 2) 전신
-    body_data = analyze_image_from_url(payload.body_image_url)
     body_res = body_data["body"]
 
     # 3) vector 생성
@@ -165,7 +235,8 @@ async def ai_clothes_analyze(payload: ClothesAnalyzeRequest):
       3) 여기서 받은 결과(category~vector)를
          /clothes/<id>/analysis/ 에 Body로 그대로 저장
     """
-    raw = analyze_clothes_from_url(
+    # 같은 이미지 URL(+상품명 힌트)은 analyze_clothes_from_url 내부 캐시에서 바로 반환
+    raw = await analyze_clothes_from_url(
         image_url=str(payload.image_url),
         name_hint=payload.name,
     )
@@ -195,8 +266,10 @@ async def ai_style_analyze(payload: StyleAnalyzeRequest):
     3) garment 항목마다 임베딩 벡터 생성
     """
 
-    # 1) 이미지 검색
-    search_items = search_reference_images(
+    # 1) 이미지 검색 (provider 들을 동시에 호출, event loop 블로킹 없음)
+    #   분석 대상은 전체 provider 결과를 필터/중복 제거/랭킹한 뒤의 상위 N개
+    #   (provider 응답 순서에 따라 분석 이미지가 달라지는 스트리밍 경로는 벤치마크(outfit_benchmark)에서만 사용)
+    search_items = await search_reference_images_async(
         celeb_name=payload.celeb_name,
         needs=payload.needs,
         max_results=payload.max_results,
@@ -212,19 +285,20 @@ async def ai_style_analyze(payload: StyleAnalyzeRequest):
             summary="검색된 이미지 없음",
         )
 
-    # 2) GPT Vision 분석
-    outfit_json = analyze_outfit_with_gpt(image_urls) # 첫 번째 레퍼런스만 분석하게 변경
+    # 2) GPT Vision 분석 (이미지마다 1번씩, 동시에 호출 → 입력 순서대로 looks 연결)
+    outfit_json = await analyze_outfit_with_gpt_async(image_urls)
+    looks: List[Dict[str, Any]] = outfit_json["looks"]
+    summary = outfit_json["summary"] if looks else ""
 
-    looks = outfit_json.get("looks", []) or []
-    summary = outfit_json.get("summary", "")
+    # 3) 벡터 추가 (전체 garment 벡터를 한 번에 생성)
+    all_garments = [g for l in looks for g in l.get("garments", [])]
+    vecs = iter(style_vec_from_dicts(all_garments).tolist())
 
-    # 3) 벡터 추가
     final_looks: List[LookDTO] = []
-    for idx, l in enumerate(looks):
+    for l in looks:
         garments = []
         for g in l.get("garments", []):
-            # 벡터 생성
-            vec = style_vec_from_dict(g)
+            vec = next(vecs)
 
             garments.append(
                 GarmentDTO(
@@ -241,7 +315,7 @@ async def ai_style_analyze(payload: StyleAnalyzeRequest):
 
         final_looks.append(
             LookDTO(
-                image_url=image_urls[idx] if idx < len(image_urls) else "",
+                image_url=l.get("image_url") or "",
                 overall_style=l.get("overall_style"),
                 garments=garments,
             )
@@ -256,9 +330,6 @@ async def ai_style_analyze(payload: StyleAnalyzeRequest):
     
 
 
-# ======================================================
-# 디버깅용 기존 API (원하면 그대로 유지)
-# ======================================================
 # ======================================================
 # 4) POST /ai/style/analyze/quick
 #    quick_web_outfit 파이프라인 (web_search + vision 통합)
@@ -273,10 +344,12 @@ async def ai_style_analyze_quick(payload: StyleAnalyzeRequest):
     """
 
     # 1) quick_web_outfit 호출 (연예인 + 니즈 기반)
-    raw = quick_outfit_from_web(
-        celeb_name=payload.celeb_name,
+    #    web_search + Vision 까지 수십 초 걸리는 blocking 호출이라 threadpool 에서 실행 (event loop 블로킹 방지)
+    raw = await anyio.to_thread.run_sync(partial(
+        quick_outfit_from_web,
+        celeb=payload.celeb_name,
         needs=payload.needs,
-    )
+    ))
     # raw 예:
     # {
     #   "looks": [
@@ -291,13 +364,20 @@ async def ai_style_analyze_quick(payload: StyleAnalyzeRequest):
     #   "summary": "..."
     # }
 
-    # 2) needs 기준으로 "가장 잘 맞는 look 1개"만 선택
-    looks = raw.get("looks") or [][:0] # 1개만 보여주게 함 나중에[:#] 여기 수정가능
+    # 2) needs 기준으로 "가장 잘 맞는 look" 만 선택
+    #    looks 는 needs 로 검색·선정된 이미지 순서이므로 앞에서부터 max_returned_looks 개
+    #    (잘라낸 뒤에 벡터를 만들어서 버려질 garment 의 벡터 계산을 하지 않음)
+    max_looks = payload.max_returned_looks
+    looks = (raw.get("looks") or [])[:max_looks]
     summary = raw.get("summary", "")
 
     final_looks: List[LookDTO] = []
     input_images: List[str] = []
 
+    # 전체 garment 벡터를 한 번에 생성
+    all_garments = [g for look in looks for g in look.get("garments", []) or []]
+    vecs = iter(style_vec_from_dicts(all_garments).tolist())
+
     for look in looks:
         img_url = look.get("image_url") or ""
         if img_url:
@@ -305,7 +385,7 @@ async def ai_style_analyze_quick(payload: StyleAnalyzeRequest):
 
         garments: List[GarmentDTO] = []
         for g in look.get("garments", []) or []:
-            vec = style_vec_from_dict(g)
+            vec = next(vecs)
 
             garments.append(
                 GarmentDTO(
@@ -343,9 +423,19 @@ async def analyze_user_url_multi_gpt(payload: AnalyzeUserUrlMultiRequest):
       - body_image_url → body_shape
       - build_feature_vector 로 3개 합쳐서 vector 생성
     """
+    cache_key = (payload.face_image_url, payload.body_image_url)
+    with _user_url_gpt_cache_lock:
+        cached = _user_url_gpt_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # 두 GPT 호출은 서로 독립이라 threadpool 에서 동시에 실행
+    face_data, body_data = await asyncio.gather(
+        anyio.to_thread.run_sync(analyze_image_from_url_gpt, payload.face_image_url),
+        anyio.to_thread.run_sync(analyze_image_from_url_gpt, payload.body_image_url),
+    )
 
     # 1) 얼굴/피부 (얼굴 위주 샷이니까 body는 무시해도 됨)
-    face_data = analyze_image_from_url_gpt(payload.face_image_url)
     if not face_data:
         raise HTTPException(status_code=400, detail="Failed to analyze face image with GPT.")
 
@@ -353,7 +443,6 @@ async def analyze_user_url_multi_gpt(payload: AnalyzeUserUrlMultiRequest):
     skin_res = face_data["skin"]
 
     # 2) 전신 (body_shape만 사용)
-    body_data = analyze_image_from_url_gpt(payload.body_image_url)
     if not body_data:
         raise HTTPException(status_code=400, detail="Failed to analyze body image with GPT.")
 
@@ -371,46 +460,85 @@ async def analyze_user_url_multi_gpt(payload: AnalyzeUserUrlMultiRequest):
         vector=vec,
     )
 
-    return UserAnalyzeResponse(analysis=analysis)
+    resp = UserAnalyzeResponse(analysis=analysis)
+    with _user_url_gpt_cache_lock:
+        _user_url_gpt_cache[cache_key] = resp
+    return resp
 
 
+# ======================================================
+# 디버깅용 기존 API (원하면 그대로 유지)
+# ======================================================
 @app.post("/face")
 async def api_face(image: UploadFile = File(...)):
-    bgr = load_image_bgr_from_bytes(await image.read())
-    res, _ = face_mod.classify_face_shape(bgr, return_debug=False)
-    return JSONResponse(res)
+    data = await _read_upload(image)
+    cache_key = content_key(data)
+    res = get_cached("face", cache_key)
+    if res is None:
+        bgr = load_image_bgr_from_bytes(data)
+        del data
+        res, _ = await anyio.to_thread.run_sync(face_mod.classify, bgr)
+        set_cached("face", cache_key, res)
+    return ORJSONResponse(res)
 
 
 @app.post("/body")
 async def api_body(image: UploadFile = File(...)):
-    bgr = load_image_bgr_from_bytes(await image.read())
-    res, _ = body_mod.classify_body_shape(bgr, return_debug=False)
-    return JSONResponse(res)
+    data = await _read_upload(image)
+    cache_key = content_key(data)
+    res = get_cached("body", cache_key)
+    if res is None:
+        bgr = load_image_bgr_from_bytes(data)
+        del data
+        res, _ = await anyio.to_thread.run_sync(body_mod.classify, bgr)
+        set_cached("body", cache_key, res)
+    return ORJSONResponse(res)
 
 
 @app.post("/skin")
 async def api_skin(image: UploadFile = File(...)):
-    bgr = load_image_bgr_from_bytes(await image.read())
-    res, _ = skin_mod.classify_skin_tone(bgr, return_debug=False)
-    return JSONResponse(res)
+    data = await _read_upload(image)
+    cache_key = content_key(data)
+    res = get_cached("skin", cache_key)
+    if res is None:
+        bgr = load_image_bgr_from_bytes(data)
+        del data
+        res, _ = await anyio.to_thread.run_sync(skin_mod.classify, bgr)
+        set_cached("skin", cache_key, res)
+    return ORJSONResponse(res)
+
+
+@app.post("/cache/invalidate")
+async def cache_invalidate(x_admin_token: Optional[str] = Header(None)):
+    """
+    분석 결과 / URL 분석 / URL GPT 분석 / URL 이미지 / 의류 분석 / 이미지 검색 / 코디 이미지 / 코디 분석 / 웹 이미지 선정 캐시 전체 삭제 (관리/디버깅용)
+    CACHE_ADMIN_TOKEN 이 설정돼 있고 X-Admin-Token 헤더가 일치할 때만 동작.
+    """
+    if not CACHE_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token.encode(), CACHE_ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+    return {"cleared": (clear_cache() + clear_url_cache() + clear_user_url_gpt_cache() + clear_http_cache() + clear_clothes_cache()
+                        + clear_search_cache() + clear_image_cache() + clear_outfit_cache()
+                        + clear_select_cache())}
 
 
 @app.post("/face/overlay")
 async def face_overlay(image: UploadFile = File(...)):
-    bgr = load_image_bgr_from_bytes(await image.read())
-    _, dbg = face_mod.classify_face_shape(bgr, return_debug=True)
+    bgr = load_image_bgr_from_bytes(await _read_upload(image))
+    _, dbg = await anyio.to_thread.run_sync(partial(face_mod.classify, bgr, return_debug=True))
     return Response(content=dbg, media_type="image/png")
 
 
 @app.post("/body/overlay")
 async def body_overlay(image: UploadFile = File(...)):
-    bgr = load_image_bgr_from_bytes(await image.read())
-    _, dbg = body_mod.classify_body_shape(bgr, return_debug=True)
+    bgr = load_image_bgr_from_bytes(await _read_upload(image))
+    _, dbg = await anyio.to_thread.run_sync(partial(body_mod.classify, bgr, return_debug=True))
     return Response(content=dbg, media_type="image/png")
 
 
 @app.post("/skin/overlay")
 async def skin_overlay(image: UploadFile = File(...)):
-    bgr = load_image_bgr_from_bytes(await image.read())
-    _, dbg = skin_mod.classify_skin_tone(bgr, return_debug=True)
+    bgr = load_image_bgr_from_bytes(await _read_upload(image))
+    _, dbg = await anyio.to_thread.run_sync(partial(skin_mod.classify, bgr, return_debug=True))
     return Response(content=dbg, media_type="image/png")
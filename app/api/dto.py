@@ -1,8 +1,46 @@
 # app/api/dto.py
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-from typing import Optional, List, Dict, Any
-from pydantic import BaseModel
+from typing import Annotated, Optional, List, Dict, Any
+
+import numpy as np
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field
+
+__all__ = [
+    "Vector",
+    "UserBriefDTO",
+    "OnboardingDTO",
+    "UserAnalysisDTO",
+    "CelebrityDTO",
+    "ReferenceImageDTO",
+    "ReferenceDTO",
+    "UserAnalyzeResponse",
+    "StyleProfileRequest",
+    "StyleProfileResponse",
+    "ClothesAnalyzeRequest",
+    "ClothesAnalyzeResponse",
+    "StyleAnalyzeRequest",
+    "GarmentDTO",
+    "LookDTO",
+    "StyleAnalyzeResponse",
+]
+
+
+def _vector_to_list(v: Any) -> Any:
+    # np.ndarray 는 tolist() 한 번으로 변환 (pydantic 이 numpy scalar 를 하나씩 검증하지 않도록)
+    return v.tolist() if isinstance(v, np.ndarray) else v
+
+
+# feature / style 벡터 필드: list 또는 1D np.ndarray 를 받아 List[float] 로 저장
+Vector = Annotated[List[float], BeforeValidator(_vector_to_list)]
+
+# 요청마다 많이 만들어지는 응답용 DTO 설정: 생성 후 변경 불가 + 정의 안 된 필드 거부
+# (오타 난 필드명이 조용히 무시되거나 만든 뒤 값이 바뀌는 실수를 막음)
+_FROZEN = ConfigDict(frozen=True, extra="forbid")
+
+# 캐시(result_cache / URL GPT 캐시)에 저장돼 여러 요청이 같은 객체를 공유하는 DTO: 변경 불가
+# (UserAnalysisDTO 는 StyleProfileRequest 의 입력으로도 받으므로 백엔드가 보내는 추가 필드는 허용)
+_SHARED = ConfigDict(frozen=True)
 
 
 # ============================================
@@ -42,12 +80,14 @@ class UserAnalysisDTO(BaseModel):
     UserAnalysis (유저 사진 분석 결과)
     - backend가 저장 → 나중에 다시 /style/profile 호출 시 전달받음
     """
+    model_config = _SHARED
+
     id: Optional[int] = None
     user_id: Optional[int] = None
     face_shape: str
     body_shape: str
     skin_tone: str
-    vector: List[float]
+    vector: Vector
 
 
 # ============================================
@@ -59,7 +99,7 @@ class CelebrityDTO(BaseModel):
     name: str
     gender: Optional[str] = None
     image_url: Optional[str] = None
-    vector: Optional[List[float]] = None  # 연예인 feature vector
+    vector: Optional[Vector] = None  # 연예인 feature vector
 
 
 # ============================================
@@ -67,6 +107,8 @@ class CelebrityDTO(BaseModel):
 # ============================================
 
 class ReferenceImageDTO(BaseModel):
+    model_config = _FROZEN
+
     image: str
     thumb: Optional[str] = None
     page: Optional[str] = None
@@ -88,6 +130,8 @@ class ReferenceDTO(BaseModel):
 # ============================================
 
 class UserAnalyzeResponse(BaseModel):
+    model_config = _SHARED
+
     analysis: UserAnalysisDTO
 
 
@@ -122,6 +166,8 @@ class ClothesAnalyzeRequest(BaseModel):
 
 
 class ClothesAnalyzeResponse(BaseModel):
+    model_config = _FROZEN
+
     clothes_id: int
     category: str
     sub_category: str
@@ -129,7 +175,7 @@ class ClothesAnalyzeResponse(BaseModel):
     color: str
     fit: str
     season: str
-    vector: List[float]
+    vector: Vector
 
 
 # ============================================
@@ -141,9 +187,12 @@ class StyleAnalyzeRequest(BaseModel):
     needs: List[str]
     max_results: Optional[int] = 12
     max_analyze_images: Optional[int] = 6
+    max_returned_looks: int = Field(1, ge=1)  # /ai/style/analyze/quick 에서 돌려줄 look 개수 (0 이하 / null 은 422)
 
 
 class GarmentDTO(BaseModel):
+    model_config = _FROZEN
+
     name: str
     category: str
     sub_category: Optional[str] = None
@@ -151,10 +200,12 @@ class GarmentDTO(BaseModel):
     color: Optional[str] = None
     fit: Optional[str] = None
     season: Optional[str] = None
-    vector: Optional[List[float]] = None
+    vector: Optional[Vector] = None
 
 
 class LookDTO(BaseModel):
+    model_config = _FROZEN
+
     image_url: str
     overall_style: Optional[str] = None
     garments: List[GarmentDTO]
@@ -0,0 +1,46 @@
+# app/classifiers/_detectors.py
+# -*- coding: utf-8 -*-
+"""
+face / skin classifier 가 공통으로 쓰는 FaceMesh 검출.
+
+- 두 classifier 는 같은 설정(refine_landmarks, max_num_faces=1)의 FaceMesh 를 쓰므로
+  한 이미지에 대해 검출을 한 번만 하고 결과를 둘 다에 넘겨줄 수 있다.
+  (classify(bgr, landmarks=detect_face_landmarks(bgr)))
+- landmarks 는 정규화 좌표(0~1)라서 축소본에서 검출해도 원본 w/h 를 곱해 그대로 사용.
+"""
+from __future__ import annotations
+
+from typing import Any, List
+
+import numpy as np
+import mediapipe as mp
+
+from ..utils.image_io import to_rgb_for_inference
+from ..utils.model_pool import ModelPool
+
+mp_face_mesh = mp.solutions.face_mesh
+
+# FaceMesh 그래프는 import 시 풀로 만들어 두고 face/skin 이 같이 재사용
+_MESH_POOL = ModelPool(lambda: mp_face_mesh.FaceMesh(
+    static_image_mode=True,
+    refine_landmarks=True,
+    max_num_faces=1,
+    min_detection_confidence=0.5
+))
+
+
+def detect_face_landmarks(bgr: np.ndarray) -> List[Any]:
+    """
+    FaceMesh 1회 실행 → multi_face_landmarks 리스트.
+    얼굴이 없으면 빈 리스트 (None 은 "아직 검출 안 함" 의미로 classifier 쪽에서 사용)
+    """
+    rgb = to_rgb_for_inference(bgr)
+    with _MESH_POOL.acquire() as mesh:
+        res = mesh.process(rgb)
+    return list(res.multi_face_landmarks or [])
+
+
+def warmup() -> None:
+    """풀의 모든 FaceMesh 인스턴스에 더미 이미지를 한 번씩 통과시킴 (앱 시작 시 호출)."""
+    dummy = np.zeros((256, 256, 3), dtype=np.uint8)
+    _MESH_POOL.warmup(lambda mesh: mesh.process(dummy))
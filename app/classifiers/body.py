@@ -1,129 +1,266 @@
 # -*- coding: utf-8 -*-
+import math
+import threading
 from typing import Dict, Any, Tuple, Optional
 import numpy as np
 import mediapipe as mp
 import cv2
-from ..utils.image_io import to_rgb
+from ..utils.image_io import to_rgb_for_inference, bgr_to_png_bytes, bgr_to_jpeg_bytes
+from ..utils.drawing import swap_rb
+from ..utils.landmarks import landmarks_xy
+from ..utils.jit import njit
+from ..utils.model_pool import ModelPool
 
 mp_pose = mp.solutions.pose
 mp_draw = mp.solutions.drawing_utils
 mp_styles = mp.solutions.drawing_styles
 
-def _P(lm, idx, w, h):
-    p = lm[idx]
-    return np.array([p.x * w, p.y * h], dtype=np.float32)
-
-def _seg_row_width(seg: np.ndarray, y: float, thr: float = 0.5) -> Optional[Tuple[float, int, int]]:
+def _make_pose(enable_segmentation: bool):
+    return mp_pose.Pose(
+        static_image_mode=True,
+        enable_segmentation=enable_segmentation,
+        model_complexity=1
+    )
+
+# Pose 그래프는 import 시 풀로 만들어 두고 재사용 (요청마다 TFLite 그래프 재로딩 방지)
+_POSE_POOL = ModelPool(lambda: _make_pose(True))   # ★ segmentation 활성화 (기본 경로)
+
+# segmentation 없는 빠른 경로용 풀은 처음 쓸 때 생성 (서버 기본 경로는 안 쓰므로 메모리 차지 안 함)
+# - 만들 때 바로 워밍업까지 해서 그래프 초기화 비용은 첫 호출 1번에만 듦
+# - 이 경로를 쓰는 배포는 앱 시작 시 warmup(fast_path=True) 로 미리 만들어 두면 첫 요청도 지연 없음
+_POSE_POOL_NOSEG: Optional[ModelPool] = None
+_pool_lock = threading.Lock()
+_WARMUP_IMAGE_SHAPE = (256, 256, 3)
+
+def _warm_pool(pool: ModelPool) -> None:
+    dummy = np.zeros(_WARMUP_IMAGE_SHAPE, dtype=np.uint8)
+    pool.warmup(lambda pose: pose.process(dummy))
+
+def _pose_pool(use_segmentation: bool) -> ModelPool:
+    global _POSE_POOL_NOSEG
+    if use_segmentation:
+        return _POSE_POOL
+    with _pool_lock:
+        if _POSE_POOL_NOSEG is None:
+            # 풀 전체를 꺼내 쓰는 warmup 은 다른 스레드가 쓰기 전(락 안, 전역에 공개 전)에만 실행
+            pool = ModelPool(lambda: _make_pose(False))
+            _warm_pool(pool)
+            _POSE_POOL_NOSEG = pool
+        return _POSE_POOL_NOSEG
+
+# 왼/오른 어깨, 왼/오른 골반
+_BODY_IDX = (11, 12, 23, 24)
+
+@njit(cache=True)
+def _rows_extent(seg, ys_i, thr):
+    """
+    seg 의 각 행 ys_i[r] 에서 thr 보다 큰 첫/마지막 열 index (없으면 -1).
+    threshold 배열을 만들지 않고 양 끝에서 안쪽으로 스캔하다 처음 만나는 곳에서 멈춤.
+    """
+    k = ys_i.shape[0]
+    w = seg.shape[1]
+    first = np.full(k, -1, np.int64)
+    last = np.full(k, -1, np.int64)
+    for r in range(k):
+        row = seg[ys_i[r]]
+        for i in range(w):
+            if row[i] > thr:
+                first[r] = i
+                break
+        if first[r] >= 0:
+            for i in range(w - 1, -1, -1):
+                if row[i] > thr:
+                    last[r] = i
+                    break
+    return first, last
+
+# import 시 1번 호출해서 JIT 컴파일을 미리 끝내 둠 (MediaPipe mask 는 float32 2D)
+_rows_extent(np.zeros((2, 2), np.float32), np.zeros(1, np.int64), 0.5)
+
+def _seg_rows_width(seg: np.ndarray, ys: np.ndarray, thr: float = 0.5,
+                    sx: float = 1.0, sy: float = 1.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    segmentation_mask의 여러 y(행)에서 실루엣 폭을 한 번에 측정.
+    - ys, 반환값은 원본 이미지 픽셀 단위
+    - sx, sy: 원본 픽셀 / mask 픽셀 비율 (mask가 축소본 해상도일 때)
+    return: (width, x_min, x_max, valid) 각각 (K,) 배열
+            valid=False 인 행(범위 밖 / 실루엣 없음)의 값은 의미 없음
     """
-    segmentation_mask의 특정 y에서 실루엣 폭 측정.
-    return: (width, x_min, x_max) or None
+    h = seg.shape[0]
+    ys_i = np.rint(np.asarray(ys, dtype=np.float64) / sy).astype(np.int64)
+    in_range = (ys_i >= 0) & (ys_i < h)
+
+    first, last = _rows_extent(seg, np.clip(ys_i, 0, h - 1), float(thr))
+    valid = in_range & (first >= 0)
+
+    width = (last - first).astype(np.float64) * sx
+    x_min = np.rint(first * sx).astype(int)
+    x_max = np.rint(last * sx).astype(int)
+    return width, x_min, x_max, valid
+
+# 허리 폭 측정 시 y_waist 주변으로 보는 행 오프셋 (px)
+_WAIST_DY = (-4, -2, 0, 2, 4)
+
+# _shape_code 가 반환하는 체형 코드(int) → 라벨
+_BODY_LABELS = (
+    "balanced",
+    "inverted_rectangle",
+    "inverted_triangle",
+    "triangle",
+    "hourglass",
+    "rectangle",
+    "unknown",
+)
+
+@njit(cache=True)
+def _shape_code(shoulder_width: float, hip_width: float, waist_width: float):
     """
-    h, w = seg.shape[:2]
-    y_i = int(round(y))
-    if y_i < 0 or y_i >= h:
-        return None
+    어깨/골반/허리 폭 → (체형 코드, s_h, w_s, w_h)
+    체형 코드는 _BODY_LABELS 의 index (numba로 컴파일되는 순수 수치 커널)
+    """
+    eps = 1e-6
+    s_h = shoulder_width / (hip_width + eps)     # 어깨 / 골반
+    w_s = waist_width   / (shoulder_width + eps) # 허리 / 어깨
+    w_h = waist_width   / (hip_width + eps)      # 허리 / 골반
 
-    row = seg[y_i, :]
-    mask = row > thr
-    if not np.any(mask):
-        return None
+    drop_s = 1.0 - w_s  # 어깨 대비 허리 감소율 (양수면 잘록, 음수면 허리가 더 큼)
+    drop_h = 1.0 - w_h  # 골반 대비 허리 감소율
+
+    if s_h > 1.9 or s_h < 0.6:
+        return 6, s_h, w_s, w_h  # ratio_outlier → unknown
+
+    # 0) 허리가 제일 넓은 체형 (apple / oval 계열) → inverted_rectangle로 표시
+    if w_s >= 1.10 and w_h >= 1.05:
+        # 허리가 어깨보다 10% 이상, 골반보다 5% 이상 넓으면
+        return 1, s_h, w_s, w_h
+
+    # 1) 상/하체 비가 많이 다른 경우 (허리는 크게 안 들어간 조건 하에서만)
+    if s_h >= 1.25 and drop_h < 0.12:
+        return 2, s_h, w_s, w_h
+    if s_h <= 0.85 and drop_h < 0.12:
+        return 3, s_h, w_s, w_h
+
+    # 2) 그 외는 허리 감소율로 hourglass / rectangle / balanced
+    if drop_s >= 0.18 and drop_h >= 0.12:
+        # 어깨 대비 18%+, 골반 대비 12%+ 감소 → 모래시계
+        return 4, s_h, w_s, w_h
+    if abs(drop_s) <= 0.12 and abs(drop_h) <= 0.12:
+        # 허리가 어깨/골반과 거의 비슷 (±12% 이내) → 직사각형
+        return 5, s_h, w_s, w_h
+    return 0, s_h, w_s, w_h
+
+# import 시 1번 호출해서 JIT 컴파일을 미리 끝내 둠 (첫 요청 지연 방지)
+_shape_code(1.0, 1.0, 1.0)
+
+def warmup(fast_path: bool = False) -> None:
+    """
+    풀의 모든 Pose 인스턴스에 더미 이미지를 한 번씩 통과시킴 (앱 시작 시 호출).
+    fast_path=True 면 use_segmentation=False 용 풀도 지금 만들어 워밍업 (기본은 처음 쓸 때 lazy 생성 + 워밍업).
+    """
+    _warm_pool(_POSE_POOL)
+    if fast_path:
+        _pose_pool(False)
 
-    xs = np.where(mask)[0]
-    x_min, x_max = int(xs[0]), int(xs[-1])
-    width = float(x_max - x_min)
-    return width, x_min, x_max
+# 기본 pose 스타일을 R/B 뒤집어 둠 → BGR 버퍼에 바로 그려도 예전(RGB 복사본에 그리기)과 같은 색
+_BGR_POSE_STYLE = swap_rb(mp_styles.get_default_pose_landmarks_style())
 
 def draw_debug(bgr: np.ndarray, res, waist_y: Optional[float] = None) -> np.ndarray:
-    out = bgr.copy()
-    rgb = to_rgb(out)
-    h, w = rgb.shape[:2]
+    out = bgr.copy()  # 호출자 이미지에 그리지 않도록 복사 1회 (BGR 그대로 그림, RGB 변환 없음)
+    h, w = out.shape[:2]
 
     if res and res.pose_landmarks:
         mp_draw.draw_landmarks(
-            rgb, res.pose_landmarks,
+            out, res.pose_landmarks,
             mp_pose.POSE_CONNECTIONS,
-            landmark_drawing_spec=mp_styles.get_default_pose_landmarks_style()
+            landmark_drawing_spec=_BGR_POSE_STYLE
         )
     # 허리 y 라인 시각화
     if waist_y is not None:
         y_i = int(round(waist_y))
         if 0 <= y_i < h:
-            cv2.line(rgb, (0, y_i), (w-1, y_i), (0, 255, 0), 1)
+            cv2.line(out, (0, y_i), (w-1, y_i), (0, 255, 0), 1)
 
-    return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+    return out
 
-def classify_body_shape(bgr, return_debug: bool=False) -> Tuple[Dict[str, Any], bytes]:
+def classify_body_shape(bgr, return_debug: bool=False,
+                        use_segmentation: bool=True,
+                        debug_format: str="png") -> Tuple[Dict[str, Any], bytes]:
     """
     체형 분류: inverted_triangle/triangle/hourglass/rectangle/balanced/unknown
     - 어깨/골반 폭: 포즈 랜드마크 기반 + segmentation 기반 보정
     - 허리 폭: segmentation_mask에서 실루엣 폭으로 측정
+    - use_segmentation=False: segmentation 없이 Pose 만 실행하는 빠른 경로
+      (어깨/골반은 landmark 폭, 허리는 둘의 평균 → waist_from_seg=False)
+      (전용 풀은 처음 호출할 때 생성 + 워밍업, 미리 만들려면 warmup(fast_path=True))
+    - debug_format: 디버그 이미지 인코딩 "png"(기본, overlay 엔드포인트) | "jpeg"(배치 저장용, 더 빠르고 작음)
     """
-    rgb = to_rgb(bgr)
-    h, w = rgb.shape[:2]
+    # 추론은 축소본으로, 픽셀 metric은 원본 w/h 기준으로 계산
+    h, w = bgr.shape[:2]
+    rgb = to_rgb_for_inference(bgr)
 
-    with mp_pose.Pose(
-        static_image_mode=True,
-        enable_segmentation=True,   # ★ segmentation 활성화
-        model_complexity=1
-    ) as pose:
+    with _pose_pool(use_segmentation).acquire() as pose:
         res = pose.process(rgb)
 
     if not res.pose_landmarks:
         out = {"body_shape": "unknown", "metrics": None, "debug": "no_pose"}
         return out, b""
 
-    seg = getattr(res, "segmentation_mask", None)
-    if seg is None:
-        # segmentation 실패 시: 예전 방식으로 fallback 가능하지만,
-        # 일단 unknown으로 두는 것도 선택지
-        out = {"body_shape": "unknown", "metrics": None, "debug": "no_segmentation"}
-        return out, b""
+    seg = None
+    if use_segmentation:
+        seg = getattr(res, "segmentation_mask", None)
+        if seg is None:
+            # segmentation 실패 시: 예전 방식으로 fallback 가능하지만,
+            # 일단 unknown으로 두는 것도 선택지
+            out = {"body_shape": "unknown", "metrics": None, "debug": "no_segmentation"}
+            return out, b""
 
     lm = res.pose_landmarks.landmark
 
     # ---- 기본 랜드마크 좌표 ----
-    LSh, RSh = _P(lm, 11, w, h), _P(lm, 12, w, h)
-    LHip, RHip = _P(lm, 23, w, h), _P(lm, 24, w, h)
+    LSh, RSh, LHip, RHip = landmarks_xy(lm, w, h, _BODY_IDX).astype(np.float32)
 
     # 중심 y (어깨 / 골반)
     y_shoulder = float((LSh[1] + RSh[1]) * 0.5)
     y_hip      = float((LHip[1] + RHip[1]) * 0.5)
 
     # ---- landmark 기반 폭(백업용) ----
-    shoulder_width_lm = float(np.linalg.norm(RSh - LSh))
-    hip_width_lm      = float(np.linalg.norm(RHip - LHip))
+    shoulder_width_lm = math.dist(RSh, LSh)
+    hip_width_lm      = math.dist(RHip, LHip)
+
+    # ---- 허리 위치 결정 (어깨~골반 사이 선형 보간) ----
+    # 허리는 골반에 조금 더 가까운 y 지점으로 설정 (0.0=어깨, 1.0=골반)
+    t_waist = 0.6
+    y_waist = (1.0 - t_waist) * y_shoulder + t_waist * y_hip
 
     # ---- segmentation 기반 실루엣 폭 측정 ----
-    # 어깨 / 골반은 segmentation row에서 보정 시도, 실패하면 landmark 폭 사용
-    shoulder_seg = _seg_row_width(seg, y_shoulder, thr=0.5)
-    hip_seg      = _seg_row_width(seg, y_hip, thr=0.5)
+    # 어깨 / 골반 / 허리 주변 5줄(±4px)을 한 번에 측정
+    ys = np.array([y_shoulder, y_hip] + [y_waist + dy for dy in _WAIST_DY])
+    if seg is not None:
+        # segmentation_mask 는 추론 해상도 → 원본 픽셀로 환산할 비율
+        # (mask 는 이미 MAX_INFER_SIDE 이하이고 7개 행만 읽으므로 따로 resize 하지 않음.
+        #  전체 mask resize 는 행 몇 개 스캔보다 오히려 더 많은 픽셀을 건드림)
+        sx = w / seg.shape[1]
+        sy = h / seg.shape[0]
+        seg_w, seg_x0, seg_x1, seg_ok = _seg_rows_width(seg, ys, thr=0.5, sx=sx, sy=sy)
+    else:
+        # segmentation 끔 → 모든 행을 "측정 실패" 로 취급해서 landmark 폭 / 평균 허리 사용
+        seg_w = seg_x0 = seg_x1 = np.zeros(len(ys))
+        seg_ok = np.zeros(len(ys), dtype=bool)
 
-    if shoulder_seg is not None:
-        shoulder_width, sh_x_min, sh_x_max = shoulder_seg
+    # 어깨 / 골반은 segmentation row에서 보정 시도, 실패하면 landmark 폭 사용
+    if seg_ok[0]:
+        shoulder_width, sh_x_min, sh_x_max = float(seg_w[0]), int(seg_x0[0]), int(seg_x1[0])
     else:
         shoulder_width, sh_x_min, sh_x_max = shoulder_width_lm, int(LSh[0]), int(RSh[0])
 
-    if hip_seg is not None:
-        hip_width, hip_x_min, hip_x_max = hip_seg
+    if seg_ok[1]:
+        hip_width, hip_x_min, hip_x_max = float(seg_w[1]), int(seg_x0[1]), int(seg_x1[1])
     else:
         hip_width, hip_x_min, hip_x_max = hip_width_lm, int(LHip[0]), int(RHip[0])
 
-    # ---- 허리 위치 결정 (어깨~골반 사이 선형 보간) ----
-    # 허리는 골반에 조금 더 가까운 y 지점으로 설정 (0.0=어깨, 1.0=골반)
-    t_waist = 0.6
-    y_waist = (1.0 - t_waist) * y_shoulder + t_waist * y_hip
-
     # 허리 폭은 주변 여러 줄 평균으로 조금 안정화
-    waist_widths = []
-    waist_xmins  = []
-    waist_xmaxs  = []
-    for dy in [-4, -2, 0, 2, 4]:
-        ws = _seg_row_width(seg, y_waist + dy, thr=0.5)
-        if ws is not None:
-            wv, x_min, x_max = ws
-            waist_widths.append(wv)
-            waist_xmins.append(x_min)
-            waist_xmaxs.append(x_max)
+    waist_ok = seg_ok[2:]
+    waist_widths = seg_w[2:][waist_ok]
 
     if len(waist_widths) == 0:
         # 허리 실루엣 추출 실패 → hourglass 판단은 의미가 없으니 상/하체 비만 사용
@@ -133,43 +270,9 @@ def classify_body_shape(bgr, return_debug: bool=False) -> Tuple[Dict[str, Any],
         waist_width = float(np.mean(waist_widths))
         waist_from_seg = True
 
-    eps = 1e-6
-    s_h = shoulder_width / (hip_width + eps)     # 어깨 / 골반
-    w_s = waist_width   / (shoulder_width + eps) # 허리 / 어깨
-    w_h = waist_width   / (hip_width + eps)      # 허리 / 골반
-
-    drop_s = 1.0 - w_s  # 어깨 대비 허리 감소율 (양수면 잘록, 음수면 허리가 더 큼)
-    drop_h = 1.0 - w_h  # 골반 대비 허리 감소율
-
-    body = "balanced"
-
-    if s_h > 1.9 or s_h < 0.6:
-        body = "unknown"
-        debug_flag = "ratio_outlier"
-    else:
-        # 0) 허리가 제일 넓은 체형 (apple / oval 계열) → inverted_rectangle로 표시
-        if w_s >= 1.10 and w_h >= 1.05:
-            # 허리가 어깨보다 10% 이상, 골반보다 5% 이상 넓으면
-            body = "inverted_rectangle"
-
-        # 1) 상/하체 비가 많이 다른 경우 (허리는 크게 안 들어간 조건 하에서만)
-        elif s_h >= 1.25 and drop_h < 0.12:
-            body = "inverted_triangle"
-        elif s_h <= 0.85 and drop_h < 0.12:
-            body = "triangle"
-
-        else:
-            # 2) 그 외는 허리 감소율로 hourglass / rectangle / balanced
-            if drop_s >= 0.18 and drop_h >= 0.12:
-                # 어깨 대비 18%+, 골반 대비 12%+ 감소 → 모래시계
-                body = "hourglass"
-            elif abs(drop_s) <= 0.12 and abs(drop_h) <= 0.12:
-                # 허리가 어깨/골반과 거의 비슷 (±12% 이내) → 직사각형
-                body = "rectangle"
-            else:
-                body = "balanced"
-
-        debug_flag = "ok"
+    code, s_h, w_s, w_h = _shape_code(float(shoulder_width), float(hip_width), float(waist_width))
+    body = _BODY_LABELS[code]
+    debug_flag = "ratio_outlier" if body == "unknown" else "ok"
 
 
     out = {
@@ -194,7 +297,10 @@ def classify_body_shape(bgr, return_debug: bool=False) -> Tuple[Dict[str, Any],
     debug_png = b""
     if return_debug:
         dbg = draw_debug(bgr, res, waist_y=y_waist)
-        ok, buf = cv2.imencode(".png", dbg)
-        debug_png = buf.tobytes() if ok else b""
+        debug_png = bgr_to_jpeg_bytes(dbg) if debug_format == "jpeg" else bgr_to_png_bytes(dbg)
 
     return out, debug_png
+
+
+# app/api, scripts 에서 공통으로 쓰는 이름
+classify = classify_body_shape
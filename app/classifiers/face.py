@@ -1,11 +1,18 @@
 # -*- coding: utf-8 -*-
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 import numpy as np
 import cv2
 import mediapipe as mp
+import atexit
 import csv
+import math
 import os
-from ..utils.image_io import to_rgb
+import threading
+from bisect import bisect_right
+from ..utils.image_io import bgr_to_png_bytes
+from ..utils.drawing import swap_rb
+from ..utils.landmarks import landmarks_xy
+from ._detectors import detect_face_landmarks
 
 mp_face_mesh = mp.solutions.face_mesh
 mp_draw = mp.solutions.drawing_utils
@@ -13,36 +20,39 @@ mp_styles = mp.solutions.drawing_styles
 
 
 # ===============================
-# Utility: landmark XY
+# 얼굴형 계산에 쓰는 landmark 인덱스
 # ===============================
-def _P(lm, idx, w, h):
-    p = lm[idx]
-    return np.array([p.x * w, p.y * h])
+# 왼/오른 광대, 이마 위/턱 끝, 왼/오른 눈썹
+_FACE_IDX = (234, 454, 10, 152, 70, 300)
 
 
 # ===============================
 # Debug image
 # ===============================
-def draw_debug(bgr: np.ndarray, res) -> np.ndarray:
-    out = bgr.copy()
-    rgb = to_rgb(out)
-    if res and res.multi_face_landmarks:
-        for face_lms in res.multi_face_landmarks:
+# 기본 face mesh 스타일을 R/B 뒤집어 둠 → BGR 버퍼에 바로 그림 (RGB 왕복 복사 제거)
+_BGR_TESSELATION_STYLE = swap_rb(mp_styles.get_default_face_mesh_tesselation_style())
+_BGR_CONTOURS_STYLE = swap_rb(mp_styles.get_default_face_mesh_contours_style())
+
+def draw_debug(bgr: np.ndarray, faces) -> np.ndarray:
+    """faces: detect_face_landmarks() 결과 (multi_face_landmarks 리스트)"""
+    out = bgr.copy()  # 호출자 이미지에 그리지 않도록 복사 1회 (BGR 그대로 그림, RGB 변환 없음)
+    if faces:
+        for face_lms in faces:
             mp_draw.draw_landmarks(
-                image=rgb,
+                image=out,
                 landmark_list=face_lms,
                 connections=mp_face_mesh.FACEMESH_TESSELATION,
                 landmark_drawing_spec=None,
-                connection_drawing_spec=mp_styles.get_default_face_mesh_tesselation_style(),
+                connection_drawing_spec=_BGR_TESSELATION_STYLE,
             )
             mp_draw.draw_landmarks(
-                image=rgb,
+                image=out,
                 landmark_list=face_lms,
                 connections=mp_face_mesh.FACEMESH_CONTOURS,
                 landmark_drawing_spec=None,
-                connection_drawing_spec=mp_styles.get_default_face_mesh_contours_style(),
+                connection_drawing_spec=_BGR_CONTOURS_STYLE,
             )
-    return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+    return out
 
 
 # ===============================
@@ -50,6 +60,12 @@ def draw_debug(bgr: np.ndarray, res) -> np.ndarray:
 # ===============================
 LOG_PATH = "face_shape_log.csv"
 
+# 파일 핸들은 첫 로그 때 한 번만 열고 계속 재사용 (매 호출 open/close/isfile 제거)
+# 버퍼링되므로 행은 버퍼가 차거나 프로세스 종료(atexit close) 시 디스크에 기록됨
+_log_lock = threading.Lock()
+_log_fh = None
+_log_writer = None
+
 def log_face_shape(data: dict):
     """data = {
         'face_width': ...
@@ -58,98 +74,139 @@ def log_face_shape(data: dict):
         'face_shape': ...
     }
     """
-    file_exists = os.path.isfile(LOG_PATH)
+    global _log_fh, _log_writer
 
-    with open(LOG_PATH, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
+    with _log_lock:
+        if _log_writer is None:
+            file_exists = os.path.isfile(LOG_PATH)
+            _log_fh = open(LOG_PATH, "a", newline="", encoding="utf-8", buffering=8192)
+            atexit.register(_log_fh.close)
+            _log_writer = csv.writer(_log_fh)
 
-        # 헤더 생성
-        if not file_exists:
-            writer.writerow(list(data.keys()))
+            # 헤더 생성
+            if not file_exists:
+                _log_writer.writerow(list(data.keys()))
 
         # 값 쓰기
-        writer.writerow(list(data.values()))
+        _log_writer.writerow(list(data.values()))
 
 
 # ===============================
-# Main classifier
+# 얼굴형 판정 규칙
 # ===============================
-def classify_face_shape(bgr, return_debug: bool=False) -> Tuple[Dict[str, Any], bytes]:
-    """얼굴형 분류: round/square/oval/oblong/heart/unknown"""
+# R = 얼굴 길이 / 폭, J = 턱 폭 / 이마 폭
+FACE_RULES: Dict[str, float] = {
+    "oblong_R": 1.40,       # R 이 이 이상 → oblong
+    "heart_J": 0.90,        # J 가 이 미만이고
+    "heart_R": 1.20,        #   R 이 이 이상 → heart
+    "short_R": 1.14,        # R 이 이 이하 = 짧고 넓은 얼굴
+    "short_round_J": 1.11,  #   J 가 이 이상 → round
+    "short_oval_J": 1.06,   #   J 가 이 이상 → oval, 그 아래는 round
+    "mid_R": 1.22,          # R 이 이 이하 = 중간 길이
+    "mid_square_J": 1.07,   #   J 가 이 이상 → square, 아니면 oval
+    "long_square_J": 1.10,  # 그보다 긴 얼굴: J 가 이 이상 → square, 아니면 oval
+}
+
+
+def _shape_from_ratios(R: float, J: float, rules: Dict[str, float] = FACE_RULES) -> str:
+    """★ 튜닝된 얼굴형 분류 로직 ★ (임계값은 rules 테이블에서)"""
+    # 1) 긴 얼굴 → oblong
+    if R >= rules["oblong_R"]:
+        return "oblong"
 
-    rgb = to_rgb(bgr)
-    h, w = rgb.shape[:2]
+    # 2) 이마 넓고 턱 좁음 → heart
+    if J < rules["heart_J"] and R >= rules["heart_R"]:
+        return "heart"
 
-    with mp_face_mesh.FaceMesh(
-        static_image_mode=True,
-        refine_landmarks=True,
-        max_num_faces=1,
-        min_detection_confidence=0.5
-    ) as mesh:
-        res = mesh.process(rgb)
+    # 3) 비교적 짧고 넓은 얼굴 (R가 작은 구간)
+    if R <= rules["short_R"]:
+        # R이 짧고, 턱/이마 폭이 거의 비슷하거나 조금 넓은 경우 → round
+        if J >= rules["short_round_J"]:
+            return "round"
+        if J >= rules["short_oval_J"]:
+            # 살짝 각은 있지만, 아직은 oval 느낌 유지
+            return "oval"
+        # 턱이 이마보다 확 좁으면 동그랗게 보이는 쪽으로
+        return "round"
 
-    if not res.multi_face_landmarks:
-        return {"face_shape": "unknown", "metrics": None, "debug": "no_face"}, b""
+    # 4) 중간 길이 (short_R < R <= mid_R)
+    if R <= rules["mid_R"]:
+        # 이 구간에서는 턱이 이마보다 조금만 넓어도 사각 느낌이 강해짐
+        return "square" if J >= rules["mid_square_J"] else "oval"
 
-    lm = res.multi_face_landmarks[0].landmark
+    # 5) 그보다 긴 얼굴 (mid_R < R < oblong_R)
+    return "square" if J >= rules["long_square_J"] else "oval"
 
-    # landmarks
-    left_face  = _P(lm, 234, w, h)
-    right_face = _P(lm, 454, w, h)
-    face_width = np.linalg.norm(right_face - left_face)
 
-    forehead = _P(lm, 10, w, h)
-    chin     = _P(lm, 152, w, h)
-    face_length = np.linalg.norm(chin - forehead)
+def _build_face_table(rules: Dict[str, float]):
+    """
+    rules 의 임계값으로 R / J 구간 경계를 만들고, 구간 조합마다 라벨을 미리 계산.
+    - 경계는 모두 "이상(>=)" 기준으로 맞춤: "R <= x" 조건은 경계를 nextafter(x) 로 올려서 표현
+    - 각 칸의 라벨은 그 칸의 하한값에서 _shape_from_ratios 를 한 번 돌려 구함
+      (칸 안에서는 어떤 비교 결과도 바뀌지 않으므로 칸 전체에서 동일)
+    return: (R_edges, J_edges, labels[r_bin][j_bin])
+    """
+    up = lambda x: float(np.nextafter(x, np.inf))
+    r_edges = tuple(sorted({up(rules["short_R"]), rules["heart_R"], up(rules["mid_R"]), rules["oblong_R"]}))
+    j_edges = tuple(sorted({rules["heart_J"], rules["short_oval_J"], rules["mid_square_J"],
+                            rules["long_square_J"], rules["short_round_J"]}))
 
-    brow_left  = _P(lm, 70, w, h)
-    brow_right = _P(lm, 300, w, h)
-    forehead_width = np.linalg.norm(brow_right - brow_left)
+    def reps(edges):
+        # 칸마다 대표값: 첫 칸은 첫 경계보다 작은 값, 나머지는 각 경계(하한, 포함)
+        return (edges[0] - 1.0,) + edges
 
-    jaw_width = face_width * 0.90  # 근사치
+    labels = tuple(
+        tuple(_shape_from_ratios(r, j, rules) for j in reps(j_edges))
+        for r in reps(r_edges)
+    )
+    return r_edges, j_edges, labels
 
-    # ratios
-    R = face_length / (face_width + 1e-6)
-    J = jaw_width / (forehead_width + 1e-6)
 
-    # =====================================
-    #      ★ 튜닝된 얼굴형 분류 로직 ★
-    # =====================================
-    fs = "oval"
+_FACE_TABLE = _build_face_table(FACE_RULES)
 
-    # 1) 긴 얼굴 → oblong
-    if R >= 1.40:
-        fs = "oblong"
 
-    # 2) 이마 넓고 턱 좁음 → heart
-    elif J < 0.90 and R >= 1.20:
-        fs = "heart"
+def _face_label(R: float, J: float, rules: Dict[str, float] = FACE_RULES) -> str:
+    """(R, J) → 얼굴형 라벨. 기본 규칙은 import 시 만든 테이블을 bisect 2번으로 조회."""
+    r_edges, j_edges, labels = _FACE_TABLE if rules is FACE_RULES else _build_face_table(rules)
+    return labels[bisect_right(r_edges, R)][bisect_right(j_edges, J)]
 
-    # 3) 비교적 짧고 넓은 얼굴 (R가 작은 구간)
-    elif R <= 1.14:
-        # R이 짧고, 턱/이마 폭이 거의 비슷하거나 조금 넓은 경우 → round
-        if J >= 1.11:
-            fs = "round"
-        elif J >= 1.06:
-            # 살짝 각은 있지만, 아직은 oval 느낌 유지
-            fs = "oval"
-        else:
-            # 턱이 이마보다 확 좁으면 동그랗게 보이는 쪽으로
-            fs = "round"
 
-    # 4) 중간 길이 (1.14 < R <= 1.22)
-    elif R <= 1.22:
-        # 이 구간에서는 턱이 이마보다 조금만 넓어도 사각 느낌이 강해짐
-        if J >= 1.07:
-            fs = "square"
-        else:
-            fs = "oval"
+# ===============================
+# Main classifier
+# ===============================
+def classify_face_shape(bgr, return_debug: bool=False,
+                        landmarks: Optional[List[Any]] = None,
+                        rules: Dict[str, float] = FACE_RULES) -> Tuple[Dict[str, Any], bytes]:
+    """
+    얼굴형 분류: round/square/oval/oblong/heart/unknown
+    - landmarks: detect_face_landmarks(bgr) 결과를 이미 갖고 있으면 넘겨서 FaceMesh 재실행 생략
+    - rules: 임계값 테이블 (기본 FACE_RULES, 튜닝 실험 시 다른 dict 전달)
+    """
+
+    # 추론은 축소본으로, 픽셀 metric은 원본 w/h 기준으로 계산
+    h, w = bgr.shape[:2]
+    if landmarks is None:
+        landmarks = detect_face_landmarks(bgr)
+
+    if not landmarks:
+        return {"face_shape": "unknown", "metrics": None, "debug": "no_face"}, b""
+
+    lm = landmarks[0].landmark
 
-    # 5) 그보다 긴 얼굴 (1.22 < R < 1.40)
-    else:
-        if J >= 1.10:
-            fs = "square"
-        # 나머지는 기본 oval 유지
+    # landmarks (필요한 6개를 한 번에 픽셀 좌표로)
+    # 2점 거리는 math.dist (스칼라 연산, 임시 배열 없음)
+    left_face, right_face, forehead, chin, brow_left, brow_right = landmarks_xy(lm, w, h, _FACE_IDX).tolist()
+    face_width = math.dist(right_face, left_face)
+    face_length = math.dist(chin, forehead)
+    forehead_width = math.dist(brow_right, brow_left)
+
+    jaw_width = face_width * 0.90  # 근사치
+
+    # ratios
+    R = face_length / (face_width + 1e-6)
+    J = jaw_width / (forehead_width + 1e-6)
+
+    fs = _face_label(R, J, rules)
 
     # ===============================
     # Output dict
@@ -181,8 +238,11 @@ def classify_face_shape(bgr, return_debug: bool=False) -> Tuple[Dict[str, Any],
     # ===============================
     debug_png = b""
     if return_debug:
-        dbg = draw_debug(bgr, res)
-        success, buf = cv2.imencode(".png", dbg)
-        debug_png = buf.tobytes() if success else b""
+        dbg = draw_debug(bgr, landmarks)
+        debug_png = bgr_to_png_bytes(dbg)
 
     return out, debug_png
+
+
+# app/api, scripts 에서 공통으로 쓰는 이름
+classify = classify_face_shape
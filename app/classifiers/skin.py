@@ -1,14 +1,14 @@
 # -*- coding: utf-8 -*-
 # app/classifiers/skin.py
-from typing import Dict, Any, Tuple
-import cv2, numpy as np, mediapipe as mp
-from ..utils.image_io import to_rgb
-
-mp_face_mesh = mp.solutions.face_mesh
+from typing import Dict, Any, List, Optional, Tuple
+import cv2, numpy as np
+from ..utils.image_io import bgr_to_png_bytes
+from ..utils.landmarks import landmarks_xy
+from ._detectors import detect_face_landmarks
 
 def draw_debug(bgr: np.ndarray, bbox) -> np.ndarray:
     """ROI 박스(중앙부) 시각화"""
-    out = bgr.copy()
+    out = bgr.copy()  # 호출자 이미지에 그리지 않도록 복사 1회 (cv2 drawing 은 in-place)
     x1, y1, x2, y2 = bbox
     cv2.rectangle(out, (x1, y1), (x2, y2), (0, 0, 255), 2)  # 빨간 박스
     # 가운데 점 찍기
@@ -16,40 +16,42 @@ def draw_debug(bgr: np.ndarray, bbox) -> np.ndarray:
     cv2.circle(out, (cx, cy), 4, (0, 0, 255), -1)
     return out
 
-def classify_skin_tone(bgr, return_debug: bool=False) -> Tuple[Dict[str, Any], bytes]:
+def classify_skin_tone(bgr, return_debug: bool=False,
+                       landmarks: Optional[List[Any]] = None) -> Tuple[Dict[str, Any], bytes]:
     """
     피부톤 분류: depth(light/medium/deep) + undertone(warm/cool/neutral)
+    - landmarks: detect_face_landmarks(bgr) 결과를 이미 갖고 있으면 넘겨서 FaceMesh 재실행 생략
     """
     
-    rgb = to_rgb(bgr)
-    h, w = rgb.shape[:2]
-    with mp_face_mesh.FaceMesh(static_image_mode=True, refine_landmarks=True,
-                               max_num_faces=1, min_detection_confidence=0.5) as mesh:
-        res = mesh.process(rgb)
+    # 추론은 축소본으로, 픽셀 metric은 원본 w/h 기준으로 계산
+    h, w = bgr.shape[:2]
+    if landmarks is None:
+        landmarks = detect_face_landmarks(bgr)
         
-    if not res.multi_face_landmarks:
+    if not landmarks:
         return {"skin_tone":"unknown", "metrics":None, "debug":"no_face"}, b""
 
 
-    lm = res.multi_face_landmarks[0].landmark
-    xs = [int(pt.x * w) for pt in lm]
-    ys = [int(pt.y * h) for pt in lm]
-    x1, y1, x2, y2 = max(0,min(xs)), max(0,min(ys)), min(w,max(xs)), min(h,max(ys))
+    lm = landmarks[0].landmark
+    # int() 절삭은 단조 증가라 min/max 를 먼저 구하고 4개 값만 int 로 바꿔도 결과 동일
+    xy = landmarks_xy(lm, w, h)
+    (x_lo, y_lo), (x_hi, y_hi) = xy.min(axis=0), xy.max(axis=0)
+    x1, y1, x2, y2 = max(0,int(x_lo)), max(0,int(y_lo)), min(w,int(x_hi)), min(h,int(y_hi))
 
     # 얼굴 중앙부 ROI
     cx1 = x1 + int((x2 - x1) * 0.25)
     cx2 = x2 - int((x2 - x1) * 0.25)
     cy1 = y1 + int((y2 - y1) * 0.25)
     cy2 = y2 - int((y2 - y1) * 0.35)
-    roi = bgr[cy1:cy2, cx1:cx2].copy()
+    roi = bgr[cy1:cy2, cx1:cx2]  # view 로 충분 (cvtColor 가 새 버퍼를 만들고 원본은 건드리지 않음)
     if roi.size == 0:
         return {"skin_tone":"unknown", "metrics":None, "debug":"roi_empty"}, b""
 
     # 평균 색상(Lab/HSV)
-    lab = cv2.cvtColor(roi, cv2.COLOR_BGR2LAB)
-    hsv = cv2.cvtColor(roi, cv2.COLOR_BGR2HSV)
-    L, a, b = lab[:,:,0].mean(), lab[:,:,1].mean(), lab[:,:,2].mean()
-    H, S, V = hsv[:,:,0].mean(), hsv[:,:,1].mean(), hsv[:,:,2].mean()
+    # 픽셀별 변환 후 평균 (feature vector 에 들어가는 값이라 "평균색 1개 변환" 근사는 쓰지 않음)
+    # cv2.mean 은 3채널 평균을 한 번에 계산 (채널 slice 마다 .mean() 하던 6번 순회 → 2번)
+    L, a, b, _ = cv2.mean(cv2.cvtColor(roi, cv2.COLOR_BGR2LAB))
+    H, S, V, _ = cv2.mean(cv2.cvtColor(roi, cv2.COLOR_BGR2HSV))
     
     # ----- depth(밝기) ----- 
     depth = "light" if L >= 180 else ("medium" if L >= 130 else "deep")
@@ -86,7 +88,10 @@ def classify_skin_tone(bgr, return_debug: bool=False) -> Tuple[Dict[str, Any], b
     
     if return_debug:
         dbg = draw_debug(bgr, (cx1, cy1, cx2, cy2))
-        ok, buf = cv2.imencode(".png", dbg)
-        debug_png = buf.tobytes() if ok else b""
+        debug_png = bgr_to_png_bytes(dbg)
+
+    return out, debug_png
+
 
-    return out, debug_png
\ No newline at end of file
+# app/api, scripts 에서 공통으로 쓰는 이름
+classify = classify_skin_tone
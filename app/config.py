@@ -0,0 +1,40 @@
+# app/config.py
+# -*- coding: utf-8 -*-
+"""
+프로세스 공용 환경설정.
+
+- .env 는 load_env() 를 처음 부를 때 한 번만 읽음
+  (모듈마다 load_dotenv() 를 부르면 import 할 때마다 상위 폴더를 뒤져 .env 를 다시 파싱)
+- 이미 설정된 환경변수는 덮어쓰지 않음 (load_dotenv 기본 동작과 동일)
+- 여러 모듈이 같이 쓰는 모델 이름은 여기서 한 번 읽어 상수로 둠
+
+환경변수:
+    OPENAI_VISION_MODEL     : 코디/옷 이미지 분석용 Vision 모델 (기본 gpt-4o)
+    OPENAI_OUTFIT_WEB_MODEL : web_search + Vision 한 번에 하는 quick_web_outfit 모델 (기본 gpt-5)
+"""
+from __future__ import annotations
+
+import os
+import threading
+
+from dotenv import load_dotenv
+
+_inited = False
+_lock = threading.Lock()
+
+
+def load_env() -> None:
+    """.env 를 프로세스당 한 번만 읽어 os.environ 에 반영. 두 번째 호출부터는 아무것도 안 함."""
+    global _inited
+    if _inited:
+        return
+    with _lock:
+        if not _inited:
+            load_dotenv()
+            _inited = True
+
+
+load_env()
+
+VISION_MODEL = os.getenv("OPENAI_VISION_MODEL", "gpt-4o")
+OUTFIT_WEB_MODEL = os.getenv("OPENAI_OUTFIT_WEB_MODEL", "gpt-5")
@@ -0,0 +1,74 @@
+# app/services/_http.py
+# -*- coding: utf-8 -*-
+"""
+이미지 다운로드용 공용 requests.Session.
+
+- requests.get() 을 바로 부르면 호출마다 커넥션 풀이 새로 생겨서 TCP/TLS 핸드셰이크를 반복한다.
+- S3 / 이미지 CDN 처럼 같은 호스트로 반복해서 가는 요청이 많아서 Session 하나로 keep-alive 연결을 재사용.
+- 일시적인 429 / 5xx / 연결 오류는 urllib3 Retry 로 짧게 재시도 (GET 만, backoff 0.2s 부터 + jitter, Retry-After 헤더 따름).
+- 이미지 전용 세션이라 Accept-Encoding: identity (이미 압축된 이미지에 gzip 을 다시 씌우지 않게).
+- timeout 은 (connect, read) 로 나눠서 넘김 → 죽은 호스트는 HTTP_CONNECT_TIMEOUT 안에 끊고 재시도.
+- 스레드풀(to_thread / ThreadPoolExecutor) 에서 같이 쓰므로 pool_maxsize 를 동시 다운로드 수보다 넉넉하게.
+
+환경변수:
+    HTTP_POOL_CONNECTIONS : 호스트별 풀을 몇 개까지 보관할지 (기본 16)
+    HTTP_POOL_MAXSIZE     : 호스트 하나당 유지할 최대 연결 수 (기본 32)
+    HTTP_MAX_RETRIES      : 재시도 횟수 (기본 2, 0 이면 재시도 안 함)
+    HTTP_CONNECT_TIMEOUT  : 연결 timeout 초 (기본 3, read timeout 은 호출부 값)
+"""
+from __future__ import annotations
+
+import os
+import threading
+from typing import Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "16"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3"))
+
+_USER_AGENT = "style-pipeline/1.0"
+
+_session: Optional[requests.Session] = None
+_lock = threading.Lock()
+
+
+def _new_session() -> requests.Session:
+    retry = Retry(
+        total=HTTP_MAX_RETRIES,
+        backoff_factor=0.2,
+        # 여러 워커가 같은 CDN 에서 동시에 실패했을 때 재시도 시점이 겹치지 않도록
+        backoff_jitter=0.1,
+        status_forcelist=(429, 500, 502, 503, 504),
+        # 재시도를 다 써도 예외 대신 마지막 응답을 돌려줌 → 호출부 raise_for_status() 가 그대로 처리
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS,
+                          pool_maxsize=HTTP_POOL_MAXSIZE,
+                          max_retries=retry)
+    s = requests.Session()
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    s.headers["User-Agent"] = _USER_AGENT
+    # JPEG/PNG/WebP 는 이미 압축된 포맷이라 gzip 을 받아도 크기는 거의 그대로고 해제 CPU 만 듦
+    s.headers["Accept-Encoding"] = "identity"
+    return s
+
+
+def split_timeout(read: float) -> Tuple[float, float]:
+    """requests 용 (connect, read) timeout. 연결은 짧게, 본문 읽기는 호출부가 준 만큼."""
+    return (min(HTTP_CONNECT_TIMEOUT, read), read)
+
+
+def get_session() -> requests.Session:
+    """프로세스 공용 requests.Session."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _new_session()
+    return _session
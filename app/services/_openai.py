@@ -0,0 +1,201 @@
+# app/services/_openai.py
+# -*- coding: utf-8 -*-
+"""
+서비스 모듈들이 같이 쓰는 OpenAI 클라이언트.
+
+- 호출마다 OpenAI() 를 만들면 내부 httpx 커넥션 풀도 매번 새로 생겨서 TCP/TLS 핸드셰이크를 반복한다.
+- 모듈마다 따로 만들던 client 도 여기 하나로 모아서 keep-alive 연결을 같이 쓴다.
+- 처음 쓸 때 생성하므로 OPENAI_API_KEY 가 없어도 import 자체는 된다.
+- JSON 모드 스트리밍 응답을 객체가 닫히는 시점까지만 읽는 collect_json_stream / acollect_json_stream
+  (Responses API 는 collect_response_json_stream) 도 여기 둔다.
+
+환경변수:
+    OPENAI_MAX_RETRIES     : 429 / 5xx / 연결 오류 재시도 횟수, SDK 지수 백오프 (기본 3)
+    OPENAI_TIMEOUT         : 요청 전체 timeout 초 (기본 600, SDK 기본값과 동일)
+    OPENAI_CONNECT_TIMEOUT : 연결 timeout 초 (기본 5)
+    OPENAI_MAX_CONNECTIONS : 클라이언트당 최대 연결 수 (기본 64, keep-alive 는 그 절반)
+    OPENAI_HTTP2           : "0" 이면 HTTP/1.1 고정 (기본: h2 패키지가 있으면 HTTP/2)
+    OPENAI_STRICT_JSON     : "0" 이면 json_schema(strict) 대신 json_object 모드 (structured output 미지원 모델용)
+"""
+from __future__ import annotations
+
+import os
+import threading
+from typing import Optional
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+from ..config import load_env
+
+# HTTP/2 는 h2 패키지가 있어야 켜짐 (없으면 httpx 가 ImportError → HTTP/1.1 로 동작)
+try:
+    import h2  # noqa: F401
+    _HAS_H2 = True
+except ImportError:
+    _HAS_H2 = False
+
+load_env()
+
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "600"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "64"))
+# 동시 요청 여러 개를 TLS 연결 하나에 multiplex
+OPENAI_HTTP2 = _HAS_H2 and os.getenv("OPENAI_HTTP2", "1") != "0"
+OPENAI_STRICT_JSON = os.getenv("OPENAI_STRICT_JSON", "1") != "0"
+
+_client: Optional[OpenAI] = None
+_async_client: Optional[AsyncOpenAI] = None
+_lock = threading.Lock()
+
+
+def _http_kwargs() -> dict:
+    # SDK 기본 httpx 설정(redirect 등)은 Default*HttpxClient 가 채워줌
+    return {
+        "http2": OPENAI_HTTP2,
+        "limits": httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=max(1, OPENAI_MAX_CONNECTIONS // 2),
+        ),
+        "timeout": httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+    }
+
+
+def _client_kwargs() -> dict:
+    return {
+        "max_retries": OPENAI_MAX_RETRIES,
+        "timeout": httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+    }
+
+
+def get_client() -> OpenAI:
+    """프로세스 공용 동기 OpenAI 클라이언트."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = OpenAI(http_client=DefaultHttpxClient(**_http_kwargs()),
+                                 **_client_kwargs())
+    return _client
+
+
+def get_async_client() -> AsyncOpenAI:
+    """프로세스 공용 AsyncOpenAI 클라이언트 (서버 이벤트 루프에서 사용)."""
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                _async_client = AsyncOpenAI(http_client=DefaultAsyncHttpxClient(**_http_kwargs()),
+                                            **_client_kwargs())
+    return _async_client
+
+
+def json_response_format(name: str, schema: dict) -> dict:
+    """
+    chat.completions 의 response_format.
+    strict JSON schema 면 모델이 스키마 밖의 키(모델이 채울 필요 없는 필드 등)나 군더더기를 내보내지 않아서 출력 토큰이 줄어든다.
+    OPENAI_STRICT_JSON=0 이면 예전처럼 json_object 모드.
+    """
+    if not OPENAI_STRICT_JSON:
+        return {"type": "json_object"}
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+def json_text_format(name: str, schema: dict) -> dict:
+    """json_response_format 의 responses.create(text=...) 버전 (OPENAI_STRICT_JSON 도 동일하게 따름)."""
+    if not OPENAI_STRICT_JSON:
+        return {"format": {"type": "json_object"}}
+    return {"format": {"type": "json_schema", "name": name, "strict": True, "schema": schema}}
+
+
+# -----------------------
+# JSON 모드 스트리밍 수집
+# -----------------------
+# JSON 모드(json_object / json_schema) 응답은 객체 하나라서, 최상위 { } 가 닫히는 순간 필요한 내용은 다 받은 것.
+# 모델이 닫는 괄호 뒤로 공백/개행을 max_tokens 까지 이어서 내보내는 경우가 있어서 그 시점에 스트림을 끊는다.
+
+class _JsonObjectEnd:
+    """문자열/escape 를 고려한 중괄호 카운터. feed() 가 True 면 최상위 객체가 닫힌 것."""
+
+    __slots__ = ("depth", "in_str", "escape", "started")
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.in_str = False
+        self.escape = False
+        self.started = False
+
+    def feed(self, text: str) -> bool:
+        for ch in text:
+            if self.in_str:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_str = False
+            elif ch == '"':
+                self.in_str = True
+            elif ch == "{":
+                self.depth += 1
+                self.started = True
+            elif ch == "}":
+                self.depth -= 1
+                if self.started and self.depth == 0:
+                    return True
+        return False
+
+
+def _delta_text(chunk) -> str:
+    # 마지막 usage chunk 등은 choices 가 비어 있음
+    if not chunk.choices:
+        return ""
+    return chunk.choices[0].delta.content or ""
+
+
+def _collect_json_text(texts) -> str:
+    parts = []
+    end = _JsonObjectEnd()
+    for text in texts:
+        if not text:
+            continue
+        parts.append(text)
+        if end.feed(text):
+            break
+    return "".join(parts)
+
+
+def collect_json_stream(stream) -> str:
+    """stream=True 인 chat.completions 응답 → JSON 텍스트 (객체가 닫히면 바로 스트림 종료)."""
+    try:
+        return _collect_json_text(_delta_text(chunk) for chunk in stream)
+    finally:
+        stream.close()
+
+
+def collect_response_json_stream(stream) -> str:
+    """collect_json_stream 의 Responses API(stream=True) 버전. 출력 텍스트 delta 이벤트만 모음."""
+    try:
+        return _collect_json_text(
+            event.delta for event in stream if event.type == "response.output_text.delta"
+        )
+    finally:
+        stream.close()
+
+
+async def acollect_json_stream(stream) -> str:
+    """collect_json_stream 의 AsyncOpenAI 버전."""
+    parts = []
+    end = _JsonObjectEnd()
+    try:
+        async for chunk in stream:
+            text = _delta_text(chunk)
+            if not text:
+                continue
+            parts.append(text)
+            if end.feed(text):
+                break
+    finally:
+        await stream.close()
+    return "".join(parts)
@@ -2,17 +2,44 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import os
 import json
-from typing import Dict, Any, List, Optional
+import threading
+import time
+from typing import Dict, Any, List, Optional, Sequence
+
+from cachetools import TTLCache
 from .outfit_embedding import style_to_vec
-from dotenv import load_dotenv
-from openai import OpenAI
+from .vision_preprocess import prepare_image
+from ._openai import get_async_client, acollect_json_stream
+from ..utils import fastjson
+from ..config import VISION_MODEL
+
+# 6개 짧은 필드짜리 JSON 이라 기본은 mini 모델 + 작은 출력 한도.
+# 응답이 깨졌거나 필드가 빠지면 한 번만 큰 모델(OPENAI_VISION_MODEL)로 다시 시도.
+CLOTHES_MODEL = os.getenv("OPENAI_CLOTHES_MODEL", "gpt-4o-mini")
+CLOTHES_MAX_TOKENS = int(os.getenv("CLOTHES_MAX_TOKENS", "128"))
+FALLBACK_MAX_TOKENS = 300
+
+_REQUIRED_KEYS = ("category", "sub_category", "style", "color", "fit", "season")
+
+# 일괄 분석 시 동시에 날리는 Vision 호출 수 상한
+CLOTHES_CONCURRENCY = max(1, int(os.getenv("CLOTHES_CONCURRENCY", "8")))
+# 일괄 분석 시 Vision 호출과 별도로 미리 받아 두는 이미지 다운로드/축소 동시 실행 수
+CLOTHES_PREFETCH = max(1, int(os.getenv("CLOTHES_PREFETCH", "16")))
 
-load_dotenv()
+# (image_url, name_hint, fine_grained) → 분석 결과 캐시
+# - 메모리: 프로세스 내 LRU (+TTL)
+# - 디스크: CLOTHES_CACHE_DIR 아래 JSON 파일 (워커/재시작 간 공유, 빈 값이면 끔)
+# - 상품 이미지는 거의 안 바뀌므로 TTL 은 길게 (기본 30일)
+CLOTHES_CACHE_SIZE = int(os.getenv("CLOTHES_CACHE_SIZE", "4096"))
+CLOTHES_CACHE_TTL = float(os.getenv("CLOTHES_CACHE_TTL", str(30 * 24 * 3600)))
+CLOTHES_CACHE_DIR = os.getenv("CLOTHES_CACHE_DIR", os.path.join(".cache", "clothes"))
 
-VISION_MODEL = os.getenv("OPENAI_VISION_MODEL", "gpt-4o")
-client = OpenAI()
+_clothes_cache: TTLCache = TTLCache(maxsize=CLOTHES_CACHE_SIZE, ttl=CLOTHES_CACHE_TTL)
+_clothes_cache_lock = threading.Lock()
 
 CLOTHES_PROMPT = """
 당신은 '온라인 패션 쇼핑몰 상품 메타데이터 태거'입니다.
@@ -49,18 +76,104 @@ CLOTHES_PROMPT = """
 - 보이지 않는 정보는 추측하지 말고 가장 안전한 기본값을 선택하세요.
 """
 
+# system 메시지는 매 호출 byte 단위로 똑같이 맨 앞에 둠 (상품명 힌트 등 가변 텍스트는 user 메시지로)
+# → OpenAI prompt caching 은 (model, 앞부분 prefix) 가 같으면 그 구간 prefill 을 재사용
+_SYSTEM_MSG = {"role": "system", "content": CLOTHES_PROMPT}
+
+# -----------------------
+# 결과 캐시
+# -----------------------
+
+
+def _cache_key(image_url: str, name_hint: Optional[str], fine_grained: bool) -> str:
+    raw = f"{image_url}\0{name_hint or ''}\0{int(fine_grained)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _disk_path(key: str) -> Optional[str]:
+    return os.path.join(CLOTHES_CACHE_DIR, f"{key}.json") if CLOTHES_CACHE_DIR else None
+
+
+def _load_cached(key: str) -> Optional[Dict[str, Any]]:
+    # JSON 텍스트로 저장해 두고 적중할 때마다 새로 파싱 (호출부가 결과 dict 를 고쳐도 캐시는 그대로)
+    with _clothes_cache_lock:
+        text = _clothes_cache.get(key)
+    if text is None:
+        path = _disk_path(key)
+        if not path:
+            return None
+        try:
+            if time.time() - os.path.getmtime(path) > CLOTHES_CACHE_TTL:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except OSError:
+            return None
+        with _clothes_cache_lock:
+            _clothes_cache[key] = text
+    try:
+        cached = fastjson.loads(text)
+    except fastjson.JSONDecodeError:
+        return None
+    return cached if isinstance(cached, dict) else None
+
+
+def _store_cached(key: str, result: Dict[str, Any]) -> None:
+    try:
+        text = fastjson.dumps(result)
+    except TypeError as e:
+        print(f"[clothes_analyzer] cache encode ERROR key={key}, err={e}")
+        return
+    with _clothes_cache_lock:
+        _clothes_cache[key] = text
+
+    path = _disk_path(key)
+    if not path:
+        return
+    try:
+        os.makedirs(CLOTHES_CACHE_DIR, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"[clothes_analyzer] cache write ERROR path={path}, err={e}")
+
+
+def clear_clothes_cache() -> int:
+    """의류 분석 캐시(메모리 + 디스크) 전체 삭제. 삭제된 항목 수 반환."""
+    with _clothes_cache_lock:
+        n = len(_clothes_cache)
+        _clothes_cache.clear()
+
+    if CLOTHES_CACHE_DIR and os.path.isdir(CLOTHES_CACHE_DIR):
+        for name in os.listdir(CLOTHES_CACHE_DIR):
+            if name.endswith(".json"):
+                try:
+                    os.remove(os.path.join(CLOTHES_CACHE_DIR, name))
+                    n += 1
+                except OSError:
+                    pass
+    return n
+
+
 # -----------------------
 # 메인 분석 함수
 # -----------------------
 
 
-def analyze_clothes_from_url(
+async def analyze_clothes_from_url(
     image_url: str,
     name_hint: Optional[str] = None,
+    fine_grained: bool = False,
 ) -> Dict[str, Any]:
     """
     단일 의류 이미지 URL을 입력 받아,
     백엔드 /clothes/<id>/analysis/ Body와 동일한 형태의 dict를 반환.
+    (AsyncOpenAI 호출이라 여러 벌은 analyze_clothes_batch 로 동시에 처리)
+
+    이미지는 축소 JPEG + detail="low" 로 보냄. fine_grained=True 면 detail="high".
+    같은 (image_url, name_hint) 는 Vision 재호출 없이 캐시 결과 반환 (CLOTHES_CACHE_TTL 동안).
 
     반환 예:
     {
@@ -73,7 +186,42 @@ def analyze_clothes_from_url(
       "vector": [0.8, 0.8, 0.4, 0.8, 0.0, 0.9]   # 6D vector
     }
     """
+    key = _cache_key(image_url, name_hint, fine_grained)
+    cached = _load_cached(key)
+    if cached is not None:
+        return cached
+
+    # 원본 URL 대신 축소본(data URL)을 보내서 vision 토큰 절약 (다운로드는 blocking 이라 스레드에서)
+    image_part = await asyncio.to_thread(prepare_image, image_url, fine_grained=fine_grained)
+    return await _analyze_prepared(key, image_part, name_hint)
 
+
+async def _call_vision(messages: List[Dict[str, Any]], model: str, max_tokens: int) -> Dict[str, Any]:
+    """Vision 호출 1회 → 파싱된 dict (JSON 이 깨졌거나 객체가 아니면 빈 dict)."""
+    # 스트리밍: JSON 객체가 닫히면 나머지 생성은 기다리지 않음
+    stream = await get_async_client().chat.completions.create(
+        model=model,
+        temperature=0.2,
+        max_tokens=max_tokens,
+        response_format={"type": "json_object"},
+        messages=messages,
+        stream=True,
+    )
+    content = await acollect_json_stream(stream) or "{}"
+
+    try:
+        raw = fastjson.loads(content)
+    except fastjson.JSONDecodeError:
+        return {}
+    return raw if isinstance(raw, dict) else {}
+
+
+async def _analyze_prepared(
+    key: str,
+    image_part: Dict[str, str],
+    name_hint: Optional[str],
+) -> Dict[str, Any]:
+    """전처리된 image_url dict 로 Vision 분석 → 결과 dict (정상 파싱된 결과만 캐시에 저장)."""
     # 1) user 메시지 content 구성
     user_content: List[Dict[str, Any]] = []
 
@@ -81,30 +229,20 @@ def analyze_clothes_from_url(
     if name_hint:
         base_text += f'\n상품명 힌트: "{name_hint}" 도 참고해서 category/sub_category/style을 정교하게 선택해 주세요.'
     user_content.append({"type": "text", "text": base_text})
-
     user_content.append({
         "type": "image_url",
-        "image_url": {"url": image_url}
+        "image_url": image_part
     })
 
-    # 2) GPT Vision 호출
-    resp = client.chat.completions.create(
-        model=VISION_MODEL,
-        temperature=0.2,
-        max_tokens=600,
-        response_format={"type": "json_object"},
-        messages=[
-            {"role": "system", "content": CLOTHES_PROMPT},
-            {"role": "user", "content": user_content},
-        ],
-    )
-
-    content = resp.choices[0].message.content or "{}"
-
-    try:
-        raw = json.loads(content)
-    except json.JSONDecodeError:
-        raw = {}
+    # 2) GPT Vision 호출: mini 모델 → 결과가 불완전하면 큰 모델로 1회 재시도
+    messages = [_SYSTEM_MSG, {"role": "user", "content": user_content}]
+    raw = await _call_vision(messages, CLOTHES_MODEL, CLOTHES_MAX_TOKENS)
+    if not all(k in raw for k in _REQUIRED_KEYS) and VISION_MODEL != CLOTHES_MODEL:
+        retry = await _call_vision(messages, VISION_MODEL, FALLBACK_MAX_TOKENS)
+        if retry:
+            raw = retry
+    # 필수 key 가 다 있는 응답만 완전한 결과로 취급 (빠진 key 는 아래에서 기본값으로 채움)
+    complete = all(k in raw for k in _REQUIRED_KEYS)
 
     category = raw.get("category", "top")
     sub_category = raw.get("sub_category", "tshirt")
@@ -117,7 +255,7 @@ def analyze_clothes_from_url(
     vec = style_to_vec(style, season, color, category, fit)
 
     # 4) 백엔드 /clothes/<id>/analysis/ Body와 동일 구조로 반환
-    return {
+    result = {
         "category": category,
         "sub_category": sub_category,
         "style": style,
@@ -126,6 +264,57 @@ def analyze_clothes_from_url(
         "season": season,
         "vector": vec,
     }
+    # 파싱 실패 / 일부 key 누락으로 기본값이 섞인 결과는 저장하지 않음 (다음 요청에서 다시 시도)
+    if complete:
+        _store_cached(key, result)
+    return result
+
+
+async def analyze_clothes_batch(
+    urls: Sequence[str],
+    name_hints: Optional[Sequence[Optional[str]]] = None,
+    concurrency: int = CLOTHES_CONCURRENCY,
+    prefetch: int = CLOTHES_PREFETCH,
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    여러 의류 이미지를 동시에 분석 (옷장 일괄 등록용).
+    - 동시에 진행되는 Vision 호출은 concurrency 개로 제한
+    - 이미지 다운로드/축소는 prefetch 개까지 따로 앞서 진행 → Vision 슬롯이 다운로드를 기다리지 않음
+    - 다운로드 시작 ~ Vision 완료 사이 항목은 concurrency + prefetch 개로 제한 (메모리 상한)
+    - 반환 리스트는 urls 순서와 같고, 실패한 항목은 None
+    """
+    hints = list(name_hints) if name_hints is not None else [None] * len(urls)
+    concurrency, prefetch = max(1, concurrency), max(1, prefetch)
+    vision_sem = asyncio.Semaphore(concurrency)
+    fetch_sem = asyncio.Semaphore(prefetch)
+    window = asyncio.Semaphore(concurrency + prefetch)
+
+    async def _one(url: str, hint: Optional[str]) -> Dict[str, Any]:
+        key = _cache_key(url, hint, False)
+        cached = _load_cached(key)
+        if cached is not None:
+            return cached
+
+        async with window:
+            async with fetch_sem:
+                image_part = await asyncio.to_thread(prepare_image, url)
+            async with vision_sem:
+                return await _analyze_prepared(key, image_part, hint)
+
+    results = await asyncio.gather(
+        *[_one(u, h) for u, h in zip(urls, hints)],
+        return_exceptions=True,
+    )
+
+    out: List[Optional[Dict[str, Any]]] = []
+    for url, r in zip(urls, results):
+        if isinstance(r, BaseException):
+            # 한 벌 실패가 나머지 결과까지 버리지 않도록 None 으로 채움
+            print(f"[clothes_analyzer] analyze_clothes_batch ERROR url={url}, err={r}")
+            out.append(None)
+        else:
+            out.append(r)
+    return out
 
 
 # -----------------------
@@ -134,5 +323,5 @@ def analyze_clothes_from_url(
 if __name__ == "__main__":
     test_url = "https://fit-me-up-s3bucket.s3.ap-northeast-2.amazonaws.com/clothes/4fea8844-7ae4-4728-a2db-c7d93b79e559.jpg"
     print("[TEST] analyze_clothes_from_url() 실행...")
-    res = analyze_clothes_from_url(test_url, name_hint="헨리넥 롱슬리브 [그레이]")
+    res = asyncio.run(analyze_clothes_from_url(test_url, name_hint="헨리넥 롱슬리브 [그레이]"))
     print(json.dumps(res, ensure_ascii=False, indent=2))
@@ -7,10 +7,15 @@ feature vector를 생성하는 모듈.
 
 입력: face, body, skin (각각 dict 형태)
 출력: L2-normalized 1D np.array
+      (여러 명을 한 번에: build_feature_vectors → (N, FEATURE_DIM) 배열)
 """
 
+from typing import Any, Dict, List, Sequence, Tuple
+
 import numpy as np
 
+from ..utils.jit import njit
+
 
 # ----- 1. 카테고리 → one-hot 매핑 -----
 
@@ -48,79 +53,117 @@ SKIN_UNDERTONE_MAP = {
 }
 
 
+# ----- 2. label → 결과 벡터에서 1 이 들어갈 열 번호 -----
+# 벡터 레이아웃: [body one-hot | face one-hot | depth | undertone | body/face/skin metrics]
+# one-hot 리스트를 매번 extend 하는 대신, 0 으로 채운 행에 해당 열 하나만 1.0 으로 씀
+# ("unknown" 처럼 전부 0 인 label 은 표에 없음)
+
+def _hot_columns(m: Dict[str, List[int]], offset: int) -> Dict[str, int]:
+    return {label: offset + hot.index(1) for label, hot in m.items() if 1 in hot}
+
+_BODY_COL = _hot_columns(BODY_SHAPE_MAP, 0)
+_FACE_COL = _hot_columns(FACE_SHAPE_MAP, len(BODY_SHAPE_MAP["unknown"]))
+_DEPTH_OFF = len(BODY_SHAPE_MAP["unknown"]) + len(FACE_SHAPE_MAP["unknown"])
+_DEPTH_COL = _hot_columns(SKIN_DEPTH_MAP, _DEPTH_OFF)
+_UNDERTONE_COL = _hot_columns(SKIN_UNDERTONE_MAP, _DEPTH_OFF + len(SKIN_DEPTH_MAP["unknown"]))
+_NUM_START = _DEPTH_OFF + len(SKIN_DEPTH_MAP["unknown"]) + len(SKIN_UNDERTONE_MAP["unknown"])
+
+# metric 키 (body → face → skin 순서 그대로 벡터 뒤쪽에 붙음)
+BODY_METRIC_KEYS = ("s_h", "w_s", "w_h")
+FACE_METRIC_KEYS = (
+    "face_width", "face_length", "forehead_width",
+    "jaw_width_est", "ratio_len_width", "ratio_jaw_forehead",
+)
+SKIN_METRIC_KEYS = ("L_mean", "a_mean", "b_mean", "H_mean", "S_mean", "V_mean")
+
+_NUM_DIM = len(BODY_METRIC_KEYS) + len(FACE_METRIC_KEYS) + len(SKIN_METRIC_KEYS)
+FEATURE_DIM = _NUM_START + _NUM_DIM
+
+# 카테고리가 메인, metric은 보조 역할
+# (길이/폭 픽셀 값들은 대략 100~300 → 0.01 곱해서 1~3 수준, ratio 계열은 0~2 정도라 문제 없음)
+NUMERIC_SCALE = 0.01
+
+
 def _safe_get(m, key, default=0.0):
     if not m:
         return float(default)
     v = m.get(key, default)
+    if type(v) is float:
+        return v
     try:
         return float(v)
     except Exception:
         return float(default)
 
 
-def build_feature_vector(face, body, skin):
+@njit(cache=True)
+def _l2_normalize_rows(out):
     """
-    카테고리(one-hot)를 메인으로, metric은 낮은 weight로 보조에만 쓰는 임베딩 생성.
-    - face: face_shape + face metrics
-    - body: body_shape + body metrics
-    - skin: skin_tone + skin metrics
+    (N, D) 배열의 각 행을 제자리에서 L2 정규화 (norm + 1e-8 로 나눔).
+    einsum / sqrt / 나눗셈을 따로 부르면 행이 1개여도 numpy 호출 비용이 몇 µs 씩 쌓여서 한 루프로 처리.
     """
-    cat_vec = []   # 카테고리 one-hot들
-    num_vec = []   # 연속형 metric들
-
-    # ---------- BODY ----------
-    bm = body.get("metrics") or {}
-    body_label = body.get("body_shape", "unknown")
-    # 카테고리 (메인축)
-    cat_vec.extend(BODY_SHAPE_MAP.get(body_label, BODY_SHAPE_MAP["unknown"]))
-    # metric (보조)
-    num_vec.extend([
-        _safe_get(bm, "s_h"),
-        _safe_get(bm, "w_s"),
-        _safe_get(bm, "w_h"),
-    ])
-
-    # ---------- FACE ----------
-    fm = face.get("metrics") or {}
-    face_label = face.get("face_shape", "unknown")
-    cat_vec.extend(FACE_SHAPE_MAP.get(face_label, FACE_SHAPE_MAP["unknown"]))
-    num_vec.extend([
-        _safe_get(fm, "face_width"),
-        _safe_get(fm, "face_length"),
-        _safe_get(fm, "forehead_width"),
-        _safe_get(fm, "jaw_width_est"),
-        _safe_get(fm, "ratio_len_width"),
-        _safe_get(fm, "ratio_jaw_forehead"),
-    ])
-
-    # ---------- SKIN ----------
-    sm = skin.get("metrics") or {}
-    skin_label = skin.get("skin_tone", "unknown")
-    cat_vec.extend(SKIN_TONE_MAP.get(skin_label, SKIN_TONE_MAP["unknown"]))
-    num_vec.extend([
-        _safe_get(sm, "L_mean"),
-        _safe_get(sm, "a_mean"),
-        _safe_get(sm, "b_mean"),
-        _safe_get(sm, "H_mean"),
-        _safe_get(sm, "S_mean"),
-        _safe_get(sm, "V_mean"),
-    ])
-
-    # ---------- metric scale 줄여주기 (카테고리 중심으로 만들기 위해) ----------
-    num_vec = np.array(num_vec, dtype=float)
-
-    # 아주 러프하게 스케일 줄이기: 값이 너무 크면 0~1 근처 수준으로 줄여줌
-    # - 길이/폭 픽셀 값들은 대략 100~300 정도 → 0.01 곱해서 1~3 수준
-    # - ratio 계열은 원래 0~2 정도라 크게 문제 안 됨
-    numeric_scale = 0.01
-    num_vec = num_vec * numeric_scale
-
-    # 최종 벡터 = [카테고리 one-hot..., scaled metrics...]
-    full_vec = np.array(cat_vec + num_vec.tolist(), dtype=float)
-
-    # L2 normalize
-    norm = np.linalg.norm(full_vec) + 1e-8
-    return full_vec / norm
+    n, d = out.shape
+    for i in range(n):
+        ss = 0.0
+        for j in range(d):
+            ss += out[i, j] * out[i, j]
+        norm = np.sqrt(ss) + 1e-8
+        for j in range(d):
+            out[i, j] /= norm
+
+# import 시 1번 호출해서 JIT 컴파일을 미리 끝내 둠
+_l2_normalize_rows(np.ones((1, 2)))
+
+
+def _split_skin_label(skin_label: Any) -> Tuple[str, str]:
+    """"light_warm" → ("light", "warm"). 형식이 다르면 ("unknown", "unknown")."""
+    if isinstance(skin_label, str) and "_" in skin_label:
+        d, u = skin_label.split("_", 1)
+        return d, u
+    return "unknown", "unknown"
+
+
+def build_feature_vectors(faces: Sequence[Dict[str, Any]],
+                          bodies: Sequence[Dict[str, Any]],
+                          skins: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """
+    여러 명의 (face, body, skin) → (N, FEATURE_DIM) L2-normalized 배열.
+    - 결과 배열을 한 번만 할당하고 각 행에 바로 채움 (list extend → np.array 변환 2번 생략)
+    - 정규화는 numba 커널 한 번으로 전체 행 처리
+    """
+    n = len(faces)
+    if len(bodies) != n or len(skins) != n:
+        raise ValueError("faces / bodies / skins 길이가 같아야 합니다.")
+
+    out = np.empty((n, FEATURE_DIM), dtype=float)
+    if n == 0:
+        return out
+
+    for i, (f, b, s) in enumerate(zip(faces, bodies, skins)):
+        # ---------- 카테고리 one-hot (해당 열만 1.0) ----------
+        row = [0.0] * _NUM_START
+        depth, undertone = _split_skin_label(s.get("skin_tone", "unknown"))
+        for col in (_BODY_COL.get(b.get("body_shape", "unknown")),
+                    _FACE_COL.get(f.get("face_shape", "unknown")),
+                    _DEPTH_COL.get(depth),
+                    _UNDERTONE_COL.get(undertone)):
+            if col is not None:
+                row[col] = 1.0
+
+        # ---------- metrics (보조, NUMERIC_SCALE 배) ----------
+        bm = b.get("metrics") or {}
+        fm = f.get("metrics") or {}
+        sm = s.get("metrics") or {}
+        row += [_safe_get(bm, k) * NUMERIC_SCALE for k in BODY_METRIC_KEYS]
+        row += [_safe_get(fm, k) * NUMERIC_SCALE for k in FACE_METRIC_KEYS]
+        row += [_safe_get(sm, k) * NUMERIC_SCALE for k in SKIN_METRIC_KEYS]
+
+        out[i] = row
+
+    # ---------- L2 normalize (행 단위) ----------
+    _l2_normalize_rows(out)
+    return out
+
 
 def build_feature_vector(face, body, skin):
     """
@@ -128,60 +171,6 @@ def build_feature_vector(face, body, skin):
     - face: face_shape + face metrics
     - body: body_shape + body metrics
     - skin: depth(one-hot) + undertone(one-hot) + Lab/HSV metrics
+    (한 명짜리 build_feature_vectors)
     """
-    cat_vec = []
-    num_vec = []
-
-    # ---------- BODY ----------
-    bm = body.get("metrics") or {}
-    body_label = body.get("body_shape", "unknown")
-    cat_vec.extend(BODY_SHAPE_MAP.get(body_label, BODY_SHAPE_MAP["unknown"]))
-    num_vec.extend([
-        _safe_get(bm, "s_h"),
-        _safe_get(bm, "w_s"),
-        _safe_get(bm, "w_h"),
-    ])
-
-    # ---------- FACE ----------
-    fm = face.get("metrics") or {}
-    face_label = face.get("face_shape", "unknown")
-    cat_vec.extend(FACE_SHAPE_MAP.get(face_label, FACE_SHAPE_MAP["unknown"]))
-    num_vec.extend([
-        _safe_get(fm, "face_width"),
-        _safe_get(fm, "face_length"),
-        _safe_get(fm, "forehead_width"),
-        _safe_get(fm, "jaw_width_est"),
-        _safe_get(fm, "ratio_len_width"),
-        _safe_get(fm, "ratio_jaw_forehead"),
-    ])
-
-    # ---------- SKIN ----------
-    sm = skin.get("metrics") or {}
-    skin_label = skin.get("skin_tone", "unknown")  # 예: "light_warm"
-
-    depth, undertone = "unknown", "unknown"
-    if isinstance(skin_label, str) and "_" in skin_label:
-        d, u = skin_label.split("_", 1)
-        depth = d if d in SKIN_DEPTH_MAP else "unknown"
-        undertone = u if u in SKIN_UNDERTONE_MAP else "unknown"
-
-    cat_vec.extend(SKIN_DEPTH_MAP.get(depth, SKIN_DEPTH_MAP["unknown"]))
-    cat_vec.extend(SKIN_UNDERTONE_MAP.get(undertone, SKIN_UNDERTONE_MAP["unknown"]))
-
-    num_vec.extend([
-        _safe_get(sm, "L_mean"),
-        _safe_get(sm, "a_mean"),
-        _safe_get(sm, "b_mean"),
-        _safe_get(sm, "H_mean"),
-        _safe_get(sm, "S_mean"),
-        _safe_get(sm, "V_mean"),
-    ])
-
-    # ---------- metrics weight 줄이기 ----------
-    num_vec = np.array(num_vec, dtype=float)
-    numeric_scale = 0.01      # 카테고리가 메인, metric은 보조 역할
-    num_vec = num_vec * numeric_scale
-
-    full_vec = np.array(cat_vec + num_vec.tolist(), dtype=float)
-    norm = np.linalg.norm(full_vec) + 1e-8
-    return full_vec / norm
\ No newline at end of file
+    return build_feature_vectors([face], [body], [skin])[0]
@@ -1,48 +1,119 @@
 # -*- coding: utf-8 -*-
-from dotenv import load_dotenv
-load_dotenv()  # .env 파일에서 환경 변수 자동 로드
-import os, json
-from typing import Dict, Any, Optional
-from openai import OpenAI
+import os
+import threading
+from types import MappingProxyType
+from typing import Dict, Any, Optional, Tuple
+
+from cachetools import TTLCache
+
+from ._openai import (get_client, get_async_client, collect_json_stream, acollect_json_stream,
+                      json_response_format)
+from ..utils import fastjson
+from ..config import load_env
+
+load_env()  # .env 파일에서 환경 변수 자동 로드 (프로세스당 한 번)
 
 _MODEL_DEFAULT = os.getenv("OPENAI_RECO_MODEL", "gpt-4o-mini")
 
+# 역할 + JSON 스키마 + 요구사항은 호출마다 같으므로 system 메시지 하나로 고정해서 맨 앞에 둠.
+# (예전엔 입력 JSON 뒤에 스키마가 붙어서 매번 prefix 가 달랐음)
+# OpenAI prompt caching 은 (model, 앞부분 prefix) 가 같을 때 적중 → 가변 입력은 user 메시지에만.
+_SYSTEM_PROMPT = (
+    "너는 퍼스널 스타일리스트야. 사용자의 얼굴형/체형/피부톤과 상·하의 정보를 바탕으로, "
+    "균형과 보정을 최우선으로 한 스타일 추천을 한국어로 제공해. "
+    "반드시 JSON으로만 응답하고, 설명은 간결하게.\n"
+    "JSON 스키마:\n"
+    "{\n"
+    '  "summary": string,\n'
+    '  "color_palette": {"base": [string], "accent": [string], "avoid": [string]},\n'
+    '  "items": [\n'
+    '    {"category": "top"|"bottom"|"outer"|"shoes"|"accessory", "suggestions": [string], "why": string}\n'
+    "  ],\n"
+    '  "styling_tips": [string]\n'
+    "}\n"
+    "요구사항:\n"
+    "- 얼굴형/체형 보정 원리(네크라인, 비율, 실루엣) 반영\n"
+    "- 피부톤(언더톤)에 맞는 컬러 팔레트 제안 (base/accent/avoid)\n"
+    "- 현재 상의/하의가 주어지면 그것을 바탕으로 실전 코디 대안 제시\n"
+    "- 제안 개수: items 3~6개, tips 3~6개\n"
+    "- JSON만 출력(주석/텍스트 금지)"
+)
+_SYSTEM_MSG = {"role": "system", "content": _SYSTEM_PROMPT}
+
+# 위 스키마의 strict JSON schema 버전
+# inputs_echo 는 _finalize 에서 입력값으로 덮어쓰므로 모델이 생성하지 않게 스키마에서 뺌 (출력 토큰 절약)
+_STR_LIST = {"type": "array", "items": {"type": "string"}}
+_RESPONSE_FORMAT = json_response_format("style_recommendation", {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "color_palette": {
+            "type": "object",
+            "properties": {"base": _STR_LIST, "accent": _STR_LIST, "avoid": _STR_LIST},
+            "required": ["base", "accent", "avoid"],
+            "additionalProperties": False,
+        },
+        "items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "category": {"type": "string", "enum": ["top", "bottom", "outer", "shoes", "accessory"]},
+                    "suggestions": _STR_LIST,
+                    "why": {"type": "string"},
+                },
+                "required": ["category", "suggestions", "why"],
+                "additionalProperties": False,
+            },
+        },
+        "styling_tips": _STR_LIST,
+    },
+    "required": ["summary", "color_palette", "items", "styling_tips"],
+    "additionalProperties": False,
+})
+
 # 규칙 기반 간단 백업(키 없음/오류 시)
+# 고정 데이터는 모듈 로드 시 한 번만 만들어 두고, 호출마다 반환용 사본만 만든다
+# (API 장애 때 fallback 이 몰려도 같은 dict/list 를 매번 새로 쌓지 않도록)
+_PALETTE = MappingProxyType({
+    "warm": {"base": ("크림", "베이지"), "accent": ("테라코타", "올리브"), "avoid": ("차가운 블루톤",)},
+    "cool": {"base": ("그레이", "네이비"), "accent": ("버건디", "보라"), "avoid": ("노란기 베이지",)},
+    "neutral": {"base": ("화이트", "블랙"), "accent": ("딥그린", "카멜"), "avoid": ()},
+})
+
+_FACE_TIPS = MappingProxyType({
+    "round": "상의 네크라인은 V넥/딥 V로 세로선을 만들어 얼굴형을 보완.",
+    "square": "상의 네크라인은 V넥/딥 V로 세로선을 만들어 얼굴형을 보완.",
+    "oblong": "라운드넥/보트넥으로 세로 길이를 줄이고 균형 맞추기.",
+})
+
+_BODY_TIPS = MappingProxyType({
+    "inverted_triangle": "어깨선 미니멀, 하의에 볼륨(플리츠/와이드)로 시선 하향.",
+    "triangle": "어깨에 약한 패드/숄더 디테일로 상체 보강, 상의는 스트럭처.",
+    "hourglass": "허리 라인 강조(크롭/벨티드), 과한 루즈핏은 피하기.",
+    "rectangle": "허리 다트/핀턱, 상하 볼륨 대비로 곡선 실루엣 만들기.",
+})
+
+_FALLBACK_ITEMS = (
+    ("top", ("V넥 니트", "보트넥 티", "스트럭처드 셔츠"), "얼굴형/체형 보완을 위한 네크라인/실루엣 반영"),
+    ("bottom", ("와이드 팬츠", "A라인 스커트", "핀턱 슬랙스"), "상하 밸런스와 허리선 형성"),
+)
+
+
 def _fallback_recommend(face_shape: str, body_shape: str, skin_tone: str,
                         top: Optional[str], bottom: Optional[str]) -> Dict[str, Any]:
-    palette = {
-        "warm": {"base": ["크림", "베이지"], "accent": ["테라코타", "올리브"], "avoid": ["차가운 블루톤"]},
-        "cool": {"base": ["그레이", "네이비"], "accent": ["버건디", "보라"], "avoid": ["노란기 베이지"]},
-        "neutral": {"base": ["화이트", "블랙"], "accent": ["딥그린", "카멜"], "avoid": []},
-    }
     under = "neutral"
     if "_warm" in skin_tone: under = "warm"
     elif "_cool" in skin_tone: under = "cool"
 
-    tips = []
-    if face_shape in ("round", "square"):
-        tips.append("상의 네크라인은 V넥/딥 V로 세로선을 만들어 얼굴형을 보완.")
-    if face_shape in ("oblong",):
-        tips.append("라운드넥/보트넥으로 세로 길이를 줄이고 균형 맞추기.")
-    if body_shape == "inverted_triangle":
-        tips.append("어깨선 미니멀, 하의에 볼륨(플리츠/와이드)로 시선 하향.")
-    if body_shape == "triangle":
-        tips.append("어깨에 약한 패드/숄더 디테일로 상체 보강, 상의는 스트럭처.")
-    if body_shape == "hourglass":
-        tips.append("허리 라인 강조(크롭/벨티드), 과한 루즈핏은 피하기.")
-    if body_shape == "rectangle":
-        tips.append("허리 다트/핀턱, 상하 볼륨 대비로 곡선 실루엣 만들기.")
+    tips = [t for t in (_FACE_TIPS.get(face_shape), _BODY_TIPS.get(body_shape)) if t]
 
     return {
         "summary": "규칙 기반 추천(백업)",
-        "color_palette": palette.get(under, palette["neutral"]),
+        "color_palette": {k: list(v) for k, v in _PALETTE[under].items()},
         "items": [
-            {"category": "top",
-             "suggestions": ["V넥 니트", "보트넥 티", "스트럭처드 셔츠"],
-             "why": "얼굴형/체형 보완을 위한 네크라인/실루엣 반영"},
-            {"category": "bottom",
-             "suggestions": ["와이드 팬츠", "A라인 스커트", "핀턱 슬랙스"],
-             "why": "상하 밸런스와 허리선 형성"}
+            {"category": cat, "suggestions": list(sug), "why": why}
+            for cat, sug, why in _FALLBACK_ITEMS
         ],
         "styling_tips": tips,
         "inputs_echo": {
@@ -51,6 +122,75 @@ def _fallback_recommend(face_shape: str, body_shape: str, skin_tone: str,
         }
     }
 
+# (model, face, body, skin, top, bottom) → GPT 응답 JSON 텍스트 캐시
+# - 입력 조합이 얼굴형 × 체형 × 피부톤 × 상/하의 정도라 같은 조합이 자주 반복됨 → 적중 시 API 호출 없음
+# - 응답 텍스트를 저장하고 적중할 때마다 새로 파싱 (호출부가 dict 를 고쳐도 캐시는 그대로)
+# - API 오류로 fallback 한 결과는 저장하지 않음, 모델이 바뀌면 key 가 달라짐
+RECO_CACHE_SIZE = int(os.getenv("RECO_CACHE_SIZE", "1024"))
+RECO_CACHE_TTL = float(os.getenv("RECO_CACHE_TTL", str(24 * 3600)))
+
+_reco_cache: TTLCache = TTLCache(maxsize=RECO_CACHE_SIZE, ttl=RECO_CACHE_TTL)
+_reco_cache_lock = threading.Lock()
+
+def clear_recommend_cache() -> int:
+    """추천 응답 캐시 전체 삭제. 삭제된 항목 수 반환."""
+    with _reco_cache_lock:
+        n = len(_reco_cache)
+        _reco_cache.clear()
+    return n
+
+def _norm(v: Optional[str]) -> Optional[str]:
+    # 대소문자 / 공백 차이만 있는 입력은 같은 key 로
+    return " ".join(v.split()).casefold() if v else None
+
+def _cache_key(model: Optional[str], face_shape: str, body_shape: str, skin_tone: str,
+               top: Optional[str], bottom: Optional[str]) -> Tuple:
+    return (model or _MODEL_DEFAULT, _norm(face_shape), _norm(body_shape), _norm(skin_tone),
+            _norm(top), _norm(bottom))
+
+def _cache_get(key: Tuple) -> Optional[str]:
+    with _reco_cache_lock:
+        return _reco_cache.get(key)
+
+def _cache_put(key: Tuple, content: str) -> None:
+    with _reco_cache_lock:
+        _reco_cache[key] = content
+
+def _user_msg(face_shape: str, body_shape: str, skin_tone: str,
+              top: Optional[str], bottom: Optional[str]) -> Dict[str, str]:
+    user = {
+        "face_shape": face_shape,
+        "body_shape": body_shape,
+        "skin_tone": skin_tone,
+        "top": top,
+        "bottom": bottom
+    }
+    return {"role": "user", "content": f"입력: {fastjson.dumps(user)}"}
+
+def _chat_params(model: Optional[str], user_msg: Dict[str, str]) -> Dict[str, Any]:
+    return {
+        "model": model or _MODEL_DEFAULT,
+        "temperature": 0.6,
+        "max_tokens": 700,
+        "response_format": _RESPONSE_FORMAT,
+        "messages": [_SYSTEM_MSG, user_msg],
+        "stream": True,
+    }
+
+def _finalize(content: str, face_shape: str, body_shape: str, skin_tone: str,
+              top: Optional[str], bottom: Optional[str]) -> Dict[str, Any]:
+    data = fastjson.loads(content or "{}")
+    # 안전장치: 필드 보강
+    data.setdefault("summary", "")
+    data.setdefault("color_palette", {"base": [], "accent": [], "avoid": []})
+    data.setdefault("items", [])
+    data.setdefault("styling_tips", [])
+    data["inputs_echo"] = {
+        "face_shape": face_shape, "body_shape": body_shape, "skin_tone": skin_tone,
+        "top": top, "bottom": bottom
+    }
+    return data
+
 def recommend(face_shape: str, body_shape: str, skin_tone: str,
               top: Optional[str] = None, bottom: Optional[str] = None,
               model: Optional[str] = None) -> Dict[str, Any]:
@@ -65,67 +205,48 @@ def recommend(face_shape: str, body_shape: str, skin_tone: str,
       inputs_echo: {...}
     }
     """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
+    if not os.getenv("OPENAI_API_KEY"):
         return _fallback_recommend(face_shape, body_shape, skin_tone, top, bottom)
 
-    client = OpenAI(api_key=api_key)
-    model = model or _MODEL_DEFAULT
-
-    system = (
-        "너는 퍼스널 스타일리스트야. 사용자의 얼굴형/체형/피부톤과 상·하의 정보를 바탕으로, "
-        "균형과 보정을 최우선으로 한 스타일 추천을 한국어로 제공해. "
-        "반드시 JSON으로만 응답하고, 설명은 간결하게."
-    )
-    user = {
-        "face_shape": face_shape,
-        "body_shape": body_shape,
-        "skin_tone": skin_tone,
-        "top": top,
-        "bottom": bottom
-    }
-    schema_hint = (
-        "JSON 스키마:\n"
-        "{\n"
-        '  "summary": string,\n'
-        '  "color_palette": {"base": [string], "accent": [string], "avoid": [string]},\n'
-        '  "items": [\n'
-        '    {"category": "top"|"bottom"|"outer"|"shoes"|"accessory", "suggestions": [string], "why": string}\n'
-        "  ],\n"
-        '  "styling_tips": [string],\n'
-        '  "inputs_echo": {"face_shape": string, "body_shape": string, "skin_tone": string, "top": string|null, "bottom": string|null}\n'
-        "}"
-    )
+    key = _cache_key(model, face_shape, body_shape, skin_tone, top, bottom)
+    content = _cache_get(key)
+    if content is not None:
+        return _finalize(content, face_shape, body_shape, skin_tone, top, bottom)
 
     try:
-        resp = client.chat.completions.create(
-            model=model,
-            temperature=0.6,
-            max_tokens=700,
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": f"입력: {json.dumps(user, ensure_ascii=False)}\n{schema_hint}\n"
-                                            "요구사항:\n"
-                                            "- 얼굴형/체형 보정 원리(네크라인, 비율, 실루엣) 반영\n"
-                                            "- 피부톤(언더톤)에 맞는 컬러 팔레트 제안 (base/accent/avoid)\n"
-                                            "- 현재 상의/하의가 주어지면 그것을 바탕으로 실전 코디 대안 제시\n"
-                                            "- 제안 개수: items 3~6개, tips 3~6개\n"
-                                            "- JSON만 출력(주석/텍스트 금지)"},
-            ],
-        )
-        content = resp.choices[0].message.content or "{}"
-        data = json.loads(content)
-        # 안전장치: 필드 보강
-        data.setdefault("summary", "")
-        data.setdefault("color_palette", {"base": [], "accent": [], "avoid": []})
-        data.setdefault("items", [])
-        data.setdefault("styling_tips", [])
-        data["inputs_echo"] = {
-            "face_shape": face_shape, "body_shape": body_shape, "skin_tone": skin_tone,
-            "top": top, "bottom": bottom
-        }
+        # 호출마다 새로 만들지 않고 공용 클라이언트 재사용 (커넥션 keep-alive)
+        stream = get_client().chat.completions.create(
+            **_chat_params(model, _user_msg(face_shape, body_shape, skin_tone, top, bottom)))
+        # JSON 객체가 닫히는 시점에 스트림 종료
+        content = collect_json_stream(stream)
+        data = _finalize(content, face_shape, body_shape, skin_tone, top, bottom)
+        _cache_put(key, content)
         return data
     except Exception:
         # API 오류 시 규칙 기반으로 fallback
-        return _fallback_recommend(face_shape, body_shape, skin_tone, top, bottom)
\ No newline at end of file
+        return _fallback_recommend(face_shape, body_shape, skin_tone, top, bottom)
+
+async def recommend_async(face_shape: str, body_shape: str, skin_tone: str,
+                          top: Optional[str] = None, bottom: Optional[str] = None,
+                          model: Optional[str] = None) -> Dict[str, Any]:
+    """
+    recommend 의 AsyncOpenAI 버전 (반환 스키마 / fallback 동일).
+    이벤트 루프를 막지 않으므로 다른 GPT 호출과 asyncio.gather 로 겹쳐서 실행 가능.
+    """
+    if not os.getenv("OPENAI_API_KEY"):
+        return _fallback_recommend(face_shape, body_shape, skin_tone, top, bottom)
+
+    key = _cache_key(model, face_shape, body_shape, skin_tone, top, bottom)
+    content = _cache_get(key)
+    if content is not None:
+        return _finalize(content, face_shape, body_shape, skin_tone, top, bottom)
+
+    try:
+        stream = await get_async_client().chat.completions.create(
+            **_chat_params(model, _user_msg(face_shape, body_shape, skin_tone, top, bottom)))
+        content = await acollect_json_stream(stream)
+        data = _finalize(content, face_shape, body_shape, skin_tone, top, bottom)
+        _cache_put(key, content)
+        return data
+    except Exception:
+        return _fallback_recommend(face_shape, body_shape, skin_tone, top, bottom)
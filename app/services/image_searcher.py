@@ -8,9 +8,15 @@ Image Search Adapter (SerpAPI Bing / Google Images)
     IMG_HOST_WHITELIST: str  (쉼표구분 도메인 목록, 없으면 기본값 사용)
     IMG_HOST_BLACKLIST: str  (쉼표구분 도메인 목록, 없으면 기본값 사용)
     IMG_SEARCH_DEBUG  : "1" 이면 디버그 로그 출력
+    SERPAPI_CACHE_SIZE: SerpAPI 응답 캐시 최대 항목 수 (기본 512)
+    SERPAPI_CACHE_TTL : SerpAPI 응답 캐시 유지 시간 초 (기본 600)
+    SERPAPI_RETRIES   : 429 / 5xx / 연결 오류 재시도 횟수 (기본 2)
 
 주요 함수:
     search_reference_images(celeb_name, needs, providers=("bing","google"), max_results=30, ...)
+    search_reference_images_async(...)  : 같은 검색의 async 버전 (FastAPI 엔드포인트용)
+    iter_reference_images_async(...)    : provider 응답이 오는 대로 결과를 하나씩 yield 하는 async generator
+    clear_search_cache()                : SerpAPI 응답 캐시 삭제
 
 반환 스키마(예):
 {
@@ -26,13 +32,18 @@ Image Search Adapter (SerpAPI Bing / Google Images)
 }
 """
 from __future__ import annotations
-import os, time, json
-from typing import List, Dict, Any, Iterable, Tuple
+import asyncio
+import heapq
+import os, json
+import random
+import threading
+from typing import List, Dict, Any, AsyncIterator, Iterable, Tuple
 from urllib.parse import urlparse, urlunparse, urlencode, parse_qsl
-import requests
+import httpx
 import re
-from dotenv import load_dotenv
-load_dotenv()
+from cachetools import TTLCache
+from ..config import load_env
+load_env()
 
 
 # -----------------------------
@@ -43,23 +54,30 @@ _SERPAPI_KEY = os.getenv("SERPAPI_KEY", "").strip()
 # 디버그 플래그
 _IMG_DEBUG = os.getenv("IMG_SEARCH_DEBUG", "0") == "1"
 
-_DEFAULT_TIMEOUT = 10
+# 연결은 3초 안에 안 되면 바로 끊고 재시도, 응답 본문은 8초까지 (예전엔 둘 다 10초 하나)
+_DEFAULT_TIMEOUT = httpx.Timeout(8.0, connect=3.0)
+SERPAPI_RETRIES = int(os.getenv("SERPAPI_RETRIES", "2"))
+_RETRY_STATUS = frozenset((429, 500, 502, 503, 504))
+_RETRY_BACKOFF = 0.3
+# Retry-After 가 이보다 길면 기다리지 않고 실패 처리 (검색 하나 때문에 요청 전체가 묶이지 않도록)
+_RETRY_AFTER_MAX = 5.0
 _DEFAULT_HEADERS = {"User-Agent": "style-pipeline/1.0 (+image_searcher)"}
 
 # 호스트 화이트/블랙리스트(환경변수로 커스터마이즈 가능, 쉼표구분)
-_HOST_WHITELIST = set([h.strip().lower() for h in os.getenv(
+# 도메인 자신과 하위 도메인이 매칭됨 (x.com → x.com, m.x.com 은 매칭 / netflix.com 은 아님)
+_HOST_WHITELIST = frozenset([h.strip().lower() for h in os.getenv(
     "IMG_HOST_WHITELIST",
     "gettyimages.com,images.unsplash.com,upload.wikimedia.org,commons.wikimedia.org,"
     "vogue.com,harpersbazaar.com,elle.com,naver.com,news.naver.com"
 ).split(",") if h.strip()])
 
-_HOST_BLACKLIST = set([h.strip().lower() for h in os.getenv(
+_HOST_BLACKLIST = frozenset([h.strip().lower() for h in os.getenv(
     "IMG_HOST_BLACKLIST",
     "pinterest.com,kr.pinterest.com,facebook.com,instagram.com,x.com,twitter.com"
 ).split(",") if h.strip()])
 
 # 편집/보도 전용으로 분류할 확률이 높은 도메인(휴리스틱)
-_EDITORIAL_HOST_HINTS = set([
+_EDITORIAL_HOST_HINTS = frozenset([
     "gettyimages.com", "alamy.com", "shutterstock.com", "afp.com",
     "apimages.com", "reuters.com", "news.naver.com", "bbc.com", "cnn.com",
     "nytimes.com", "washingtonpost.com", "variety.com", "hollywoodreporter.com"
@@ -70,6 +88,14 @@ _EDITORIAL_HOST_HINTS = set([
 # -----------------------------
 def _canonical_url(u: str) -> str:
     """간단한 URL 정규화: 쿼리에서 추적 파라미터 제거 등."""
+    # 빠른 경로: 쿼리/fragment/params 가 없고 scheme/host 가 이미 소문자면 정규화 결과 = 입력
+    # (검색 결과 URL 대부분이 여기 해당, 결과 수가 많을 때 urlparse/urlencode 비용이 대부분이라 생략)
+    if "?" not in u and "#" not in u and ";" not in u and u.isprintable():
+        scheme, sep, rest = u.partition("://")
+        if sep and (scheme == "https" or scheme == "http"):
+            netloc = rest.partition("/")[0]
+            if netloc and netloc == netloc.lower():
+                return u
     try:
         p = urlparse(u)
         query = [(k, v) for k, v in parse_qsl(p.query, keep_blank_values=True)
@@ -84,31 +110,35 @@ def _host(u: str) -> str | None:
     except Exception:
         return None
 
+def _host_in(host: str, domains: frozenset) -> bool:
+    """
+    host 가 domains 중 하나이거나 그 하위 도메인인지 (라벨 경계 기준).
+    목록 전체를 endswith 로 훑는 대신 host 의 접미사(라벨 수만큼)만 set 에서 조회.
+    예) "img.news.naver.com" → "img.news.naver.com", "news.naver.com", "naver.com", "com"
+    """
+    while True:
+        if host in domains:
+            return True
+        dot = host.find(".")
+        if dot < 0:
+            return False
+        host = host[dot + 1:]
+
 def _is_editorial_host(host: str | None) -> bool:
     if not host:
         return False
-    return any(host.endswith(h) for h in _EDITORIAL_HOST_HINTS)
+    return _host_in(host, _EDITORIAL_HOST_HINTS)
 
 def _pass_host_policy(host: str | None) -> bool:
     if not host:
         return False
-    if any(host.endswith(b) for b in _HOST_BLACKLIST):
+    if _host_in(host, _HOST_BLACKLIST):
         return False
-    if _HOST_WHITELIST and not any(host.endswith(w) for w in _HOST_WHITELIST):
+    if _HOST_WHITELIST and not _host_in(host, _HOST_WHITELIST):
         # 화이트리스트가 설정돼 있으면 리스트 외 도메인 제외
         return False
     return True
 
-def _dedup(items: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    seen = set()
-    out: List[Dict[str, Any]] = []
-    for it in items:
-        key = (_canonical_url(it.get("image","")), _canonical_url(it.get("page","") or ""))
-        if key[0] and key not in seen:
-            out.append(it)
-            seen.add(key)
-    return out
-
 def _normalize_format(fmt: str | None) -> str | None:
     if not fmt:
         return None
@@ -139,6 +169,8 @@ def _normalize_item(
 # -----------------------------
 # Query builder
 # -----------------------------
+_SPLIT_RE = re.compile(r"[,\s]+")
+
 def build_query(celeb_name: str, needs: List[str] | Tuple[str,...]) -> str:
     """
     예) celeb_name="아일릿 원희", needs=["여름", "블레이저"] →
@@ -147,24 +179,10 @@ def build_query(celeb_name: str, needs: List[str] | Tuple[str,...]) -> str:
     예) needs=["블레이저, 여름"] 처럼 한 문자열 안에 콤마가 섞여 있어도
         "여름 블레이저" 식으로 정규화해서 사용.
     """
-    # 1) needs 리스트 안의 문자열을 콤마/공백 기준으로 전부 쪼개서 토큰화
-    tokens: List[str] = []
-    for n in needs:
-        if not n:
-            continue
-        parts = re.split(r"[,\s]+", n)
-        for p in parts:
-            p = p.strip()
-            if p:
-                tokens.append(p)
-
-    # 2) 순서 유지 + 중복 제거
-    seen = set()
-    clean_needs: List[str] = []
-    for t in tokens:
-        if t not in seen:
-            seen.add(t)
-            clean_needs.append(t)
+    # needs 리스트 안의 문자열을 콤마/공백 기준으로 전부 쪼개서 토큰화
+    # → dict.fromkeys 로 순서 유지 + 중복 제거
+    tokens = (p for n in needs if n for p in _SPLIT_RE.split(n) if p)
+    clean_needs = list(dict.fromkeys(tokens))
 
     need_txt = " ".join(clean_needs)
 
@@ -174,7 +192,119 @@ def build_query(celeb_name: str, needs: List[str] | Tuple[str,...]) -> str:
 # -----------------------------
 # SerpAPI provider
 # -----------------------------
-def _search_serpapi(
+_SERPAPI_URL = "https://serpapi.com/search.json"
+
+# provider 이름 → (SerpAPI engine, 요청 개수 상한)
+_PROVIDER_ENGINES = {
+    "bing": ("bing_images", None),
+    "google": ("google_images", 10),
+}
+
+# (engine, q, num) → 정규화된 결과 캐시
+# - 같은 연예인+니즈 검색이 반복되는 경우(재시도, 데모, 같은 요청 연타) 유료 SerpAPI 호출을 생략
+# - 검색 결과는 시간이 지나면 바뀌므로 TTL 로 만료 (기본 10분), 오류 응답은 저장하지 않음
+SERPAPI_CACHE_SIZE = int(os.getenv("SERPAPI_CACHE_SIZE", "512"))
+SERPAPI_CACHE_TTL = float(os.getenv("SERPAPI_CACHE_TTL", "600"))
+
+_search_cache: TTLCache = TTLCache(maxsize=SERPAPI_CACHE_SIZE, ttl=SERPAPI_CACHE_TTL)
+_search_cache_lock = threading.Lock()
+
+
+def clear_search_cache() -> int:
+    """SerpAPI 응답 캐시 전체 삭제. 삭제된 항목 수 반환."""
+    with _search_cache_lock:
+        n = len(_search_cache)
+        _search_cache.clear()
+    return n
+
+
+# 서버 이벤트 루프에서 같이 쓰는 AsyncClient (처음 쓸 때 생성, keep-alive 연결 재사용)
+_async_client: httpx.AsyncClient | None = None
+
+
+def _new_async_client() -> httpx.AsyncClient:
+    # transport retries 는 연결 실패(ConnectError / ConnectTimeout)만 재시도, 상태 코드 재시도는 _get_with_retry
+    transport = httpx.AsyncHTTPTransport(retries=SERPAPI_RETRIES)
+    return httpx.AsyncClient(headers=_DEFAULT_HEADERS, timeout=_DEFAULT_TIMEOUT, transport=transport)
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    global _async_client
+    if _async_client is None:
+        _async_client = _new_async_client()
+    return _async_client
+
+
+# 동기 search_reference_images 용 백그라운드 이벤트 루프 + 전용 AsyncClient
+# - 호출마다 asyncio.run 으로 루프/클라이언트를 새로 만들면 SerpAPI 연결(TCP/TLS)도 매번 새로 맺음
+#   → 루프 하나를 데몬 스레드에서 계속 돌리고 그 루프 전용 클라이언트로 keep-alive 연결 재사용
+# - 서버 루프용 _async_client 와는 루프가 달라서 따로 둠 (httpx 연결은 만든 루프에서만 사용 가능)
+_sync_runner: Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient] | None = None
+_sync_runner_lock = threading.Lock()
+
+
+def _get_sync_runner() -> Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]:
+    global _sync_runner
+    if _sync_runner is None:
+        with _sync_runner_lock:
+            if _sync_runner is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="image-searcher-loop", daemon=True).start()
+                _sync_runner = (loop, _new_async_client())
+    return _sync_runner
+
+
+def _retry_delay(r: httpx.Response, attempt: int) -> float | None:
+    """재시도 전 대기 시간 (지수 backoff + jitter, Retry-After 우선). None 이면 재시도 안 함."""
+    ra = r.headers.get("Retry-After")
+    if ra and ra.isdigit():
+        delay = float(ra)
+        return delay if delay <= _RETRY_AFTER_MAX else None
+    return _RETRY_BACKOFF * (2 ** attempt) * (0.5 + random.random())
+
+
+async def _get_with_retry(client: httpx.AsyncClient, url: str, params: Dict[str, Any]) -> httpx.Response:
+    attempt = 0
+    while True:
+        r = await client.get(url, params=params)
+        if r.status_code not in _RETRY_STATUS or attempt >= SERPAPI_RETRIES:
+            return r
+        delay = _retry_delay(r, attempt)
+        if delay is None:
+            return r
+        if _IMG_DEBUG:
+            print(f"[image_searcher] _search_serpapi: retry status={r.status_code}, wait={delay:.2f}s")
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+def _parse_serpapi(engine: str, js: Dict[str, Any]) -> List[Dict[str, Any]]:
+    items: List[Dict[str, Any]] = []
+
+    # bing_images / google_images 모두 images_results 필드를 사용하는 공통 패턴
+    for v in js.get("images_results", []) or []:
+        image_url = v.get("original") or v.get("thumbnail") or v.get("image")
+        page_url  = v.get("link")
+        title     = v.get("title") or v.get("source")
+
+        if not image_url:
+            continue
+
+        # SerpAPI는 mime/type을 잘 안 주므로 fmt/license는 대부분 None
+        items.append(_normalize_item(
+            title=title,
+            image=image_url,
+            thumb=v.get("thumbnail"),
+            page=page_url,
+            fmt=None,
+            license_=None,
+            source=f"{engine}_serpapi",
+        ))
+    return items
+
+
+async def _search_serpapi_async(
+    client: httpx.AsyncClient,
     engine: str,
     q: str,
     num: int = 20,
@@ -190,7 +320,15 @@ def _search_serpapi(
             print(f"[image_searcher] _search_serpapi: SERPAPI_KEY not set. engine={engine}, q='{q}'")
         return []
 
-    url = "https://serpapi.com/search.json"
+    key = (engine, q, num)
+    with _search_cache_lock:
+        cached = _search_cache.get(key)
+    if cached is not None:
+        if _IMG_DEBUG:
+            print(f"[image_searcher] _search_serpapi: cache hit engine={engine}, {len(cached)} items")
+        # 캐시에는 tuple 로 저장 (호출부가 list 를 늘려도 캐시 항목은 그대로)
+        return list(cached)
+
     params = {
         "engine": engine,
         "q": q,
@@ -205,37 +343,17 @@ def _search_serpapi(
         if _IMG_DEBUG:
             print(f"[image_searcher] _search_serpapi: engine={engine}, q='{q}', num={num}")
 
-        r = requests.get(url, headers=_DEFAULT_HEADERS, params=params, timeout=_DEFAULT_TIMEOUT)
+        r = await _get_with_retry(client, _SERPAPI_URL, params)
         r.raise_for_status()
-        js = r.json()
-
-        items: List[Dict[str, Any]] = []
-
-        # bing_images / google_images 모두 images_results 필드를 사용하는 공통 패턴
-        for v in js.get("images_results", []) or []:
-            image_url = v.get("original") or v.get("thumbnail") or v.get("image")
-            page_url  = v.get("link")
-            title     = v.get("title") or v.get("source")
-
-            if not image_url:
-                continue
-
-            # SerpAPI는 mime/type을 잘 안 주므로 fmt/license는 대부분 None
-            items.append(_normalize_item(
-                title=title,
-                image=image_url,
-                thumb=v.get("thumbnail"),
-                page=page_url,
-                fmt=None,
-                license_=None,
-                source=f"{engine}_serpapi",
-            ))
+        items = _parse_serpapi(engine, r.json())
+        with _search_cache_lock:
+            _search_cache[key] = tuple(items)
 
         if _IMG_DEBUG:
             print(f"[image_searcher] _search_serpapi: engine={engine}, got {len(items)} raw items")
 
         return items
-    except requests.RequestException as e:
+    except (httpx.HTTPError, ValueError) as e:
         if _IMG_DEBUG:
             print(f"[image_searcher] _search_serpapi: ERROR engine={engine}, err={e}")
         return []
@@ -243,102 +361,209 @@ def _search_serpapi(
 # -----------------------------
 # Rank / Filter
 # -----------------------------
-def _filter(items: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    out = []
-    for it in items:
-        if not it.get("image"):
-            continue
-        if not _pass_host_policy(it.get("host")):
-            continue
-        out.append(it)
-    return out
-
-def _rank(items: List[Dict[str, Any]], prefer_editorial: bool = True) -> List[Dict[str, Any]]:
+def _score(x: Dict[str, Any], prefer_editorial: bool) -> float:
     """
     간단 랭킹: (editorial 우선) + (호스트명 길이 짧을수록) + (제목 길이 가산)
     실제론 CLIP/text score와 결합 권장.
     """
-    def score(x):
-        s = 0.0
-        if prefer_editorial and x.get("editorial_only"):
-            s += 2.0
-        host = x.get("host") or ""
-        title = x.get("title") or ""
-        s += max(0.0, 1.0 - len(host)/40.0)
-        s += min(len(title)/80.0, 1.0)
-        return s
-    return sorted(items, key=score, reverse=True)
+    s = 0.0
+    if prefer_editorial and x.get("editorial_only"):
+        s += 2.0
+    host = x.get("host") or ""
+    title = x.get("title") or ""
+    s += max(0.0, 1.0 - len(host)/40.0)
+    s += min(len(title)/80.0, 1.0)
+    return s
+
+def _filter_dedup_rank(
+    items: Iterable[Dict[str, Any]],
+    prefer_editorial: bool = True,
+    limit: int | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    호스트 정책 필터 → (image, page) 중복 제거 → 점수순 정렬을 한 번의 순회로 처리.
+    - 중간 리스트를 단계마다 만들지 않고, 상위 limit 개만 heap 으로 뽑음
+    - 동점이면 입력 순서 유지 (기존 sorted(reverse=True) 와 같은 순서)
+    - image/page 는 _normalize_item 에서 이미 정규화된 값이라 그대로 key 로 사용
+    """
+    seen = set()
+    scored = []
+    for idx, it in enumerate(items):
+        image = it.get("image")
+        if not image or not _pass_host_policy(it.get("host")):
+            continue
+        key = (image, it.get("page") or "")
+        if key in seen:
+            continue
+        seen.add(key)
+        scored.append((-_score(it, prefer_editorial), idx, it))
+
+    if _IMG_DEBUG:
+        print(f"[image_searcher] after host filter + dedup: {len(scored)}")
+
+    if limit is None or limit >= len(scored):
+        scored.sort()
+    else:
+        scored = heapq.nsmallest(limit, scored)
+    return [it for _, _, it in scored]
 
 # -----------------------------
 # Public API
 # -----------------------------
-def search_reference_images(
+def _debug_header(celeb_name: str, needs, q: str, providers: Tuple[str, ...], max_results: int) -> None:
+    print("==================================================")
+    print(f"[image_searcher] search_reference_images()")
+    print(f"  celeb_name   = {celeb_name}")
+    print(f"  needs        = {needs}")
+    print(f"  query        = '{q}'")
+    print(f"  providers    = {providers}")
+    print(f"  max_results  = {max_results}")
+    print(f"  whitelist    = {_HOST_WHITELIST}")
+    print(f"  blacklist    = {_HOST_BLACKLIST}")
+
+
+def _provider_calls(
+    client: httpx.AsyncClient,
+    q: str,
+    providers: Tuple[str, ...],
+    max_results: int,
+) -> List[Tuple[str, Any]]:
+    """provider 별 (engine, SerpAPI 호출 coroutine) 리스트. 알 수 없는 provider 는 건너뜀."""
+    calls: List[Tuple[str, Any]] = []
+    for p in providers:
+        if p not in _PROVIDER_ENGINES:
+            continue
+        engine, cap = _PROVIDER_ENGINES[p]
+        num = max_results if cap is None else min(cap, max_results)
+        calls.append((engine, _search_serpapi_async(client, engine, q, num=num)))
+    return calls
+
+
+async def _search(
+    client: httpx.AsyncClient,
     celeb_name: str,
     needs: List[str] | Tuple[str, ...],
-    providers: Tuple[str, ...] = ("bing", "google"),
-    max_results: int = 30,
-    freshness: str = "Month",   # SerpAPI에 직접 쓰진 않지만 시그니처 유지
-    img_size: str = "large",    # SerpAPI에도 직접 쓰진 않음
-    prefer_editorial: bool = True,
-    sleep_between: float = 0.3
+    providers: Tuple[str, ...],
+    max_results: int,
+    prefer_editorial: bool,
 ) -> List[Dict[str, Any]]:
-    """
-    연예인 + 요구사항(예: ["여름옷","블레이저"]) 기준으로 이미지 검색.
-    - providers:
-        "bing"   → SerpAPI Bing Images (engine="bing_images")
-        "google" → SerpAPI Google Images (engine="google_images")
-    - 반환: 공통 스키마 리스트
-    """
     q = build_query(celeb_name, list(needs) if isinstance(needs, tuple) else needs)
 
     if _IMG_DEBUG:
-        print("==================================================")
-        print(f"[image_searcher] search_reference_images()")
-        print(f"  celeb_name   = {celeb_name}")
-        print(f"  needs        = {needs}")
-        print(f"  query        = '{q}'")
-        print(f"  providers    = {providers}")
-        print(f"  max_results  = {max_results}")
-        print(f"  whitelist    = {_HOST_WHITELIST}")
-        print(f"  blacklist    = {_HOST_BLACKLIST}")
+        _debug_header(celeb_name, needs, q, providers, max_results)
 
-    results: List[Dict[str, Any]] = []
-
-    for p in providers:
-        if p == "bing":
-            items = _search_serpapi("bing_images", q, num=max_results)
-            if _IMG_DEBUG:
-                print(f"[image_searcher] provider=bing_serpapi -> {len(items)} items")
-            results += items
-
-        elif p == "google":
-            items = _search_serpapi("google_images", q, num=min(10, max_results))
-            if _IMG_DEBUG:
-                print(f"[image_searcher] provider=google_serpapi -> {len(items)} items")
-            results += items
+    # provider 별 요청은 서로 독립이라 동시에 보냄 (대기 시간 = 가장 느린 provider 1개)
+    # 엔진이 달라 rate limit 이 묶이지 않으므로 provider 사이 sleep 도 없음
+    calls = _provider_calls(client, q, providers, max_results)
+    per_provider = await asyncio.gather(*[c for _, c in calls])
 
-        if sleep_between > 0:
-            time.sleep(sleep_between)
+    results: List[Dict[str, Any]] = []
+    for (engine, _), items in zip(calls, per_provider):
+        if _IMG_DEBUG:
+            print(f"[image_searcher] provider={engine}_serpapi -> {len(items)} items")
+        results += items
 
     if _IMG_DEBUG:
         print(f"[image_searcher] total raw results before filter/dedup: {len(results)}")
         sample_hosts = list({it.get("host") for it in results if it.get("host")})[:10]
         print(f"[image_searcher] sample hosts (raw): {sample_hosts}")
 
-    filtered = _filter(results)
+    ranked = _filter_dedup_rank(results, prefer_editorial=prefer_editorial, limit=max_results)
     if _IMG_DEBUG:
-        print(f"[image_searcher] after host filter: {len(filtered)}")
+        print(f"[image_searcher] after ranking: {len(ranked)}")
+        print("==================================================")
 
-    deduped = _dedup(filtered)
-    if _IMG_DEBUG:
-        print(f"[image_searcher] after dedup: {len(deduped)}")
+    return ranked
+
+
+async def _iter_search(
+    client: httpx.AsyncClient,
+    celeb_name: str,
+    needs: List[str] | Tuple[str, ...],
+    providers: Tuple[str, ...],
+    max_results: int,
+    prefer_editorial: bool,
+) -> AsyncIterator[Dict[str, Any]]:
+    q = build_query(celeb_name, list(needs) if isinstance(needs, tuple) else needs)
 
-    ranked = _rank(deduped, prefer_editorial=prefer_editorial)
     if _IMG_DEBUG:
-        print(f"[image_searcher] after ranking: {len(ranked)}")
-        print("==================================================")
+        _debug_header(celeb_name, needs, q, providers, max_results)
+
+    tasks = [asyncio.ensure_future(c) for _, c in _provider_calls(client, q, providers, max_results)]
+    seen = set()
+    n = 0
+    try:
+        # 먼저 끝난 provider 결과부터 (provider 안에서는 점수순) 바로 내보냄
+        for fut in asyncio.as_completed(tasks):
+            for it in _filter_dedup_rank(await fut, prefer_editorial=prefer_editorial):
+                key = (it["image"], it.get("page") or "")
+                if key in seen:
+                    continue
+                seen.add(key)
+                yield it
+                n += 1
+                if n >= max_results:
+                    return
+    finally:
+        # 호출부가 중간에 그만 받으면 아직 안 끝난 provider 요청은 취소
+        for t in tasks:
+            t.cancel()
+
+
+async def search_reference_images_async(
+    celeb_name: str,
+    needs: List[str] | Tuple[str, ...],
+    providers: Tuple[str, ...] = ("bing", "google"),
+    max_results: int = 30,
+    prefer_editorial: bool = True,
+) -> List[Dict[str, Any]]:
+    """
+    연예인 + 요구사항(예: ["여름옷","블레이저"]) 기준으로 이미지 검색. (서버 이벤트 루프용)
+    - providers:
+        "bing"   → SerpAPI Bing Images (engine="bing_images")
+        "google" → SerpAPI Google Images (engine="google_images")
+    - 반환: 공통 스키마 리스트
+    """
+    return await _search(_get_async_client(), celeb_name, needs,
+                         providers, max_results, prefer_editorial)
+
+
+def iter_reference_images_async(
+    celeb_name: str,
+    needs: List[str] | Tuple[str, ...],
+    providers: Tuple[str, ...] = ("bing", "google"),
+    max_results: int = 30,
+    prefer_editorial: bool = True,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    search_reference_images_async 의 스트리밍 버전 (async generator).
+    - provider 응답이 오는 대로 그 provider 결과를 점수순으로 하나씩 yield
+      → 느린 provider 를 기다리지 않고 호출부가 첫 이미지부터 다음 단계(Vision 분석 등)를 시작할 수 있음
+    - 순위는 provider 안에서만 매김 (전체 결과를 모아 한 번에 정렬하는 search_reference_images_async 와 순서가 다를 수 있음)
+    - 중간에 그만 받을 때는 aclose() 로 닫으면 남은 provider 요청도 취소됨
+    """
+    return _iter_search(_get_async_client(), celeb_name, needs,
+                        providers, max_results, prefer_editorial)
+
 
-    return ranked[:max_results]
+def search_reference_images(
+    celeb_name: str,
+    needs: List[str] | Tuple[str, ...],
+    providers: Tuple[str, ...] = ("bing", "google"),
+    max_results: int = 30,
+    freshness: str = "Month",   # SerpAPI에 직접 쓰진 않지만 시그니처 유지
+    img_size: str = "large",    # SerpAPI에도 직접 쓰진 않음
+    prefer_editorial: bool = True,
+    sleep_between: float = 0.3  # provider 를 동시에 호출하므로 더 이상 쓰지 않음 (시그니처 유지)
+) -> List[Dict[str, Any]]:
+    """
+    search_reference_images_async 의 동기 버전 (CLI / 벤치마크 스크립트용).
+    실행 중인 이벤트 루프 안에서는 search_reference_images_async 를 await 할 것.
+    """
+    loop, client = _get_sync_runner()
+    fut = asyncio.run_coroutine_threadsafe(
+        _search(client, celeb_name, needs, providers, max_results, prefer_editorial), loop)
+    return fut.result()
 
 # -----------------------------
 # CLI quick test
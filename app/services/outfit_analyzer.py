@@ -2,45 +2,373 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import asyncio
 import base64
-import requests
-import os, json
-from typing import List, Dict, Any
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+import time
+from typing import List, Dict, Any, AsyncIterable, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from cachetools import TTLCache
+from openai import BadRequestError
+
+from ._http import get_session, split_timeout
+from .vision_preprocess import downscale_jpeg
+from ._openai import (get_client, get_async_client, collect_json_stream, acollect_json_stream,
+                      json_response_format)
+from ..utils import fastjson
+from ..config import VISION_MODEL  # Vision 모델 (OPENAI_VISION_MODEL, 원하면 gpt-4o-mini 등으로 바꿔도 됨)
+
+_CATEGORIES = ("top", "bottom", "outer", "dress", "shoes", "bag", "accessory")
+
+# system 메시지: 역할 + 하드 규칙 + 필드별 라벨 목록만
+# - 출력 구조는 response_format(strict JSON schema)이 강제하므로 스키마 예시/장식 구분선은 넣지 않음 (prefill 토큰 절약)
+# - 구조 한 줄은 OPENAI_STRICT_JSON=0 (json_object 모드) 일 때를 위해 남겨 둠
+OUTFIT_PROMPT = (
+    "패션 데이터셋 라벨러. 이미지 1장마다 look 1개로, 인물이 실제로 착용한 옷/신발/가방/악세사리만 JSON 으로 정리.\n"
+    "규칙:\n"
+    "- 보이지 않는 아이템, 배경/옷걸이/광고 속 아이템은 넣지 않음 (추측 금지)\n"
+    "- category ~ season 라벨은 영어 소문자\n"
+    "garment 필드:\n"
+    "- name: 구체 명칭 (예: '화이트 린넨 크롭 블레이저')\n"
+    f"- category: {'|'.join(_CATEGORIES)}\n"
+    "- sub_category: tshirt|shirt|knit|hoodie|jeans|slacks|skirt|coat|jacket|blazer 등\n"
+    "- style: minimal|street|classic|romantic|hiphop|cityboy|amekaji|formal 중 1개\n"
+    "- color: white|black|gray|navy|beige|brown|blue|red|green 등 기본 색 이름\n"
+    "- fit: slim|regular|oversized|relaxed\n"
+    "- season: spring|summer|fall|winter|all (두께/스타일 기준, 계절 무관이면 all)\n"
+    'JSON 만 출력: {"looks":[{"overall_style":"미니멀 캐주얼 / 스트릿 등","garments":[{...}]}],"summary":"전체 코디 특징 요약"}'
+)
+
+# user 메시지 텍스트 (이미지들 앞에 붙음)
+OUTFIT_USER_TEXT = "다음 코디 참고 이미지를 분석해줘."
+
+# 고정 prefix (system → user 텍스트) 를 매 호출 동일하게 유지해서 OpenAI prompt caching 적중
+# (캐시 key 는 model + 앞부분 prefix, 이미지/URL 같은 가변 입력은 그 뒤에만 붙음)
+_SYSTEM_MSG = {"role": "system", "content": OUTFIT_PROMPT}
+
+# OUTFIT_PROMPT 출력 스키마의 strict JSON schema 버전
+# look 의 image_url 은 _parse_outfit_content 에서 입력 URL 로 덮어쓰므로 모델이 생성하지 않게 스키마에서 뺌
+# (data URL 이미지라 모델이 알 수 있는 값도 아님)
+_GARMENT_FIELDS = ("name", "category", "sub_category", "style", "color", "fit", "season")
+_OUTFIT_RESPONSE_FORMAT = json_response_format("outfit_analysis", {
+    "type": "object",
+    "properties": {
+        "looks": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "overall_style": {"type": "string"},
+                    "garments": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                **{f: {"type": "string"} for f in _GARMENT_FIELDS},
+                                "category": {"type": "string", "enum": list(_CATEGORIES)},
+                            },
+                            "required": list(_GARMENT_FIELDS),
+                            "additionalProperties": False,
+                        },
+                    },
+                },
+                "required": ["overall_style", "garments"],
+                "additionalProperties": False,
+            },
+        },
+        "summary": {"type": "string"},
+    },
+    "required": ["looks", "summary"],
+    "additionalProperties": False,
+})
+
+# analyze_outfit_with_gpt 에서 이미지를 동시에 받을 최대 스레드 수
+_MAX_FETCH_WORKERS = 8
+# 이미지별 Vision 호출을 동시에 몇 개까지 보낼지 (OpenAI rate limit 고려)
+OUTFIT_MAX_CONCURRENCY = int(os.getenv("OUTFIT_MAX_CONCURRENCY", "8"))
+# 이미지 다운로드 chunk 크기
+_FETCH_CHUNK = 64 * 1024
+# 이보다 큰 원본은 받지 않음 (헤더의 Content-Length, 없으면 받는 도중 누적 크기로 판단)
+OUTFIT_MAX_DOWNLOAD_BYTES = int(os.getenv("OUTFIT_MAX_DOWNLOAD_BYTES", str(8 * 1024 * 1024)))
+# 이미지가 아닌 게 확실한 Content-Type (application/octet-stream 등은 S3 에서 흔해서 그대로 받아 봄)
+_NON_IMAGE_TYPES = ("text/", "video/", "audio/", "application/json", "application/xml")
+# Vision image_url 의 detail (auto|low|high)
+# - low: 이미지를 512px 한 장으로만 보고 고정 85 토큰 → 입력 토큰/prefill 시간이 크게 줄지만 작은 소재/디테일은 놓칠 수 있음
+# - 기본 auto 는 기존 동작 그대로 (1024px 이면 high 타일 계산)
+# - 그 외 값은 Vision API 가 400 으로 거절하므로 import 시 경고 출력 후 auto 로 대체
+_IMAGE_DETAILS = ("auto", "low", "high")
+OUTFIT_IMAGE_DETAIL = (os.getenv("OUTFIT_IMAGE_DETAIL") or "auto").strip().lower()
+if OUTFIT_IMAGE_DETAIL not in _IMAGE_DETAILS:
+    print(f"[outfit_analyzer] invalid OUTFIT_IMAGE_DETAIL={OUTFIT_IMAGE_DETAIL!r}, "
+          f"expected one of {'|'.join(_IMAGE_DETAILS)} → using 'auto'")
+    OUTFIT_IMAGE_DETAIL = "auto"
+# Vision 에 보내기 전 긴 변 최대 길이 (여러 벌이 보이는 코디 사진이라 의류 태깅용 768 보다 크게)
+# detail=low 면 어차피 512px 로 줄여서 보므로 그 이상은 전송/인코딩 낭비
+OUTFIT_MAX_SIDE = int(os.getenv("OUTFIT_MAX_SIDE", "512" if OUTFIT_IMAGE_DETAIL == "low" else "1024"))
+
+# 다운로드 / base64 변환 없이 URL 을 그대로 넘겨도 되는 공개 이미지 CDN (쉼표 구분, 빈 값이면 전부 직접 받음)
+# - 인증/만료 서명 없이 OpenAI 서버가 바로 받을 수 있는 호스트만 (S3 presigned URL 등은 넣지 말 것)
+# - 원본이 커도 Vision 이 2048px → 짧은 변 768px 로 줄여서 타일을 세므로 입력 토큰은 1024px 로 줄여 보낼 때와 비슷
+# - OpenAI 가 직접 받지 못하면 (접근 거부 / rate limit, 400) 이미지별 분석에서 data URL 로 1번 재시도
+OUTFIT_DIRECT_HOSTS = frozenset(
+    h.strip().lower()
+    for h in os.getenv("OUTFIT_DIRECT_HOSTS", "upload.wikimedia.org,images.unsplash.com").split(",")
+    if h.strip()
+)
+
+# URL → data URL 캐시
+# - 같은 레퍼런스 이미지를 다시 분석할 때 다운로드 + base64 인코딩 생략
+# - 항목 하나가 수백 KB 라서 개수가 아니라 문자열 길이 합(bytes)으로 크기 제한 (기본 64MB)
+# - URL 의 이미지는 바뀔 수 있으므로 TTL 로 만료 (기본 1시간), 다운로드 실패는 저장하지 않음
+OUTFIT_IMAGE_CACHE_BYTES = int(os.getenv("OUTFIT_IMAGE_CACHE_BYTES", str(64 * 1024 * 1024)))
+OUTFIT_IMAGE_CACHE_TTL = float(os.getenv("OUTFIT_IMAGE_CACHE_TTL", "3600"))
+
+_image_cache: TTLCache = TTLCache(maxsize=OUTFIT_IMAGE_CACHE_BYTES, ttl=OUTFIT_IMAGE_CACHE_TTL, getsizeof=len)
+_image_cache_lock = threading.Lock()
+
+
+def clear_image_cache() -> int:
+    """이미지 data URL 캐시 전체 삭제. 삭제된 항목 수 반환."""
+    with _image_cache_lock:
+        n = len(_image_cache)
+        _image_cache.clear()
+    return n
+
+
+# 이미지 URL → 분석 결과 캐시 (이미지별로 요청하므로 key 도 이미지 한 장 단위)
+# - 같은 연예인 레퍼런스 이미지가 세션마다 다시 들어오는 경우 Vision 호출 생략
+#   여러 장 분석도 이미지별 결과를 이어 붙이는 것이라 URL 목록 순서/조합이 달라도 장마다 적중
+# - 메모리(TTL) + OUTFIT_CACHE_DIR 아래 JSON 파일 (워커/재시작 간 공유, 빈 값이면 디스크 캐시 끔)
+# - 다운로드/API 실패 결과는 저장하지 않음
+OUTFIT_CACHE_SIZE = int(os.getenv("OUTFIT_CACHE_SIZE", "1024"))
+OUTFIT_CACHE_TTL = float(os.getenv("OUTFIT_CACHE_TTL", str(7 * 24 * 3600)))
+OUTFIT_CACHE_DIR = os.getenv("OUTFIT_CACHE_DIR", os.path.join(".cache", "outfit"))
+
+_outfit_cache: TTLCache = TTLCache(maxsize=OUTFIT_CACHE_SIZE, ttl=OUTFIT_CACHE_TTL)
+_outfit_cache_lock = threading.Lock()
+
+
+def _outfit_key(image_urls: List[str]) -> str:
+    raw = "\n".join([VISION_MODEL, str(OUTFIT_MAX_SIDE), OUTFIT_IMAGE_DETAIL, *image_urls])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _outfit_path(key: str) -> str | None:
+    return os.path.join(OUTFIT_CACHE_DIR, f"{key}.json") if OUTFIT_CACHE_DIR else None
+
+
+def _load_outfit(key: str) -> Dict[str, Any] | None:
+    # JSON 텍스트로 저장해 두고 적중할 때마다 새로 파싱 (호출부가 looks 를 고쳐도 캐시는 그대로)
+    with _outfit_cache_lock:
+        text = _outfit_cache.get(key)
+    if text is None:
+        path = _outfit_path(key)
+        if not path:
+            return None
+        try:
+            if time.time() - os.path.getmtime(path) > OUTFIT_CACHE_TTL:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except OSError:
+            return None
+        with _outfit_cache_lock:
+            _outfit_cache[key] = text
+    try:
+        cached = fastjson.loads(text)
+    except fastjson.JSONDecodeError:
+        return None
+    return cached if isinstance(cached, dict) else None
 
-from dotenv import load_dotenv
-from openai import OpenAI
 
-load_dotenv()
+def _store_outfit(key: str, data: Dict[str, Any]) -> None:
+    if "raw" in data or not data.get("looks"):
+        # 모델이 JSON 이 아닌 걸 내보냈거나, 빈 응답/거절로 look 이 하나도 없는 경우는 저장하지 않음
+        # (저장하면 그 이미지는 TTL 동안 계속 빈 결과가 됨 → 다음 요청에서 다시 시도)
+        return
+    text = fastjson.dumps(data)
+    with _outfit_cache_lock:
+        _outfit_cache[key] = text
 
-# Vision 모델 (원하면 gpt-4o-mini 등으로 바꿔도 됨)
-VISION_MODEL = os.getenv("OPENAI_VISION_MODEL", "gpt-4o")
+    path = _outfit_path(key)
+    if not path:
+        return
+    try:
+        os.makedirs(OUTFIT_CACHE_DIR, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"[outfit_analyzer] cache write ERROR path={path}, err={e}")
+
+
+def clear_outfit_cache() -> int:
+    """코디 분석 결과 캐시(메모리 + 디스크) 전체 삭제. 삭제된 항목 수 반환."""
+    with _outfit_cache_lock:
+        n = len(_outfit_cache)
+        _outfit_cache.clear()
+
+    if OUTFIT_CACHE_DIR and os.path.isdir(OUTFIT_CACHE_DIR):
+        for name in os.listdir(OUTFIT_CACHE_DIR):
+            if name.endswith(".json"):
+                try:
+                    os.remove(os.path.join(OUTFIT_CACHE_DIR, name))
+                    n += 1
+                except OSError:
+                    pass
+    return n
 
-client = OpenAI()
 
 def _url_to_data_image(url: str, timeout: float = 8.0) -> str | None:
     """
     원격 이미지 URL -> data:image/...;base64,... 형태로 변환.
     OpenAI 서버가 직접 다운로드하지 않게 하기 위함.
     """
+    with _image_cache_lock:
+        cached = _image_cache.get(url)
+    if cached is not None:
+        return cached
+
     try:
-        r = requests.get(url, timeout=timeout, headers={"User-Agent": "style-pipeline/1.0"})
-        r.raise_for_status()
-        content_type = r.headers.get("Content-Type", "image/jpeg")
-        if not content_type.startswith("image/"):
+        # r.content 로 한 번에 받지 않고 chunk 단위로 bytearray 에 이어 붙임
+        # (큰 이미지에서 중간 bytes 사본 없이 base64 인코딩까지 한 번에)
+        with get_session().get(url, timeout=split_timeout(timeout), stream=True) as r:
+            r.raise_for_status()
+            # stream=True 라 여기까지는 헤더만 받은 상태 → HTML 에러 페이지 / 동영상 / 너무 큰 파일은 본문 받기 전에 중단
+            # (HEAD 를 따로 보내면 정상 이미지마다 왕복이 하나 더 늘어서 GET 응답 헤더로 판단)
+            content_type = r.headers.get("Content-Type", "image/jpeg").lower()
+            if content_type.startswith(_NON_IMAGE_TYPES):
+                print(f"[outfit_analyzer] skip non-image url={url}, content_type={content_type}")
+                return None
+            length = r.headers.get("Content-Length")
+            if length and length.isdigit() and int(length) > OUTFIT_MAX_DOWNLOAD_BYTES:
+                print(f"[outfit_analyzer] skip too large url={url}, bytes={length}")
+                return None
+            if not content_type.startswith("image/"):
+                content_type = "image/jpeg"
+            buf = bytearray()
+            for chunk in r.iter_content(chunk_size=_FETCH_CHUNK):
+                buf += chunk
+                if len(buf) > OUTFIT_MAX_DOWNLOAD_BYTES:
+                    print(f"[outfit_analyzer] skip too large url={url}, bytes>{OUTFIT_MAX_DOWNLOAD_BYTES}")
+                    return None
+        # 원본 해상도 그대로 보내면 Vision 타일 수(= 입력 토큰)가 크게 늘어남
+        # → 긴 변 OUTFIT_MAX_SIDE 로 줄인 JPEG 로 재인코딩 (디코딩 안 되는 형식이면 원본 그대로)
+        try:
+            buf = downscale_jpeg(buf, OUTFIT_MAX_SIDE)
             content_type = "image/jpeg"
-        b64 = base64.b64encode(r.content).decode("utf-8")
-        return f"data:{content_type};base64,{b64}"
+        except Exception as e:
+            print(f"[outfit_analyzer] downscale skipped url={url}, err={e}")
+        # 큰 중간 버퍼는 다음 단계 만들자마자 해제 → 동시에 살아 있는 사본을 2개 이하로
+        b64 = base64.b64encode(buf)
+        del buf
+        raw = b"data:%s;base64,%s" % (content_type.encode("ascii", "ignore"), b64)
+        del b64
+        # base64 출력은 ASCII 라서 ascii 디코딩 (utf-8 보다 빠른 경로)
+        data_url = raw.decode("ascii")
     except Exception as e:
         # 디버그용으로만 출력
         print(f"[outfit_analyzer] _url_to_data_image ERROR url={url}, err={e}")
         return None
 
+    with _image_cache_lock:
+        try:
+            _image_cache[url] = data_url
+        except ValueError:
+            # 캐시 전체 크기보다 큰 이미지는 저장하지 않음
+            pass
+    return data_url
+
+
+def _is_direct_url(url: str) -> bool:
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return False
+    return parts.scheme == "https" and (parts.hostname or "") in OUTFIT_DIRECT_HOSTS
+
+
+def _is_image_download_error(e: Exception) -> bool:
+    """OpenAI 가 image_url 을 직접 받다가 실패한 400 (접근 거부 / rate limit / timeout 등) 인지"""
+    if not isinstance(e, BadRequestError):
+        return False
+    return getattr(e, "code", None) == "invalid_image_url" or "download" in str(e).lower()
+
+
+def _image_input_url(url: str) -> str | None:
+    """Vision 에 넣을 image_url 값. 공개 CDN 은 원본 URL 그대로, 나머지는 data URL (실패는 None)"""
+    if _is_direct_url(url):
+        return url
+    return _url_to_data_image(url)
+
+
+def _chat_params(user_content: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """chat.completions 요청 파라미터 (동기 / async / Batch API 요청이 모두 같은 값을 쓰도록 한 곳에)"""
+    return {
+        "model": VISION_MODEL,
+        "temperature": 0.2,
+        "max_tokens": 1200,
+        "response_format": _OUTFIT_RESPONSE_FORMAT,
+        "messages": [
+            _SYSTEM_MSG,
+            {"role": "user", "content": user_content},
+        ],
+    }
+
+
+def _fetch_data_urls(urls: List[str]) -> List[str | None]:
+    """URL 리스트 → image_url 값 리스트 (입력 순서 유지, 실패는 None). 다운로드는 I/O 대기라 스레드로 동시에."""
+    if not urls:
+        return []
+    if all(_is_direct_url(u) for u in urls):
+        # 전부 공개 CDN 이면 받을 게 없으므로 스레드풀도 생략
+        return list(urls)
+    with ThreadPoolExecutor(max_workers=min(_MAX_FETCH_WORKERS, len(urls))) as ex:
+        return list(ex.map(_image_input_url, urls))
+
+
+def _parse_outfit_content(content: str, image_urls: List[str]) -> Dict[str, Any]:
+    """GPT 응답 텍스트 → looks/summary 기본값 보정 + look마다 입력 URL 매핑"""
+    try:
+        data = fastjson.loads(content)
+    except fastjson.JSONDecodeError:
+        # 혹시 모델이 JSON이 아닌 걸 내보내면, 최소한 래핑해서 반환
+        data = {"raw": content}
+
+    # 안전장치: 필드 기본값 보정
+    data.setdefault("looks", [])
+    if not isinstance(data["looks"], list):
+        data["looks"] = []
+
+    if "summary" not in data:
+        # looks를 기반으로 간단 요약 만들어 넣기
+        data["summary"] = f"{len(data['looks'])}개의 코디를 분석한 결과."
+        
+        # 🔥 여기서부터 URL 강제 매핑
+    looks = data.get("looks")
+    if isinstance(looks, list):
+        for idx, look in enumerate(looks):
+            if idx < len(image_urls):
+                # 모델이 써준 image_url은 버리고, 우리가 입력한 URL을 덮어쓴다
+                look["image_url"] = image_urls[idx]
+
+    return data
+
 
 def analyze_outfit_with_gpt(image_urls: List[str]) -> Dict[str, Any]:
     """
     여러 장의 코디 이미지를 GPT Vision으로 분석해서
     공통된 스타일/아이템 정보를 JSON으로 반환.
 
+    이미지마다 요청을 따로 보내서 스레드로 동시에 실행 (한 프롬프트에 전부 넣으면 응답 토큰이 이미지 수만큼
+    늘어나 순차 생성 시간이 그대로 쌓임). 결과는 입력 순서대로 looks 를 이어 붙인 것 (같은 URL 은 한 번만).
+    이벤트 루프 안에서도 부를 수 있도록 asyncio.run 대신 스레드 사용. 서버 경로에서는 analyze_outfit_with_gpt_async 사용.
+
     입력:
         image_urls: 분석할 이미지 URL 리스트
 
@@ -67,161 +395,307 @@ def analyze_outfit_with_gpt(image_urls: List[str]) -> Dict[str, Any]:
       "summary": "전체 코디 특징 요약"
     }
     """
-    if not image_urls:
+    # 빈 값 제거 + 중복 URL 은 한 번만 분석 (순서 유지)
+    urls = list(dict.fromkeys(url for url in image_urls if url))
+    if not urls:
         return {"looks": [], "summary": "no images"}
 
-    # system 메시지: 역할 + 출력 포맷 힌트
-    OUTFIT_PROMPT = """
-        당신은 패션 전문 스타일리스트이자 패션 데이터셋 라벨러입니다.
-        당신의 임무는 이미지 속 코디를 사람이 이해하기 쉽고, 기계가 재사용하기 좋은
-        정규화된 JSON 구조로 표현하는 것입니다.
+    with ThreadPoolExecutor(max_workers=min(OUTFIT_MAX_CONCURRENCY, len(urls))) as ex:
+        results = list(ex.map(_analyze_one_sync, urls))
+    return _merge_per_image(urls, results)
 
-        =====================================================================
-        [분석 대상]
-        - 이미지 속 인물이 실제로 착용하고 있는 옷/신발/가방/악세사리만 추출하세요.
-        - 배경 사물, 의자가 걸려 있는 옷, 그림 속 패턴은 절대 포함하지 마세요.
-        - 여러 장의 이미지가 입력될 수 있으며, 각 이미지 → 하나의 look 으로 분석합니다.
 
-        =====================================================================
-        [필수 규칙 — 반드시 준수해야 합니다]
-        1) 추측 금지: 보이지 않는 부위(예: 신발이 안 보임)는 절대 생성하지 말고 제외합니다.
-        2) 실제 착용 아이템만 추출합니다. (옷걸이, 배경, 광고 텍스트 무시)
-        3) 각 garment(아이템)에는 아래 필드를 반드시 포함해야 합니다:
+async def analyze_outfit_with_gpt_async(image_urls: List[str]) -> Dict[str, Any]:
+    """
+    analyze_outfit_with_gpt 의 AsyncOpenAI 버전 (반환 스키마 동일).
+    이미지별 analyze_one_image_with_gpt 를 asyncio.gather 로 동시에 실행 (동시 요청 수는 OUTFIT_MAX_CONCURRENCY 까지).
+    recommend_async 등 다른 GPT 호출과도 asyncio.gather 로 겹쳐서 실행 가능.
+    """
+    # 빈 값 제거 + 중복 URL 은 한 번만 분석 (순서 유지)
+    urls = list(dict.fromkeys(url for url in image_urls if url))
+    if not urls:
+        return {"looks": [], "summary": "no images"}
 
-        {
-        "name": "사람이 이해할 수 있는 구체 명칭 (예: '화이트 린넨 크롭 블레이저')",
-        "category": "top | bottom | outer | dress | shoes | bag | accessory",
-        "sub_category": "tshirt | shirt | knit | hoodie | jeans | slacks | skirt | coat | jacket | blazer 등",
-        "style": "minimal | street | classic | romantic | hiphop | cityboy | amekaji | formal 등 스타일 태그 1개",
-        "color": "white | black | gray | navy | beige | brown | blue | red | green 등 기본 색상 이름",
-        "fit": "slim | regular | oversized | relaxed",
-        "season": "spring | summer | fall | winter | all"
-        }
+    sem = asyncio.Semaphore(OUTFIT_MAX_CONCURRENCY)
 
-        ⚠ 중요:
-        - 보이지 않는 정보는 무조건 "unknown" 대신 정확히 "all" 또는 "unknown" 으로 구분하여 넣어야 합니다.
-        - season은 착용한 옷의 두께/스타일 기준으로 한계절 선택하거나, 모든 계절 가능하면 "all".
-        - 모든 라벨은 영어 소문자로 표준화합니다.
+    async def _one(url: str) -> Dict[str, Any]:
+        async with sem:
+            return await analyze_one_image_with_gpt(url)
+
+    results = await asyncio.gather(*[_one(url) for url in urls])
+    return _merge_per_image(urls, results)
 
-        ============================================================
-        [최종 출력 JSON 스키마 — 이 형식을 반드시 그대로 따르세요]
-        
-        {
-        "looks": [
-            {
-            "overall_style": "미니멀 캐주얼 / 포멀 오피스룩 / 스트릿 / 로맨틱 등",
-            "garments": [
-                {
-                    "name": "...",
-                    "category": "...",
-                    "sub_category": "...",
-                    "style": "...",
-                    "color": "...",
-                    "fit": "...",
-                    "season": "..."
-                }
-            ]
-            }
-        ],
-        "summary": "전체 코디 특징 요약"
-        }
-        ============================================================
 
-        [설명하지 말고 JSON만 출력하세요.]
+async def analyze_outfit_stream_async(
+    image_urls: AsyncIterable[str],
+    max_images: int | None = None,
+) -> Tuple[List[str], Dict[str, Any]]:
     """
+    URL 이 하나씩 도착하는 async iterable(검색 결과 스트림 등) → 도착하는 대로 이미지별 분석을 바로 시작.
+    검색이 전부 끝날 때까지 기다렸다가 analyze_outfit_with_gpt_async 를 부르는 것보다
+    첫 Vision 호출이 빨리 시작됨 (동시 요청 수는 OUTFIT_MAX_CONCURRENCY 까지).
+    빈 값 / 중복 URL 은 건너뛰고, 서로 다른 URL max_images 개를 받으면 스트림을 닫음 (None 이면 끝까지).
 
-    # user 메시지 content 구성
-    user_content: List[Dict[str, Any]] = []
+    반환: (분석한 URL 리스트(도착 순서), analyze_outfit_with_gpt_async 와 같은 스키마 dict)
+    """
+    sem = asyncio.Semaphore(OUTFIT_MAX_CONCURRENCY)
 
-    '''
-    # 1) 텍스트 설명
-    user_text = (
-        "다음 이미지들에 대해 위에서 설명한 JSON 스키마에 맞춰 분석해줘.\n"
-        "이미지들은 모두 같은 연예인(또는 비슷한 사람)의 코디 참고용이야.\n"
-        "각 look마다 image_url 필드에 해당 이미지 URL을 그대로 넣어줘."
-    )
-    user_content.append({"type": "text", "text": user_text})
+    async def _one(url: str) -> Dict[str, Any]:
+        async with sem:
+            return await analyze_one_image_with_gpt(url)
 
-    # 2) 이미지 URL들 추가 (중요: type='image_url')
-    for url in image_urls:
-        if not url:
-            continue
-        user_content.append({
-            "type": "image_url",
-            "image_url": {"url": url}
-        })'''
-        
-    # 1) 텍스트 설명
-    user_text = (
-        "다음 이미지들에 대해 위에서 설명한 JSON 스키마에 맞춰 분석해줘.\n"
-        "이미지들은 모두 같은 연예인(또는 비슷한 사람)의 코디 참고용이야.\n"
-        "각 look마다 image_url 필드에 해당 이미지 URL을 그대로 넣어줘."
-    )
-    user_content.append({"type": "text", "text": user_text})
+    urls: List[str] = []
+    tasks: List[asyncio.Task] = []
+    try:
+        if max_images is None or max_images > 0:
+            async for url in image_urls:
+                if not url or url in urls:
+                    continue
+                urls.append(url)
+                tasks.append(asyncio.create_task(_one(url)))
+                if max_images is not None and len(urls) >= max_images:
+                    break
+    except BaseException:
+        # 검색 스트림이 실패/취소되면 이미 시작한 분석도 같이 취소
+        for t in tasks:
+            t.cancel()
+        raise
+    finally:
+        aclose = getattr(image_urls, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+    if not urls:
+        return [], {"looks": [], "summary": "no images"}
+    results = await asyncio.gather(*tasks)
+    return urls, _merge_per_image(urls, results)
+
+
+def _merge_per_image(image_urls: List[str], results: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """이미지별 분석 결과 → looks 를 입력 순서대로 이어 붙이고 summary 는 중복 없이 " / " 로 연결"""
+    looks: List[Dict[str, Any]] = []
+    summaries: List[str] = []
+    for url, data in zip(image_urls, results):
+        data_looks = data.get("looks") or []
+        for look in data_looks:
+            look["image_url"] = url
+            looks.append(look)
+        s = data.get("summary") or ""
+        if data_looks and s and s not in summaries:
+            summaries.append(s)
+    if not looks:
+        return {"looks": [], "summary": "no valid images"}
+    return {"looks": looks, "summary": " / ".join(summaries)}
 
-    # 2) 이미지들을 data:image/...;base64 로 변환해서 추가
-    valid_image_count = 0
-    for url in image_urls:
-        if not url:
-            continue
 
-        data_url = _url_to_data_image(url)
-        if not data_url:
-            # 다운로드 실패한 URL은 스킵
-            continue
+def _image_part(image_input: str) -> Dict[str, Any]:
+    return {"type": "image_url", "image_url": {"url": image_input, "detail": OUTFIT_IMAGE_DETAIL}}
 
-        user_content.append({
-            "type": "image_url",
-            "image_url": {"url": data_url}
-        })
-        valid_image_count += 1
 
-    if valid_image_count == 0:
-        # 이미지 하나도 못 가져왔으면 안전하게 fallback
-        return {"looks": [], "summary": "no valid images"}
+def _one_image_content(image_input: str) -> List[Dict[str, Any]]:
+    return [
+        {"type": "text", "text": OUTFIT_USER_TEXT},
+        _image_part(image_input),
+    ]
 
 
-    # GPT 호출
-    resp = client.chat.completions.create(
-        model=VISION_MODEL,
-        temperature=0.2,
-        max_tokens=1200,
-        response_format={"type": "json_object"},
-        messages=[
-            {"role": "system", "content": OUTFIT_PROMPT},
-            {"role": "user", "content": user_content},
-        ],
-    )
+def _analyze_one_sync(image_url: str) -> Dict[str, Any]:
+    """analyze_one_image_with_gpt 의 동기 버전 (analyze_outfit_with_gpt 의 스레드에서 실행)"""
+    key = _outfit_key([image_url])
+    cached = _load_outfit(key)
+    if cached is not None:
+        return cached
 
-    content = resp.choices[0].message.content or "{}"
+    image_input = _image_input_url(image_url)
+    if not image_input:
+        return {"looks": [], "summary": "no valid images"}
+
+    def _call(image_input: str) -> str:
+        # 스트리밍으로 받아서 JSON 객체가 닫히는 시점에 바로 종료
+        stream = get_client().chat.completions.create(**_chat_params(_one_image_content(image_input)), stream=True)
+        return collect_json_stream(stream) or "{}"
 
     try:
-        data = json.loads(content)
-    except json.JSONDecodeError:
-        # 혹시 모델이 JSON이 아닌 걸 내보내면, 최소한 래핑해서 반환
-        data = {"raw": content}
+        try:
+            content = _call(image_input)
+        except BadRequestError as e:
+            # 공개 CDN URL 을 OpenAI 가 직접 받지 못한 경우 → 우리가 받아서 data URL 로 1번 재시도
+            if image_input != image_url or not _is_image_download_error(e):
+                raise
+            print(f"[outfit_analyzer] direct url fetch failed, retry with data url url={image_url}, err={e}")
+            image_input = _url_to_data_image(image_url)
+            if not image_input:
+                return {"looks": [], "summary": "no valid images"}
+            content = _call(image_input)
+    except Exception as e:
+        print(f"[outfit_analyzer] analyze_outfit_with_gpt ERROR url={image_url}, err={e}")
+        return {"looks": [], "summary": ""}
 
-    # 안전장치: 필드 기본값 보정
-    data.setdefault("looks", [])
-    if not isinstance(data["looks"], list):
-        data["looks"] = []
+    data = _parse_outfit_content(content, [image_url])
+    _store_outfit(key, data)
+    return data
 
-    if "summary" not in data:
-        # looks를 기반으로 간단 요약 만들어 넣기
-        data["summary"] = f"{len(data['looks'])}개의 코디를 분석한 결과."
-        
-        # 🔥 여기서부터 URL 강제 매핑
-    looks = data.get("looks")
-    if isinstance(looks, list):
-        for idx, look in enumerate(looks):
-            if idx < len(image_urls):
-                # 모델이 써준 image_url은 버리고, 우리가 입력한 URL을 덮어쓴다
-                look["image_url"] = image_urls[idx]
 
+async def analyze_one_image_with_gpt(image_url: str) -> Dict[str, Any]:
+    """
+    이미지 1장을 GPT Vision(AsyncOpenAI)으로 분석.
+    여러 장을 asyncio.gather 로 동시에 호출하기 위한 버전이며,
+    반환 스키마는 analyze_outfit_with_gpt 와 동일 (looks 는 보통 1개).
+    """
+    if not image_url:
+        return {"looks": [], "summary": "no images"}
+
+    key = _outfit_key([image_url])
+    # 메모리 miss 면 디스크 캐시 확인(getmtime + 파일 읽기)이라 event loop 를 막지 않도록 스레드에서
+    cached = await asyncio.to_thread(_load_outfit, key)
+    if cached is not None:
+        return cached
+
+    # 다운로드는 blocking(requests)이라 스레드에서 실행
+    if _is_direct_url(image_url):
+        data_url = image_url
+    else:
+        data_url = await asyncio.to_thread(_url_to_data_image, image_url)
+    if not data_url:
+        return {"looks": [], "summary": "no valid images"}
+
+    async def _call(image_input: str) -> str:
+        stream = await get_async_client().chat.completions.create(**_chat_params(_one_image_content(image_input)), stream=True)
+        return await acollect_json_stream(stream) or "{}"
+
+    try:
+        try:
+            content = await _call(data_url)
+        except BadRequestError as e:
+            # 공개 CDN URL 을 OpenAI 가 직접 받지 못한 경우 → 우리가 받아서 data URL 로 1번 재시도
+            if data_url != image_url or not _is_image_download_error(e):
+                raise
+            print(f"[outfit_analyzer] direct url fetch failed, retry with data url url={image_url}, err={e}")
+            data_url = await asyncio.to_thread(_url_to_data_image, image_url)
+            if not data_url:
+                return {"looks": [], "summary": "no valid images"}
+            content = await _call(data_url)
+    except Exception as e:
+        # 한 장 실패가 나머지 이미지 분석까지 막지 않도록 빈 결과 반환
+        print(f"[outfit_analyzer] analyze_one_image_with_gpt ERROR url={image_url}, err={e}")
+        return {"looks": [], "summary": ""}
+
+    data = _parse_outfit_content(content, [image_url])
+    _store_outfit(key, data)
     return data
 
 
 
+# --------------------------------------------------
+# Batch API (오프라인 대량 인덱싱용)
+# --------------------------------------------------
+# 응답을 바로 기다릴 필요가 없는 작업(연예인 N명 × 이미지 M장 일괄 분석 등)은
+# Batch API 로 보내면 단가 50% + 별도 rate limit. 대신 완료까지 최대 24시간이라 API 요청 경로에서는 쓰지 않는다.
+OUTFIT_BATCH_POLL_SECONDS = float(os.getenv("OUTFIT_BATCH_POLL_SECONDS", "30"))
+
+_BATCH_DONE = ("completed", "failed", "expired", "cancelled")
+
+
+def _batch_line(job_id: str, user_content: List[Dict[str, Any]]) -> str:
+    return fastjson.dumps({
+        "custom_id": job_id,
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": _chat_params(user_content),
+    })
+
+
+def analyze_outfit_batch(
+    jobs: Sequence[Tuple[str, List[str]]],
+    poll_interval: float = OUTFIT_BATCH_POLL_SECONDS,
+    max_wait: float | None = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    여러 job 을 OpenAI Batch API 한 번으로 분석. (analyze_outfit_with_gpt 의 오프라인 버전)
+
+    입력:
+        jobs: [(job_id, image_urls), ...]  job_id 는 batch 안에서 유일해야 함 (예: celeb_id)
+        poll_interval: 상태 확인 간격 (초)
+        max_wait: 이 시간(초) 안에 끝나지 않으면 TimeoutError (None 이면 끝날 때까지 대기)
+
+    반환:
+        {job_id: analyze_outfit_with_gpt 와 같은 스키마의 dict}
+        요청이 실패한 job 은 {"looks": [], "summary": ""}
+
+    주의: 이미지를 data URL 로 넣기 때문에 입력 파일이 커짐 (Batch 입력 파일 한도 200MB, job 수를 나눠서 호출할 것)
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    urls_by_job: Dict[str, List[str]] = {}
+
+    # 1) 전체 job 의 이미지를 한 번에 동시 다운로드
+    all_urls = [url for _, image_urls in jobs for url in image_urls if url]
+    data_by_url = dict(zip(all_urls, _fetch_data_urls(all_urls)))
+
+    # 2) job 마다 JSONL 한 줄 (이미지가 하나도 없는 job 은 요청 없이 바로 결과)
+    lines: List[str] = []
+    for job_id, image_urls in jobs:
+        if not image_urls:
+            results[job_id] = {"looks": [], "summary": "no images"}
+            continue
+        user_content: List[Dict[str, Any]] = [{"type": "text", "text": OUTFIT_USER_TEXT}]
+        sent_urls: List[str] = []
+        for url in image_urls:
+            data_url = data_by_url.get(url) if url else None
+            if data_url:
+                user_content.append(_image_part(data_url))
+                sent_urls.append(url)
+        if not sent_urls:
+            results[job_id] = {"looks": [], "summary": "no valid images"}
+            continue
+        # look 순서 = 실제로 보낸 이미지 순서 (다운로드 실패한 URL 은 매핑에서 제외)
+        urls_by_job[job_id] = sent_urls
+        lines.append(_batch_line(job_id, user_content))
+
+    if not lines:
+        return {job_id: results[job_id] for job_id, _ in jobs}
+
+    # 3) 입력 파일 업로드 → batch 생성
+    client = get_client()
+    payload = ("\n".join(lines) + "\n").encode("utf-8")
+    del lines
+    input_file = client.files.create(file=("outfit_batch.jsonl", payload), purpose="batch")
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    print(f"[outfit_analyzer] batch submitted id={batch.id}, jobs={len(urls_by_job)}")
+
+    # 4) 완료까지 polling
+    started = time.monotonic()
+    while batch.status not in _BATCH_DONE:
+        if max_wait is not None and time.monotonic() - started > max_wait:
+            raise TimeoutError(f"batch {batch.id} not finished after {max_wait}s (status={batch.status})")
+        time.sleep(poll_interval)
+        batch = client.batches.retrieve(batch.id)
+    print(f"[outfit_analyzer] batch finished id={batch.id}, status={batch.status}")
+
+    # 5) 결과 파일 파싱 (성공 줄만 output 에 있음, 실패 줄은 error 파일)
+    if batch.output_file_id:
+        for raw in client.files.content(batch.output_file_id).text.splitlines():
+            if not raw.strip():
+                continue
+            row = fastjson.loads(raw)
+            job_id = row.get("custom_id")
+            if job_id not in urls_by_job:
+                continue
+            body = (row.get("response") or {}).get("body") or {}
+            try:
+                content = body["choices"][0]["message"]["content"] or "{}"
+            except (KeyError, IndexError, TypeError):
+                print(f"[outfit_analyzer] batch job ERROR id={job_id}, err={row.get('error') or body.get('error')}")
+                continue
+            results[job_id] = _parse_outfit_content(content, urls_by_job[job_id])
+
+    # 입력 job 순서대로 반환
+    return {job_id: results.get(job_id, {"looks": [], "summary": ""}) for job_id, _ in jobs}
+
+
 # --------------------------------------------------
 # 간단 CLI 테스트용 (선택)
 # --------------------------------------------------
@@ -234,4 +708,4 @@ if __name__ == "__main__":
     ]
     print("[TEST] analyze_outfit_with_gpt() 실행...")
     res = analyze_outfit_with_gpt(test_urls)
-    print(json.dumps(res, ensure_ascii=False, indent=2))
\ No newline at end of file
+    print(fastjson.dumps_pretty(res))
\ No newline at end of file
@@ -5,31 +5,37 @@ quick_web_outfit  vs  image_searcher + outfit_analyzer
 두 파이프라인의 latency, 결과 구조를 빠르게 비교하기 위한 CLI 스크립트.
 
 사용 예:
-    cd app
+    # 저장소 루트에서 실행 (서비스 모듈들이 app 패키지 기준 상대 import 를 씀)
     # 기본: 아이유 + "여름,블레이저" 한 번만 실행
-    python -m services.outfit_benchmark "아이유" "여름,블레이저"
+    python -m app.services.outfit_benchmark "아이유" "여름,블레이저"
 
     # 100번 반복 실행 + CSV/그래프 저장
-    python -m services.outfit_benchmark "아이유" "여름,블레이저" 100
+    python -m app.services.outfit_benchmark "아이유" "여름,블레이저" 100
+
+    # 10번에 한 번만 캐시 비우고 실제 API 호출 (나머지는 캐시 적중 warm run, API 비용 약 1/10)
+    python -m app.services.outfit_benchmark "아이유" "여름,블레이저" 100 --cold-every-k 10
 
 전제:
-    - services.quick_web_outfit.quick_outfit_from_web 이 구현되어 있음
-    - services.image_searcher.search_reference_images 가 SerpAPI(or Bing/Google) 기반으로 동작
-    - services.outfit_analyzer.analyze_outfit_with_gpt 가 [image_url 리스트]를 입력으로 받음
+    - app.services.quick_web_outfit.quick_outfit_from_web 이 구현되어 있음
+    - app.services.image_searcher.iter_reference_images_async 가 SerpAPI(or Bing/Google) 기반으로 동작
+    - app.services.outfit_analyzer.analyze_outfit_stream_async 가 검색 결과 URL 스트림을 입력으로 받음
 """
 
 from __future__ import annotations
+import asyncio
+import threading
 import time
-import json
 import sys
+from contextlib import aclosing
 from typing import List, Dict, Any
 
-from dotenv import load_dotenv
-load_dotenv()
+from ..config import load_env
+load_env()
 
-from services.quick_web_outfit import quick_outfit_from_web
-from services.image_searcher import search_reference_images
-from services.outfit_analyzer import analyze_outfit_with_gpt
+from .quick_web_outfit import quick_outfit_from_web, clear_select_cache
+from .image_searcher import iter_reference_images_async, clear_search_cache
+from .outfit_analyzer import analyze_outfit_stream_async, clear_image_cache, clear_outfit_cache
+from ..utils import fastjson
 
 
 # ----------------------------------------------------
@@ -50,6 +56,30 @@ def pipeline_quick_web_outfit(
 # ----------------------------------------------------
 # 파이프라인 B: image_searcher + outfit_analyzer
 # ----------------------------------------------------
+# B 파이프라인을 돌릴 전용 이벤트 루프
+# - 공용 AsyncClient(SerpAPI / AsyncOpenAI)는 처음 쓴 루프에 묶이므로 run 마다 asyncio.run 으로 새 루프를 만들지 않고 재사용
+# - asyncio.Runner 는 3.11+ 라서 (run.txt 기준 3.10 환경) new_event_loop + run_until_complete 로 직접 관리
+_ext_loop: asyncio.AbstractEventLoop | None = None
+_ext_loop_lock = threading.Lock()
+
+
+async def _external_search_plus_analyzer_async(
+    celeb_name: str,
+    needs: List[str],
+    max_results: int,
+    max_analyze_images: int,
+):
+    async with aclosing(iter_reference_images_async(
+        celeb_name=celeb_name,
+        needs=needs,
+        max_results=max_results,
+    )) as search_items:
+        return await analyze_outfit_stream_async(
+            (it.get("image") async for it in search_items),
+            max_images=max_analyze_images,
+        )
+
+
 def pipeline_external_search_plus_analyzer(
     celeb_name: str,
     needs: List[str],
@@ -58,16 +88,15 @@ def pipeline_external_search_plus_analyzer(
 ) -> dict:
     """
     1) 외부 이미지 검색 (SerpAPI Bing / Google 등)
-    2) 상위 N개 URL을 GPT Vision outfit_analyzer에 넣어 분석
+    2) 검색 결과 URL 이 도착하는 대로 최대 N개를 GPT Vision outfit_analyzer에 넣어 분석
+       (검색이 끝날 때까지 기다리지 않고 첫 URL 부터 Vision 호출 시작)
     """
-    search_items = search_reference_images(
-        celeb_name=celeb_name,
-        needs=needs,
-        max_results=max_results,
-    )
-
-    image_urls = [it.get("image") for it in search_items if it.get("image")]
-    image_urls = image_urls[:max_analyze_images]
+    global _ext_loop
+    with _ext_loop_lock:
+        if _ext_loop is None:
+            _ext_loop = asyncio.new_event_loop()
+        image_urls, outfit_json = _ext_loop.run_until_complete(_external_search_plus_analyzer_async(
+            celeb_name, needs, max_results, max_analyze_images))
 
     if not image_urls:
         return {
@@ -75,8 +104,6 @@ def pipeline_external_search_plus_analyzer(
             "outfit_json": {},
         }
 
-    outfit_json = analyze_outfit_with_gpt(image_urls)
-
     return {
         "input_images": image_urls,
         "outfit_json": outfit_json,
@@ -86,23 +113,78 @@ def pipeline_external_search_plus_analyzer(
 # ----------------------------------------------------
 # 벤치마크: 한 번 실행 (텍스트 출력 + 타이밍 리턴)
 # ----------------------------------------------------
+def _timed(fn, *args, **kwargs):
+    """fn 실행 결과와 걸린 시간(초). 동시에 돌려도 파이프라인별 시간을 따로 재기 위해 스레드 안에서 측정"""
+    t0 = time.perf_counter()
+    res = fn(*args, **kwargs)
+    return res, time.perf_counter() - t0
+
+
+async def _run_pipelines_async(
+    celeb_name: str,
+    needs: List[str],
+    max_results: int,
+    max_analyze_images: int,
+):
+    """A / B 는 서로 독립적인 네트워크 작업이라 스레드에서 동시에 실행 → 전체 시간은 둘 중 긴 쪽"""
+    quick_task = asyncio.create_task(asyncio.to_thread(
+        _timed, pipeline_quick_web_outfit, celeb_name, needs))
+    ext_task = asyncio.create_task(asyncio.to_thread(
+        _timed, pipeline_external_search_plus_analyzer, celeb_name, needs,
+        max_results=max_results, max_analyze_images=max_analyze_images))
+    return await asyncio.gather(quick_task, ext_task)
+
+
+def clear_pipeline_caches() -> None:
+    """
+    A / B 파이프라인 캐시 전체 삭제.
+    - A: web_search 이미지 선정 결과 (quick_web_outfit)
+    - B: SerpAPI 응답 / 이미지 data URL
+    - 공용: Vision 분석 결과
+    같은 입력을 반복하면 2번째 run 부터는 캐시 적중 시간만 재게 되므로, 콜드 경로를 재려면 run 마다 호출.
+    """
+    clear_select_cache()
+    clear_search_cache()
+    clear_image_cache()
+    clear_outfit_cache()
+
+
 def bench_once(
     celeb_name: str,
     needs: List[str],
     max_results: int = 12,
     max_analyze_images: int = 6,
+    parallel: bool = True,
+    cold_cache: bool = False,
+    verbose: bool = True,
 ) -> Dict[str, Any]:
     """
     한 번 실행해서 결과를 콘솔에 찍고,
     타이밍/요약 정보를 dict로도 리턴.
+
+    parallel=True 면 A / B 를 동시에 실행 (각 시간은 파이프라인별로 따로 측정).
+    두 파이프라인이 같은 OpenAI rate limit / 네트워크를 나눠 쓰므로 서로 영향 없는 단독 시간이 필요하면 False.
+    cold_cache=True 면 실행 전에 A / B 파이프라인 캐시를 비움 (clear_pipeline_caches).
+    verbose=False 면 결과 샘플(looks / 이미지 / outfit_json JSON 덤프)은 찍지 않고 시간/개수만 출력.
     """
     print(f"[BENCH] celeb={celeb_name}, needs={needs}")
     print("-" * 60)
 
-    # A) quick_web_outfit
-    t0 = time.perf_counter()
-    quick_res = pipeline_quick_web_outfit(celeb_name, needs)
-    dt_quick = time.perf_counter() - t0
+    if cold_cache:
+        clear_pipeline_caches()
+
+    if parallel:
+        (quick_res, dt_quick), (ext_res, dt_ext) = asyncio.run(
+            _run_pipelines_async(celeb_name, needs, max_results, max_analyze_images))
+    else:
+        quick_res, dt_quick = _timed(pipeline_quick_web_outfit, celeb_name, needs)
+        ext_res, dt_ext = _timed(
+            pipeline_external_search_plus_analyzer,
+            celeb_name,
+            needs,
+            max_results=max_results,
+            max_analyze_images=max_analyze_images,
+        )
 
     looks = quick_res.get("looks", []) or []
     quick_looks_count = len(looks)
@@ -110,32 +192,24 @@ def bench_once(
     print(f"[A] quick_web_outfit")
     print(f"    - time: {dt_quick:.2f} sec")
     print(f"    - looks: {quick_looks_count}")
-    print("    - sample (truncated):")
-    print(json.dumps(looks[:2], ensure_ascii=False, indent=2))
+    if verbose:
+        print("    - sample (truncated):")
+        print(fastjson.dumps_pretty(looks[:2]))
 
     print("\n" + "-" * 60)
 
-    # B) external search + outfit_analyzer
-    t0 = time.perf_counter()
-    ext_res = pipeline_external_search_plus_analyzer(
-        celeb_name,
-        needs,
-        max_results=max_results,
-        max_analyze_images=max_analyze_images,
-    )
-    dt_ext = time.perf_counter() - t0
-
     ext_input_images = ext_res.get("input_images", []) or []
     ext_images_count = len(ext_input_images)
 
     print(f"[B] image_searcher + outfit_analyzer")
     print(f"    - time: {dt_ext:.2f} sec")
     print(f"    - input_images: {ext_images_count}")
-    print("    - sample images:")
-    print(json.dumps(ext_input_images[:3], ensure_ascii=False, indent=2))
+    if verbose:
+        print("    - sample images:")
+        print(fastjson.dumps_pretty(ext_input_images[:3]))
 
-    print("    - outfit_json (truncated):")
-    print(json.dumps(ext_res.get("outfit_json", {}), ensure_ascii=False, indent=2)[:1500])
+        print("    - outfit_json (truncated):")
+        print(fastjson.dumps_pretty(ext_res.get("outfit_json", {}))[:1500])
 
     print("\n" + "=" * 60)
     print("[SUMMARY]")
@@ -149,6 +223,35 @@ def bench_once(
         "dt_ext": dt_ext,
         "quick_looks_count": quick_looks_count,
         "ext_images_count": ext_images_count,
+        "cold": cold_cache,
+    }
+
+
+def _bench_warm(
+    celeb_name: str,
+    needs: List[str],
+    max_results: int,
+    max_analyze_images: int,
+) -> Dict[str, Any]:
+    """
+    warm run: 캐시를 그대로 두고 B 만 실행 (검색 / Vision 결과가 캐시에 있으면 API 호출 없음).
+    A 는 건너뜀 → dt_quick 은 None. A 의 web_search 선정 결과도 캐시되지만 (SELECT_IMAGES_CACHE_TTL, 기본 1시간)
+    만료되면 warm run 중에 web_search 비용이 다시 들고 A 의 cold / warm 구분이 섞이므로 A 는 cold run 에서만 잼.
+    """
+    ext_res, dt_ext = _timed(
+        pipeline_external_search_plus_analyzer,
+        celeb_name,
+        needs,
+        max_results=max_results,
+        max_analyze_images=max_analyze_images,
+    )
+    print(f"[B] warm: {dt_ext:.3f} sec (A skipped)")
+    return {
+        "dt_quick": None,
+        "dt_ext": dt_ext,
+        "quick_looks_count": None,
+        "ext_images_count": len(ext_res.get("input_images", []) or []),
+        "cold": False,
     }
 
 
@@ -163,15 +266,33 @@ def run_benchmark(
     max_analyze_images: int = 6,
     csv_path: str = "outfit_benchmark_results.csv",
     plot_prefix: str = "outfit_benchmark",
+    cold_cache: bool = False,
+    cold_every: int = 0,
+    verbose: bool = False,
+    warmup: bool = True,
 ) -> None:
     """
     같은 입력으로 repeat번 실행해서:
       - 각 run의 latency/요약을 CSV로 저장
       - 전체 통계 요약을 콘솔에 출력
       - 박스플롯 + run-index vs time 그래프를 PNG로 저장
+
+    기본은 캐시를 그대로 둬서 2번째 run 부터는 B 파이프라인의 캐시 적중 경로를 잼.
+    cold_cache=True 면 run 마다 캐시를 비워서 매번 검색 + Vision 호출까지 포함한 시간을 잼 (API 비용도 매번 발생).
+
+    cold_every=K (K >= 1) 면 K번에 한 번만 cold run (캐시 비우고 A / B 모두 실행), 나머지는 warm run (_bench_warm).
+    API 비용은 약 1/K 로 줄고, cold run 으로 꼬리 latency 는 계속 측정.
+    CSV 에 cold 컬럼이 붙고 <csv>_cold.csv / <csv>_warm.csv 도 따로 저장. A 통계/그래프는 cold run 만 사용.
+
+    run 마다 결과 샘플 JSON 을 덤프하면 반복 횟수만큼 큰 dict 직렬화가 쌓이므로 기본은 verbose=False (시간/개수만 출력).
+
+    warmup=True 면 측정 전에 1번 실행하고 버림 (첫 호출의 TLS 연결 / lazy import 비용이 통계에 섞이지 않도록).
+    통계는 raw 값과 함께 상하위 5% 를 뺀 trimmed mean, p50 / p90 / p99 도 출력 (가끔 튀는 수십 초짜리 응답 대비).
     """
     import csv
     import statistics
+    from array import array
+    from contextlib import ExitStack
     from pathlib import Path
 
     try:
@@ -184,31 +305,85 @@ def run_benchmark(
     print(f"[RUN_BENCHMARK] repeat={repeat}, celeb={celeb_name}, needs={needs}")
     print("-" * 60)
 
-    records: List[dict] = []
-
-    # 필요하면 1번 정도 워밍업 (옵션)
-    # bench_once(celeb_name, needs, max_results, max_analyze_images)
-    # print("[INFO] Warm-up run finished.\n")
-
-    for i in range(repeat):
-        print(f"\n--- Run {i+1}/{repeat} ---")
-        res = bench_once(celeb_name, needs, max_results, max_analyze_images)
-        res["run_idx"] = i + 1
-        records.append(res)
-
-    # 타임 배열
-    quick_times = [r["dt_quick"] for r in records]
-    ext_times = [r["dt_ext"] for r in records]
+    # run 마다 CSV 에 바로 쓰고 flush (중간에 죽어도 그때까지 결과는 남음, records 를 전부 들고 있지 않음)
+    fieldnames = [
+        "run_idx",
+        "dt_quick",
+        "dt_ext",
+        "quick_looks_count",
+        "ext_images_count",
+        "cold",
+    ]
+    csv_path = str(csv_path)
+    csv_paths = {"all": csv_path}
+    if cold_every > 0:
+        base = Path(csv_path)
+        csv_paths["cold"] = str(base.with_name(base.stem + "_cold" + base.suffix))
+        csv_paths["warm"] = str(base.with_name(base.stem + "_warm" + base.suffix))
+
+    # 통계/그래프에 필요한 값만 array 로 보관 (A 는 실행된 run 만)
+    quick_idx = array("l")
+    quick_times = array("d")
+    ext_times = array("d")
+    ext_cold = array("d")
+    ext_warm = array("d")
+
+    if warmup:
+        print("\n--- Warm-up (not recorded) ---")
+        bench_once(celeb_name, needs, max_results, max_analyze_images, verbose=False)
+        print("[INFO] Warm-up run finished.\n")
+
+    with ExitStack() as stack:
+        writers = {}
+        for key, path in csv_paths.items():
+            f = stack.enter_context(open(path, "w", newline="", encoding="utf-8"))
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writers[key] = (writer, f)
+
+        for i in range(repeat):
+            print(f"\n--- Run {i+1}/{repeat} ---")
+            if cold_every > 0 and i % cold_every != 0:
+                res = _bench_warm(celeb_name, needs, max_results, max_analyze_images)
+            else:
+                res = bench_once(celeb_name, needs, max_results, max_analyze_images,
+                                 cold_cache=cold_cache or cold_every > 0, verbose=verbose)
+            res["run_idx"] = i + 1
+
+            if res["dt_quick"] is not None:
+                quick_idx.append(i + 1)
+                quick_times.append(res["dt_quick"])
+            ext_times.append(res["dt_ext"])
+            (ext_cold if res["cold"] else ext_warm).append(res["dt_ext"])
+
+            for key in ("all", "cold" if res["cold"] else "warm"):
+                if key in writers:
+                    writer, f = writers[key]
+                    writer.writerow(res)
+                    f.flush()
+
+    for path in csv_paths.values():
+        print(f"[SAVE] CSV saved to: {path}")
 
     # 통계 계산
-    def stats(values: List[float]) -> dict:
-        return {
-            "mean": statistics.mean(values),
-            "stdev": statistics.stdev(values) if len(values) > 1 else 0.0,
-            "min": min(values),
-            "max": max(values),
-            "median": statistics.median(values),
+    def stats(values) -> dict:
+        ordered = sorted(values)
+        n = len(ordered)
+        # 상하위 5% (최소 1개씩) 를 뺀 평균, 그만큼 뺄 값이 없으면 raw mean
+        k = max(1, n // 20)
+        trimmed = ordered[k:-k] if n > 2 * k else ordered
+        out = {
+            "mean": statistics.mean(ordered),
+            "trimmed_mean": statistics.mean(trimmed),
+            "stdev": statistics.stdev(ordered) if n > 1 else 0.0,
+            "min": ordered[0],
+            "max": ordered[-1],
+            "median": statistics.median(ordered),
         }
+        if n > 1:
+            q = statistics.quantiles(ordered, n=100, method="inclusive")
+            out.update(p50=q[49], p90=q[89], p99=q[98])
+        return out
 
     quick_stats = stats(quick_times)
     ext_stats = stats(ext_times)
@@ -225,6 +400,13 @@ def run_benchmark(
     for k, v in ext_stats.items():
         print(f"  - {k}: {v:.3f} sec")
 
+    if cold_every > 0:
+        for label, values in (("cold", ext_cold), ("warm", ext_warm)):
+            if values:
+                print(f"\nB) {label} runs (n={len(values)})")
+                for k, v in stats(values).items():
+                    print(f"  - {k}: {v:.3f} sec")
+
     if speedup is not None:
         print(f"\n[INFO] 평균 기준으로, quick_web_outfit / external = {speedup:.2f} 배")
         if speedup < 1:
@@ -234,69 +416,61 @@ def run_benchmark(
 
     print("#" * 60 + "\n")
 
-    # CSV 저장
-    csv_path = str(csv_path)
-    with open(csv_path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(
-            f,
-            fieldnames=[
-                "run_idx",
-                "dt_quick",
-                "dt_ext",
-                "quick_looks_count",
-                "ext_images_count",
-            ],
-        )
-        writer.writeheader()
-        for r in records:
-            writer.writerow(r)
-
-    print(f"[SAVE] CSV saved to: {csv_path}")
-
-    # 그래프 저장 (matplotlib 있을 때만)
+    # 그래프 저장 (matplotlib 있을 때만, Figure 하나를 두 그래프에 재사용)
     if plt is not None:
         prefix = Path(plot_prefix)
+        fig, ax = plt.subplots()
 
         # 1) 박스플롯 (distribution 비교)
-        plt.figure()
-        plt.boxplot(
+        ax.boxplot(
             [quick_times, ext_times],
             labels=["quick_web_outfit", "external+analyzer"],
         )
-        plt.ylabel("Latency (sec)")
-        plt.title(f"Latency Distribution (n={repeat})")
+        ax.set_ylabel("Latency (sec)")
+        ax.set_title(f"Latency Distribution (n={repeat})")
         boxplot_path = prefix.with_name(prefix.stem + "_box.png")
-        plt.savefig(boxplot_path, dpi=150, bbox_inches="tight")
-        plt.close()
+        fig.savefig(boxplot_path, dpi=150, bbox_inches="tight")
         print(f"[SAVE] Boxplot saved to: {boxplot_path}")
 
         # 2) run index vs time 라인 그래프
-        x = list(range(1, repeat + 1))
-        plt.figure()
-        plt.plot(x, quick_times, marker="o", label="quick_web_outfit")
-        plt.plot(x, ext_times, marker="o", label="external+analyzer")
-        plt.xlabel("Run index")
-        plt.ylabel("Latency (sec)")
-        plt.title(f"Latency per Run (n={repeat})")
-        plt.legend()
+        ax.clear()
+        ax.plot(quick_idx, quick_times, marker="o", label="quick_web_outfit")
+        ax.plot(range(1, repeat + 1), ext_times, marker="o", label="external+analyzer")
+        ax.set_xlabel("Run index")
+        ax.set_ylabel("Latency (sec)")
+        ax.set_title(f"Latency per Run (n={repeat})")
+        ax.legend()
         lineplot_path = prefix.with_name(prefix.stem + "_line.png")
-        plt.savefig(lineplot_path, dpi=150, bbox_inches="tight")
-        plt.close()
+        fig.savefig(lineplot_path, dpi=150, bbox_inches="tight")
+        plt.close(fig)
         print(f"[SAVE] Line plot saved to: {lineplot_path}")
 
 
 def main():
     # 사용법:
-    #   python -m services.outfit_benchmark "아이유" "여름,블레이저"
-    #   python -m services.outfit_benchmark "아이유" "여름,블레이저" 100
-    celeb = sys.argv[1] if len(sys.argv) > 1 else "아이유"
-    needs_arg = sys.argv[2] if len(sys.argv) > 2 else "여름,블레이저"
+    #   python -m app.services.outfit_benchmark "아이유" "여름,블레이저"
+    #   python -m app.services.outfit_benchmark "아이유" "여름,블레이저" 100
+    #   python -m app.services.outfit_benchmark "아이유" "여름,블레이저" 100 --cold-every-k 10
+    args = sys.argv[1:]
+
+    # --cold-every-k K : K번에 한 번만 cold run (나머지는 캐시 적중 warm run)
+    cold_every = 0
+    if "--cold-every-k" in args:
+        i = args.index("--cold-every-k")
+        try:
+            cold_every = int(args[i + 1])
+        except (IndexError, ValueError):
+            cold_every = 0
+        del args[i:i + 2]
+
+    celeb = args[0] if len(args) > 0 else "아이유"
+    needs_arg = args[1] if len(args) > 1 else "여름,블레이저"
     needs = [s.strip() for s in needs_arg.split(",") if s.strip()]
 
     # 세 번째 인자 있으면 repeat으로 사용
-    if len(sys.argv) > 3:
+    if len(args) > 2:
         try:
-            repeat = int(sys.argv[3])
+            repeat = int(args[2])
         except ValueError:
             repeat = 1
     else:
@@ -311,6 +485,7 @@ def main():
             celeb_name=celeb,
             needs=needs,
             repeat=repeat,
+            cold_every=cold_every,
         )
 
 
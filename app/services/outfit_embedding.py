@@ -1,7 +1,9 @@
 # app/services/outfit_embedding.py
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-from typing import Optional, List
+from typing import Optional, List, Tuple
+
+import numpy as np
 
 # ---------------------------------------------------------
 # 6D Rule-based Style Vector
@@ -10,113 +12,72 @@ def _normalize(s: Optional[str]) -> str:
     return (s or "").strip().lower()
 
 
-def _same_color_family(a: str, b: str) -> bool:
-    a = _normalize(a)
-    b = _normalize(b)
-    groups = [
-        {"white", "ivory", "beige", "cream"},
-        {"black", "charcoal"},
-        {"gray", "grey"},
-        {"navy", "blue"},
-        {"brown", "khaki"},
-        {"pink", "red"},
-        {"green", "olive"},
-    ]
-    for g in groups:
-        if a in g and b in g:
-            return True
-    return False
+# ---------------------------------------------------------
+# 축별 lookup table
+# ---------------------------------------------------------
+# v0, v1 은 style 만으로 결정
+_STYLE_AXES = {
+    "minimal":  (0.9, 0.1),
+    "street":   (-0.9, 0.8),
+    "casual":   (0.3, 0.8),
+    "sporty":   (0.3, 0.8),
+    "retro":    (-0.3, 0.1),
+    "romantic": (-0.3, 0.1),
+    "formal":   (0.2, -0.8),
+}
+_NO_STYLE: Tuple[float, float] = (0.0, 0.0)
+
+# v2: soft-tone(+0.8) / vivid-tone(-0.8)
+#     목록에 없어도 같은 색 계열(grey↔gray, navy↔blue, olive↔green)이면 ±0.4, 나머지 0.0
+_COLOR_AXIS = {
+    **{c: 0.8 for c in ("white", "ivory", "beige", "cream", "lightgray", "gray")},
+    **{c: -0.8 for c in ("red", "yellow", "green", "blue", "pink", "orange", "purple")},
+    "grey": 0.4,
+    "navy": -0.4,
+    "olive": -0.4,
+}
+
+_CATEGORY_AXIS = {
+    "top": 0.8,
+    "bottom": 0.4,
+    "outer": -0.2,
+    "dress": 0.6,
+    "shoes": -0.6,
+    "bag": -0.8,
+    "accessory": -0.4,
+}
+
+_FIT_AXIS = {
+    "slim": -0.8,
+    "regular": 0.0,
+    "relaxed": 0.4,
+    "oversized": 0.8,
+}
+
+_SEASON_AXIS = {
+    "spring": 0.9,
+    "summer": 0.9,
+    "fall": -0.9,
+    "autumn": -0.9,
+    "winter": -0.9,
+}
 
 
 def style_to_vec(style: str, season: str, color: str,
                  category: str, fit: str) -> List[float]:
-
-    style = _normalize(style)
-    season = _normalize(season)
-    color = _normalize(color)
-    category = _normalize(category)
-    fit = _normalize(fit)
-
-    v = [0.0] * 6
-
-    # -------------------------------------
-    # v0: minimal(+1) ↔ street(-1)
-    # -------------------------------------
-    if style == "minimal":
-        v[0] = 0.9
-    elif style == "street":
-        v[0] = -0.9
-    elif style in ("casual", "sporty"):
-        v[0] = 0.3
-    elif style in ("retro", "romantic"):
-        v[0] = -0.3
-    elif style == "formal":
-        v[0] = 0.2
-
-    # -------------------------------------
-    # v1: casual(+1) ↔ formal(-1)
-    # -------------------------------------
-    if style in ("casual", "street", "sporty"):
-        v[1] = 0.8
-    elif style == "formal":
-        v[1] = -0.8
-    elif style in ("minimal", "retro", "romantic"):
-        v[1] = 0.1
-
-    # -------------------------------------
-    # v2: soft-tone(+1) ↔ vivid-tone(-1)
-    # -------------------------------------
-    soft_colors = {"white", "ivory", "beige", "cream", "lightgray", "gray"}
-    vivid_colors = {"red", "yellow", "green", "blue", "pink", "orange", "purple"}
-
-    if color in soft_colors:
-        v[2] = 0.8
-    elif color in vivid_colors:
-        v[2] = -0.8
-    else:
-        if any(_same_color_family(color, c) for c in soft_colors):
-            v[2] = 0.4
-        elif any(_same_color_family(color, c) for c in vivid_colors):
-            v[2] = -0.4
-        else:
-            v[2] = 0.0
-
-    # -------------------------------------
-    # v3: category axis
-    # -------------------------------------
-    cat_map = {
-        "top": 0.8,
-        "bottom": 0.4,
-        "outer": -0.2,
-        "dress": 0.6,
-        "shoes": -0.6,
-        "bag": -0.8,
-        "accessory": -0.4,
-    }
-    v[3] = cat_map.get(category, 0.0)
-
-    # -------------------------------------
-    # v4: fit axis (slim ↔ oversized)
-    # -------------------------------------
-    fit_map = {
-        "slim": -0.8,
-        "regular": 0.0,
-        "relaxed": 0.4,
-        "oversized": 0.8,
-    }
-    v[4] = fit_map.get(fit, 0.0)
-
-    # -------------------------------------
-    # v5: season axis
-    # -------------------------------------
-    if season in ("spring", "summer"):
-        v[5] = 0.9
-    elif season in ("fall", "autumn", "winter"):
-        v[5] = -0.9
-    elif season == "all":
-        v[5] = 0.0
-
-    return v
+    """
+    축마다 독립적인 규칙이라 분기 대신 위 lookup table 5번 조회로 계산.
+    (테이블에 없는 값은 0.0)
+    """
+    v0, v1 = _STYLE_AXES.get(_normalize(style), _NO_STYLE)
+    return [
+        v0,
+        v1,
+        _COLOR_AXIS.get(_normalize(color), 0.0),
+        _CATEGORY_AXIS.get(_normalize(category), 0.0),
+        _FIT_AXIS.get(_normalize(fit), 0.0),
+        _SEASON_AXIS.get(_normalize(season), 0.0),
+    ]
 
 def style_vec_from_dict(garment: dict) -> List[float]:
     """
@@ -140,4 +101,57 @@ def style_vec_from_dict(garment: dict) -> List[float]:
         color=garment.get("color", ""),
         category=garment.get("category", ""),
         fit=garment.get("fit", ""),
-    )
\ No newline at end of file
+    )
+
+
+# ---------------------------------------------------------
+# Batch 버전 (style_to_vec 와 같은 테이블 사용)
+# ---------------------------------------------------------
+def style_vec_from_dicts(garments: List[dict]) -> np.ndarray:
+    """
+    garment dict 리스트 → (N, 6) 스타일 벡터 배열.
+    style_vec_from_dict 를 garment마다 부르는 대신 lookup table로 한 번에 생성.
+    """
+    rows = []
+    for g in garments:
+        v0, v1 = _STYLE_AXES.get(_normalize(g.get("style")), _NO_STYLE)
+        rows.append((
+            v0,
+            v1,
+            _COLOR_AXIS.get(_normalize(g.get("color")), 0.0),
+            _CATEGORY_AXIS.get(_normalize(g.get("category")), 0.0),
+            _FIT_AXIS.get(_normalize(g.get("fit")), 0.0),
+            _SEASON_AXIS.get(_normalize(g.get("season")), 0.0),
+        ))
+    return np.array(rows, dtype=float).reshape(len(rows), 6)
+
+
+# ---------------------------------------------------------
+# int8 저장용 (옷장 / 레퍼런스 룩 벡터를 대량으로 보관·비교할 때)
+# ---------------------------------------------------------
+# 모든 축 값이 [-0.9, 0.9] 범위의 0.1 단위라 ×100 정수로 바꿔도 손실 없음
+# (N, 6) float64 대비 메모리 1/8, 유사도는 int32 누적 내적으로 계산
+_INT8_SCALE = 100.0
+
+
+def quantize_style_vecs(vecs) -> np.ndarray:
+    """스타일 벡터 (6,) 또는 (N, 6) → 같은 shape 의 int8 배열 (값 ×100)."""
+    arr = np.asarray(vecs, dtype=float)
+    return np.clip(np.rint(arr * _INT8_SCALE), -127, 127).astype(np.int8)
+
+
+def dequantize_style_vecs(qvecs: np.ndarray) -> np.ndarray:
+    """quantize_style_vecs 의 역변환 → float 배열."""
+    return np.asarray(qvecs, dtype=float) / _INT8_SCALE
+
+
+def style_cosine_int8(query: np.ndarray, qmat: np.ndarray) -> np.ndarray:
+    """
+    int8 벡터 query (6,) 와 int8 행렬 qmat (N, 6) 의 cosine similarity → (N,) float.
+    int8 끼리 곱하면 overflow 나므로 int32 로 올려서 내적 (스케일은 cosine 에서 약분됨).
+    """
+    q = np.asarray(query, dtype=np.int32)
+    m = np.asarray(qmat, dtype=np.int32).reshape(-1, q.shape[-1])
+    dots = m @ q
+    norms = np.sqrt((m * m).sum(axis=1) * float(q @ q))
+    return dots / (norms + 1e-8)
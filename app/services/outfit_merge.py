@@ -8,6 +8,15 @@ from __future__ import annotations
 from typing import Dict, List, Any
 import collections
 
+# majority vote 로 고르는 속성 (출력 dict 의 key 순서도 이 순서)
+_VOTE_KEYS = ("name", "color", "material", "fit")
+
+
+def _most_common(counter: Dict[Any, int]) -> Any:
+    # 동률이면 먼저 등장한 값 (Counter.most_common(1) 과 같은 규칙)
+    return max(counter, key=counter.get) if counter else None
+
+
 def merge_outfit_jsons(outfits: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
     여러 outfit JSON → 하나의 unified JSON으로 병합.
@@ -26,17 +35,18 @@ def merge_outfit_jsons(outfits: List[Dict[str, Any]]) -> Dict[str, Any]:
 
     for category, items in category_map.items():
         # 가장 많이 등장한 속성 선택
-        counter_name = collections.Counter([it.get("name") for it in items if it.get("name")])
-        counter_color = collections.Counter([it.get("color") for it in items if it.get("color")])
-        counter_material = collections.Counter([it.get("material") for it in items if it.get("material")])
-        counter_fit = collections.Counter([it.get("fit") for it in items if it.get("fit")])
+        # 속성 4개를 항목 목록 한 번 훑으면서 같이 셈 (Counter 4개 + 중간 리스트 4개 대신)
+        counts = {key: {} for key in _VOTE_KEYS}
+        for it in items:
+            for key in _VOTE_KEYS:
+                v = it.get(key)
+                if v:
+                    c = counts[key]
+                    c[v] = c.get(v, 0) + 1
 
         merged["garments"].append({
             "category": category,
-            "name": counter_name.most_common(1)[0][0] if counter_name else None,
-            "color": counter_color.most_common(1)[0][0] if counter_color else None,
-            "material": counter_material.most_common(1)[0][0] if counter_material else None,
-            "fit": counter_fit.most_common(1)[0][0] if counter_fit else None,
+            **{key: _most_common(counts[key]) for key in _VOTE_KEYS},
         })
 
     return merged
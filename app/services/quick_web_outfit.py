@@ -1,72 +1,131 @@
 # app/services/quick_web_outfit.py
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-import os, json, sys, time
+import os, json, sys, time, threading
 from typing import List, Dict, Any
-from dotenv import load_dotenv
-from openai import OpenAI
-from string import Template
 
-# STEP 2에서 Vision 분석 위해 이 함수 필요함
-from services.outfit_analyzer import analyze_outfit_with_gpt
+from cachetools import TTLCache
 
-load_dotenv()
-client = OpenAI()
+from ._openai import get_client, collect_response_json_stream, json_text_format
+from ..utils import fastjson
 
-MODEL = os.getenv("OPENAI_OUTFIT_WEB_MODEL", "gpt-5")
+# STEP 2에서 Vision 분석 위해 이 함수 필요함
+from .outfit_analyzer import analyze_outfit_with_gpt
+from ..config import OUTFIT_WEB_MODEL as MODEL
 
 # -------------------------------
 # STEP 1: 이미지 URL 후보 선정용 프롬프트
 # -------------------------------
-PROMPT_SELECT_IMAGES = Template("""
-당신은 패션 웹 리서처입니다.
-목표:
-- "$celeb" + "$needs" 관련된 실제 착장 사진을 찾기 위해 web_search 도구를 사용하고
-- 중복되지 않는 좋은 품질의 실제 코디 이미지 3~5장을 선정하세요.
-- 이미지 직접 URL(image_url)과 그 URL을 포함한 페이지(source_url)를 JSON으로 출력하세요.
-
-출력 스키마:
-{
-  "selected_images": [
-    {"image_url": "...", "source_url": "..."},
-    ...
-  ]
-}
-
-JSON만 출력하세요.
-""")
-
+# 고정 지시문은 instructions 로 분리 → 매 호출 byte 단위로 같아서 prompt caching 대상
+# (연예인/니즈 같은 가변 입력은 input 에만 들어감)
+# 출력 구조는 text.format(strict JSON schema)이 강제하므로 스키마 예시는 한 줄만 (json_object 모드 대비)
+SELECT_IMAGES_INSTRUCTIONS = (
+    "패션 웹 리서처. web_search 로 입력한 연예인 + 니즈의 실제 착장 사진을 찾아 "
+    "중복 없는 고품질 코디 이미지 3~5장을 선정.\n"
+    'JSON 만 출력: {"selected_images":[{"image_url":"이미지 직접 URL","source_url":"그 이미지가 있는 페이지"}]}'
+)
+
+_SELECT_IMAGES_FORMAT = json_text_format("selected_images", {
+    "type": "object",
+    "properties": {
+        "selected_images": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "image_url": {"type": "string"},
+                    "source_url": {"type": "string"},
+                },
+                "required": ["image_url", "source_url"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["selected_images"],
+    "additionalProperties": False,
+})
+
+# (연예인, 정렬된 니즈) → 선정된 이미지 목록 캐시
+# - 출력이 JSON 스키마로 고정돼 파싱 결과를 그대로 재사용 가능 → 같은 질의는 web_search 호출 생략
+# - 웹 검색 결과는 바뀌므로 TTL 로 만료 (기본 1시간), 빈 결과(파싱 실패/API 오류)는 저장하지 않음
+SELECT_IMAGES_CACHE_SIZE = int(os.getenv("SELECT_IMAGES_CACHE_SIZE", "1024"))
+SELECT_IMAGES_CACHE_TTL = float(os.getenv("SELECT_IMAGES_CACHE_TTL", "3600"))
+
+_select_cache: TTLCache = TTLCache(maxsize=SELECT_IMAGES_CACHE_SIZE, ttl=SELECT_IMAGES_CACHE_TTL)
+_select_cache_lock = threading.Lock()
+
+
+def clear_select_cache() -> int:
+    """이미지 선정 결과 캐시 전체 삭제. 삭제된 항목 수 반환."""
+    with _select_cache_lock:
+        n = len(_select_cache)
+        _select_cache.clear()
+    return n
+
+
+def _parse_json_object(text: str) -> Dict[str, Any] | None:
+    """
+    응답 텍스트 → JSON 객체. 앞에 설명 문장이 붙은 경우 첫 "{" 부터 객체 하나만 읽음.
+    (마지막 "}" 까지 자르던 방식은 JSON 뒤에 중괄호가 있는 문장이 오면 깨짐)
+    """
+    try:
+        data = fastjson.loads(text)
+    except fastjson.JSONDecodeError:
+        start = text.find("{")
+        if start < 0:
+            return None
+        try:
+            data, _ = json.JSONDecoder().raw_decode(text, start)
+        except json.JSONDecodeError:
+            return None
+    return data if isinstance(data, dict) else None
 
 
 def select_images_from_web(celeb: str, needs: List[str]) -> List[Dict[str, str]]:
-    """STEP 1: GPT web_search 로 이미지 URL 3~5개 선정."""
-    needs_txt = ", ".join(needs)
-    prompt = PROMPT_SELECT_IMAGES.substitute(celeb=celeb, needs=needs_txt)
-
-    resp = client.responses.create(
+    """STEP 1: GPT web_search 로 이미지 URL 3~5개 선정. 같은 (연예인, 니즈 집합) 은 캐시에서 반환."""
+    key = (celeb, tuple(sorted(needs)))
+    with _select_cache_lock:
+        cached = _select_cache.get(key)
+    if cached is not None:
+        # 호출자가 결과 dict 를 수정해도 캐시가 오염되지 않도록 복사본 반환
+        return [dict(x) for x in cached]
+
+    # 니즈 순서와 무관하게 같은 입력 → 같은 결과가 되도록 정렬된 순서로 프롬프트 구성
+    needs_txt = ", ".join(key[1])
+
+    # 스트리밍으로 받아서 JSON 객체가 닫히는 시점에 바로 종료 (뒤에 붙는 설명/공백 토큰을 기다리지 않음)
+    stream = get_client().responses.create(
         model=MODEL,
         tools=[{"type": "web_search"}],
         tool_choice="auto",
-        input=prompt,
+        instructions=SELECT_IMAGES_INSTRUCTIONS,
+        input=f"연예인: {celeb}\n니즈: {needs_txt}",
+        text=_SELECT_IMAGES_FORMAT,
+        stream=True,
     )
+    text = collect_response_json_stream(stream)
 
-    text = resp.output_text
-    try:
-        data = json.loads(text)
-    except:
-        # fallback parsing
-        s = text.find("{")
-        e = text.rfind("}")
-        data = json.loads(text[s:e+1])
-
-    images = data.get("selected_images", [])
+    data = _parse_json_object(text)
+    if data is None:
+        print(f"[quick_web_outfit] select_images_from_web: JSON 파싱 실패, text={text.strip()[:200]!r}")
+        return []
+
+    images = data.get("selected_images")
+    if not isinstance(images, list):
+        print(f"[quick_web_outfit] select_images_from_web: selected_images 없음, text={text.strip()[:200]!r}")
+        return []
     clean = []
     for it in images:
-        if it.get("image_url"):
+        # 스키마와 다른 항목 (문자열 / null 등) 은 건너뜀
+        if isinstance(it, dict) and it.get("image_url"):
             clean.append({
                 "image_url": it["image_url"],
                 "source_url": it.get("source_url", "")
             })
+    if clean:
+        with _select_cache_lock:
+            _select_cache[key] = clean
+        return [dict(x) for x in clean]
     return clean
 
 
@@ -92,10 +151,11 @@ def quick_outfit_from_web(celeb: str, needs: List[str]) -> Dict[str, Any]:
     vision_json = analyze_outfit_with_gpt(image_urls)
 
     # Vision 결과의 looks에 source_url 붙이기
+    # (다운로드 실패 / 중복 URL 은 look 이 없어서 순서 대신 look 의 image_url 로 매칭)
+    source_by_url = {x["image_url"]: x.get("source_url") for x in selected}
     looks = vision_json.get("looks", [])
-    for i, look in enumerate(looks):
-        if i < len(selected):
-            look["source_url"] = selected[i].get("source_url")
+    for look in looks:
+        look["source_url"] = source_by_url.get(look.get("image_url"))
 
     total = time.perf_counter() - t0
     print(f"[A] TOTAL = {total:.2f} sec")
@@ -118,4 +178,4 @@ if __name__ == "__main__":
     needs = [s.strip() for s in needs_arg.split(",") if s.strip()]
 
     result = quick_outfit_from_web(celeb, needs)
-    print(json.dumps(result, ensure_ascii=False, indent=2))
+    print(fastjson.dumps_pretty(result))
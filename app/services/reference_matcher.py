@@ -1,13 +1,59 @@
 # app/services/reference_matcher.py
 '''
     유저 벡터와 DB 내 연예인 프로필 벡터 간 cosine similarity 계산 후 Top-K 반환.
+
+    - DB 로드 시점에 CelebIndex.from_vectors(celeb_vectors) 로 한 번 만들어 두고 호출자가 들고 재사용
+      (벡터가 바뀌면 호출자가 CelebIndex 를 다시 만듦)
+    - dict 를 그대로 넘겨도 동작하지만 호출마다 행렬을 새로 만듦 (캐시 없음)
 '''
 import numpy as np
 
 def cosine(a, b):
     return float(np.dot(a, b) / (np.linalg.norm(a)*np.linalg.norm(b) + 1e-8))
 
+class CelebIndex:
+    '''
+        연예인 id 목록과 같은 순서의 (N, D) 행렬.
+        - M 은 float32, C-contiguous, 행마다 L2 정규화 완료 → 매칭 시 행렬-벡터 곱 1번
+    '''
+    __slots__ = ("ids", "M")
+
+    def __init__(self, ids, M):
+        self.ids = list(ids)
+        self.M = M
+
+    @classmethod
+    def from_vectors(cls, celeb_vectors):
+        ids = list(celeb_vectors)
+        if not ids:
+            return cls([], np.zeros((0, 0), dtype=np.float32))
+        M = np.ascontiguousarray(
+            np.stack([np.asarray(celeb_vectors[c], dtype=np.float32) for c in ids]))
+        M /= np.linalg.norm(M, axis=1, keepdims=True) + 1e-8
+        return cls(ids, M)
+
+    def __len__(self):
+        return len(self.ids)
+
 def match_user_to_references(user_vec, celeb_vectors, k=5):
-    sims = [(cid, cosine(user_vec, vec)) for cid, vec in celeb_vectors.items()]
-    sims.sort(key=lambda x: x[1], reverse=True)
-    return sims[:k]
+    '''celeb_vectors: CelebIndex 또는 {celeb_id: vector} dict'''
+    if not len(celeb_vectors) or k <= 0:
+        return []
+    index = celeb_vectors if isinstance(celeb_vectors, CelebIndex) else CelebIndex.from_vectors(celeb_vectors)
+    ids, M = index.ids, index.M
+
+    u = np.asarray(user_vec, dtype=np.float32)
+    sims = M @ (u / (np.linalg.norm(u) + 1e-8))
+
+    # 상위 k 개만 부분 정렬, 동점이면 입력 순서 유지 (기존 전체 stable sort 와 같은 규칙)
+    # argpartition 은 k 번째 경계의 동점 중 아무거나 고르므로
+    # 경계값보다 큰 것 전부 + 경계값과 같은 것 중 입력 순서가 앞선 것만 채움
+    if k < len(ids):
+        kth = -np.partition(-sims, k - 1)[k - 1]
+        above = np.flatnonzero(sims > kth)
+        ties = np.flatnonzero(sims == kth)[: k - len(above)]
+        idx = np.sort(np.concatenate([above, ties]))
+    else:
+        idx = np.arange(len(ids))
+    idx = idx[np.argsort(-sims[idx], kind="stable")]
+    return [(ids[i], float(sims[i])) for i in idx]
@@ -1,7 +1,7 @@
 # app/services/style_from_outfit.py
 from __future__ import annotations
 from typing import Dict, Any, List
-from outfit_embedding import style_to_vec
+from .outfit_embedding import style_vec_from_dicts
 
 def outfit_to_cloth_like_items(outfit_json: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
@@ -25,6 +25,7 @@ def outfit_to_cloth_like_items(outfit_json: Dict[str, Any]) -> List[Dict[str, An
     """
     items: List[Dict[str, Any]] = []
 
+    # 속성만 먼저 모으고 벡터는 마지막에 한 번에 생성 (garment 마다 style_to_vec 호출 대신)
     for look in outfit_json.get("looks", []) or []:
         for g in look.get("garments", []) or []:
             cat  = (g.get("category") or "unknown").lower()
@@ -34,15 +35,6 @@ def outfit_to_cloth_like_items(outfit_json: Dict[str, Any]) -> List[Dict[str, An
             fit  = (g.get("fit") or "unknown").lower()
             seas = (g.get("season") or "all").lower()
 
-            vec = style_to_vec(
-                category=cat,
-                sub_category=sub,
-                style=sty,
-                color=col,
-                fit=fit,
-                season=seas,
-            )
-
             items.append(
                 {
                     "name": g.get("name") or "",
@@ -52,8 +44,11 @@ def outfit_to_cloth_like_items(outfit_json: Dict[str, Any]) -> List[Dict[str, An
                     "color": col,
                     "fit": fit,
                     "season": seas,
-                    "vector": vec,
                 }
             )
 
+    vecs = style_vec_from_dicts(items).tolist()
+    for it, vec in zip(items, vecs):
+        it["vector"] = vec
+
     return items
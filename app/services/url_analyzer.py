@@ -2,26 +2,88 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any
 
-from .url_loader import fetch_image_bgr_from_url
+from cachetools import TTLCache
+
+from .url_loader import fetch_image_bytes_from_url, decode_image_bgr
 from ..classifiers import face as face_mod
 from ..classifiers import body as body_mod
 from ..classifiers import skin as skin_mod
+from ..classifiers._detectors import detect_face_landmarks
+from ..utils.model_pool import POOL_SIZE
+from ..utils.result_cache import content_key, get_cached, set_cached
+
+
+# URL → 분석 결과 캐시
+# - URL 이 가리키는 이미지는 바뀔 수 있으므로 TTL 로 만료 (기본 5분)
+# - 다운로드한 bgr 이 아니라 최종 결과 dict 를 저장 (두 엔드포인트가 쓰는 게 이것)
+URL_CACHE_SIZE = int(os.getenv("URL_CACHE_SIZE", "256"))
+URL_CACHE_TTL = float(os.getenv("URL_CACHE_TTL", "300"))
+
+_url_cache: TTLCache = TTLCache(maxsize=URL_CACHE_SIZE, ttl=URL_CACHE_TTL)
+_url_cache_lock = threading.Lock()
+
+# body 분류를 face/skin 과 동시에 돌릴 스레드풀
+# - 서로 입력(bgr)만 읽고 상태 공유가 없어서 겹쳐 실행 가능 (MediaPipe / OpenCV 는 GIL 을 풀고 실행)
+# - Pose 인스턴스가 POOL_SIZE 개라 그 이상 스레드를 둬도 풀에서 대기만 함
+_BODY_POOL = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="url-body")
 
 
 def analyze_image_from_url(image_url: str) -> Dict[str, Any]:
     """
     단일 image_url에 대해 face/body/skin classifier를 모두 실행.
+    같은 URL 이 URL_CACHE_TTL 초 안에 다시 들어오면 다운로드/추론 없이 캐시 결과 반환.
     """
-    bgr = fetch_image_bgr_from_url(image_url)
+    with _url_cache_lock:
+        cached = _url_cache.get(image_url)
+    if cached is not None:
+        return cached
+
+    result = _analyze_image_from_url(image_url)
+
+    with _url_cache_lock:
+        _url_cache[image_url] = result
+    return result
+
+
+def clear_url_cache() -> int:
+    """URL 분석 캐시 전체 삭제. 삭제된 항목 수 반환."""
+    with _url_cache_lock:
+        n = len(_url_cache)
+        _url_cache.clear()
+    return n
+
+
+def _analyze_image_from_url(image_url: str) -> Dict[str, Any]:
+    # URL 캐시와 별도로 이미지 내용(bytes 해시) 기준 결과 캐시
+    # - presigned URL 처럼 쿼리만 바뀌는 URL / 다른 경로로 다시 올린 같은 사진은 다운로드만 하고 디코딩·추론 생략
+    data = fetch_image_bytes_from_url(image_url)
+    key = content_key(data)
+    res = get_cached("url_image", key)
+    if res is None:
+        bgr = decode_image_bgr(data, image_url)
+        del data  # 디코딩 끝난 원본 bytes 는 추론 전에 해제
+        res = _classify_bgr(bgr)
+        set_cached("url_image", key, res)
+    return {"image_url": image_url, **res}
+
+
+def _classify_bgr(bgr) -> Dict[str, Any]:
+    # body 는 풀 스레드에서, face / skin 은 현재 스레드에서 동시에 실행 → 시간 = 둘 중 긴 쪽
+    body_fut = _BODY_POOL.submit(body_mod.classify, bgr, return_debug=False)
+
+    # face / skin 은 같은 FaceMesh 결과를 공유 (검출 1회)
+    faces = detect_face_landmarks(bgr)
+    face_res, _ = face_mod.classify(bgr, return_debug=False, landmarks=faces)
+    skin_res, _ = skin_mod.classify(bgr, return_debug=False, landmarks=faces)
 
-    face_res, _ = face_mod.classify(bgr, return_debug=False)
-    body_res, _ = body_mod.classify(bgr, return_debug=False)
-    skin_res, _ = skin_mod.classify(bgr, return_debug=False)
+    body_res, _ = body_fut.result()
 
     return {
-        "image_url": image_url,
         "face": face_res,
         "body": body_res,
         "skin": skin_res,
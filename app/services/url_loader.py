@@ -4,34 +4,128 @@
 from __future__ import annotations
 
 import io
+import os
+import threading
 from typing import Optional
 
 import requests
 import numpy as np
 import cv2
+from cachetools import TTLCache
 
-from ..utils.image_io import load_image_bgr_from_bytes
+from ..utils.image_io import load_image_bgr_from_bytes, resize_max_side
+from ._http import get_session, split_timeout
+
+# 다운로드한 이미지의 긴 변 최대 길이 (0 이면 원본 그대로)
+# - S3 원본은 2~4K 가 흔한데 MediaPipe 모델 입력은 256px 안팎이라 그 이상 해상도는 분석에 안 쓰임
+# - 분류 결과는 비율 기반이라 축소해도 같고, skin ROI 색 통계 / 세그멘테이션 행 측정 비용이 픽셀 수만큼 줄어듦
+URL_IMAGE_MAX_SIDE = int(os.getenv("URL_IMAGE_MAX_SIDE", "1024"))
+# 다운로드 최대 크기 (이보다 크면 본문을 끝까지 받지 않고 중단)
+URL_MAX_DOWNLOAD_BYTES = int(os.getenv("URL_MAX_DOWNLOAD_BYTES", str(8 * 1024 * 1024)))
+_FETCH_CHUNK = 64 * 1024
+# S3 는 이미지도 application/octet-stream 으로 주는 경우가 있어서 image/* 만 허용하지 않고 확실히 아닌 타입만 거름
+_NON_IMAGE_TYPES = ("text/", "video/", "audio/", "application/json", "application/xml")
+
+# URL → (ETag, Last-Modified, 원본 bytes) 조건부 GET 캐시
+# - 다시 받을 때 If-None-Match / If-Modified-Since 를 붙여서 304 면 본문 없이 저장해 둔 bytes 재사용
+#   (S3 는 객체마다 고정 ETag 를 줌, URL 분석 캐시 TTL 이 지난 뒤 같은 URL 이 다시 와도 본문 재다운로드 생략)
+# - 크기 기준 (bytes 합계) + TTL, 검증 헤더가 없는 응답은 저장하지 않음
+URL_HTTP_CACHE_BYTES = int(os.getenv("URL_HTTP_CACHE_BYTES", str(64 * 1024 * 1024)))
+URL_HTTP_CACHE_TTL = float(os.getenv("URL_HTTP_CACHE_TTL", "3600"))
+
+_http_cache: TTLCache = TTLCache(maxsize=URL_HTTP_CACHE_BYTES, ttl=URL_HTTP_CACHE_TTL,
+                                 getsizeof=lambda entry: len(entry[2]))
+_http_cache_lock = threading.Lock()
+
+
+def clear_http_cache() -> int:
+    """조건부 GET 캐시 전체 삭제. 삭제된 항목 수 반환."""
+    with _http_cache_lock:
+        n = len(_http_cache)
+        _http_cache.clear()
+    return n
 
 
 class ImageDownloadError(Exception):
     pass
 
 
-def fetch_image_bgr_from_url(image_url: str, timeout: float = 5.0) -> np.ndarray:
+def fetch_image_bytes_from_url(
+    image_url: str,
+    timeout: float = 5.0,
+    max_bytes: int = URL_MAX_DOWNLOAD_BYTES,
+) -> bytes:
     """
-    S3 등에서 호스팅되는 image_url을 받아서
-    OpenCV BGR 이미지로 반환하는 헬퍼.
-
-    - timeout: 다운로드 최대 대기 시간
+    image_url 원본 bytes 다운로드 (디코딩 전에 내용 해시로 캐시를 보려는 호출부용).
+    HTML 에러 페이지 / 동영상 / max_bytes 보다 큰 파일은 본문을 다 받기 전에 ImageDownloadError.
+    전에 받은 URL 이면 조건부 GET 으로 보내고 304 면 저장해 둔 bytes 반환.
     """
+    with _http_cache_lock:
+        entry = _http_cache.get(image_url)
+    headers = {}
+    if entry is not None:
+        etag, last_modified, _ = entry
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
     try:
-        resp = requests.get(image_url, timeout=timeout)
-        resp.raise_for_status()
+        with get_session().get(image_url, headers=headers, timeout=split_timeout(timeout), stream=True) as r:
+            if entry is not None and r.status_code == 304:
+                return entry[2]
+            r.raise_for_status()
+            # stream=True 라 여기까지는 헤더만 받은 상태
+            content_type = r.headers.get("Content-Type", "").lower()
+            if content_type.startswith(_NON_IMAGE_TYPES):
+                raise ImageDownloadError(f"Not an image ({content_type}): {image_url}")
+            length = r.headers.get("Content-Length")
+            if length and length.isdigit() and int(length) > max_bytes:
+                raise ImageDownloadError(f"Image too large ({length} bytes): {image_url}")
+            buf = bytearray()
+            for chunk in r.iter_content(chunk_size=_FETCH_CHUNK):
+                buf += chunk
+                # Content-Length 가 없거나 틀린 경우 대비
+                if len(buf) > max_bytes:
+                    raise ImageDownloadError(f"Image too large (>{max_bytes} bytes): {image_url}")
+            etag = r.headers.get("ETag")
+            last_modified = r.headers.get("Last-Modified")
     except requests.RequestException as e:
         raise ImageDownloadError(f"Failed to download image: {image_url}") from e
 
+    data = bytes(buf)
+    if etag or last_modified:
+        with _http_cache_lock:
+            try:
+                _http_cache[image_url] = (etag, last_modified, data)
+            except ValueError:
+                # 캐시 전체 크기보다 큰 이미지는 저장하지 않음
+                pass
+    return data
+
+
+def decode_image_bgr(data: bytes, image_url: str = "", max_side: int = URL_IMAGE_MAX_SIDE) -> np.ndarray:
+    """다운로드한 bytes → BGR (긴 변이 max_side 보다 크면 축소, 0 이면 원본 해상도 유지)."""
     # 기존 util 재사용
-    bgr = load_image_bgr_from_bytes(resp.content)
+    # 큰 JPEG 은 디코딩 단계에서 먼저 1/2~1/8 로 줄이고 남은 만큼만 resize
+    bgr = load_image_bgr_from_bytes(data, max_side=max_side)
     if bgr is None:
         raise ImageDownloadError(f"Cannot decode image: {image_url}")
+    if max_side > 0:
+        bgr = resize_max_side(bgr, max_side)
     return bgr
+
+
+def fetch_image_bgr_from_url(
+    image_url: str,
+    timeout: float = 5.0,
+    max_side: int = URL_IMAGE_MAX_SIDE,
+) -> np.ndarray:
+    """
+    S3 등에서 호스팅되는 image_url을 받아서
+    OpenCV BGR 이미지로 반환하는 헬퍼.
+
+    - timeout: 다운로드 최대 대기 시간
+    - max_side: 긴 변이 이보다 크면 디코딩 직후 축소 (0 이면 원본 해상도 유지)
+    """
+    return decode_image_bgr(fetch_image_bytes_from_url(image_url, timeout), image_url, max_side)
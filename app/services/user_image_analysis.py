@@ -1,11 +1,16 @@
 # app/services/user_image_analysis.py
 # -*- coding: utf-8 -*-
 from __future__ import annotations
+import asyncio
+import os
 from typing import Optional, Dict, Any, List
 
 from app.clients.backend_client import fetch_user_images
 from .url_analyzer import analyze_image_from_url
 
+# analyze_all_body_images 에서 동시에 분석할 최대 이미지 수 (다운로드 + 분류기 1세트씩 스레드 하나)
+BODY_ANALYZE_MAX_CONCURRENCY = int(os.getenv("BODY_ANALYZE_MAX_CONCURRENCY", "16"))
+
 
 async def analyze_latest_body_image(token: Optional[str] = None) -> Optional[Dict[str, Any]]:
     """
@@ -13,30 +18,43 @@ async def analyze_latest_body_image(token: Optional[str] = None) -> Optional[Dic
     가장 최근 한 장에 대해 분석을 수행.
     """
     data = await fetch_user_images(token=token)
-    # created_at 기준으로 BODY만 필터 후 최신순 정렬
-    body_images = [img for img in data.images if img.image_type.upper() == "BODY"]
-
-    if not body_images:
+    # BODY 만 골라서 created_at 이 가장 큰 것 한 장 (정렬/중간 리스트 없이 한 번 순회)
+    latest = max((img for img in data.images if img.image_type.upper() == "BODY"),
+                 key=lambda x: x.created_at, default=None)
+    if latest is None:
         return None
 
-    # 가장 최근 것 (created_at이 문자열이라면 그냥 마지막으로 가정해도 됨)
-    latest = sorted(body_images, key=lambda x: x.created_at)[-1]
     return analyze_image_from_url(latest.image_url)
 
 
-async def analyze_all_body_images(token: Optional[str] = None) -> List[Dict[str, Any]]:
+async def analyze_all_body_images(
+    token: Optional[str] = None,
+    max_concurrency: int = BODY_ANALYZE_MAX_CONCURRENCY,
+) -> List[Dict[str, Any]]:
     """
     BODY 이미지 전부에 대해 분석 (비용 크니까 필요할 때만 사용)
+    이미지마다 다운로드 대기가 대부분이라 스레드에서 동시에 실행 (최대 max_concurrency 개).
+    같은 URL 은 한 번만 분석하고 결과를 공유. 결과는 입력 순서대로, 실패한 이미지는 빠짐.
     """
     data = await fetch_user_images(token=token)
     body_images = [img for img in data.images if img.image_type.upper() == "BODY"]
 
-    results: List[Dict[str, Any]] = []
-    for img in body_images:
-        try:
-            res = analyze_image_from_url(img.image_url)
-            results.append(res)
-        except Exception as e:
+    # 중복 URL 제거 (순서 유지) → 동시에 들어간 같은 URL 이 URL 캐시에 저장되기 전에 두 번 다운로드/분석되지 않게
+    urls = list(dict.fromkeys(img.image_url for img in body_images))
+
+    sem = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def _one(image_url: str) -> Dict[str, Any]:
+        async with sem:
+            return await asyncio.to_thread(analyze_image_from_url, image_url)
+
+    outs = await asyncio.gather(*[_one(url) for url in urls], return_exceptions=True)
+
+    by_url: Dict[str, Dict[str, Any]] = {}
+    for url, res in zip(urls, outs):
+        if isinstance(res, Exception):
             # 개별 실패는 무시하고 계속
-            print(f"[WARN] analyze failed for {img.image_url}: {e}")
-    return results
+            print(f"[WARN] analyze failed for {url}: {res}")
+            continue
+        by_url[url] = res
+    return [by_url[img.image_url] for img in body_images if img.image_url in by_url]
@@ -0,0 +1,108 @@
+# app/services/vision_preprocess.py
+# -*- coding: utf-8 -*-
+"""
+Vision API 입력 이미지 전처리.
+
+- S3 원본 URL 을 그대로 넘기면 제공자가 풀 해상도(2000px+)로 받아서 vision 토큰이 크게 늘어난다.
+- 여기서 직접 받아 긴 변을 max_side 로 줄이고 JPEG(base64 data URL)로 넘긴다.
+  기본은 detail="low" (태깅 용도로 충분), fine_grained=True 일 때만 "high".
+- 줄인 JPEG bytes 는 URL 해시로 디스크에 저장해 두고 재분석 시 다운로드/리사이즈 생략.
+
+환경변수:
+    VISION_MAX_SIDE     : 긴 변 최대 길이 (기본 768)
+    VISION_JPEG_QUALITY : JPEG 품질 (기본 85)
+    VISION_CACHE_DIR    : 전처리 결과 저장 폴더 (기본 .cache/vision, 빈 값이면 디스크 캐시 끔)
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import io
+import os
+import threading
+from typing import Dict, Optional
+
+from PIL import Image, ImageOps
+
+from ._http import get_session, split_timeout
+
+VISION_MAX_SIDE = int(os.getenv("VISION_MAX_SIDE", "768"))
+VISION_JPEG_QUALITY = int(os.getenv("VISION_JPEG_QUALITY", "85"))
+VISION_CACHE_DIR = os.getenv("VISION_CACHE_DIR", os.path.join(".cache", "vision"))
+
+
+def _cache_path(url: str, max_side: int) -> Optional[str]:
+    if not VISION_CACHE_DIR:
+        return None
+    key = hashlib.sha256(f"{max_side}|{url}".encode("utf-8")).hexdigest()
+    return os.path.join(VISION_CACHE_DIR, f"{key}.jpg")
+
+
+def downscale_jpeg(data: bytes, max_side: int) -> bytes:
+    """원본 이미지 bytes → 긴 변 max_side 이하 RGB JPEG bytes."""
+    img = Image.open(io.BytesIO(data))
+    # JPEG 는 디코딩 단계에서 1/2, 1/4, 1/8 로 바로 줄여서 읽음 (풀 해상도 디코딩 생략)
+    img.draft("RGB", (max_side, max_side))
+    img = ImageOps.exif_transpose(img)
+
+    if img.mode in ("RGBA", "LA", "P"):
+        # 투명 배경 상품 PNG 는 흰 배경 위에 합성 (그냥 RGB 로 바꾸면 검은 배경이 되어 색 판단이 틀어짐)
+        img = img.convert("RGBA")
+        bg = Image.new("RGB", img.size, (255, 255, 255))
+        bg.paste(img, mask=img.getchannel("A"))
+        img = bg
+    elif img.mode != "RGB":
+        img = img.convert("RGB")
+
+    img.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=VISION_JPEG_QUALITY, optimize=True)
+    return out.getvalue()
+
+
+def prepare_image(
+    url: str,
+    max_side: int = VISION_MAX_SIDE,
+    fine_grained: bool = False,
+    timeout: float = 8.0,
+) -> Dict[str, str]:
+    """
+    이미지 URL → chat.completions 의 image_url dict.
+    {"url": "data:image/jpeg;base64,...", "detail": "low" | "high"}
+
+    다운로드/디코딩에 실패하면 원본 URL 을 그대로 넘김 (기존 동작과 동일, 제공자가 직접 다운로드)
+    """
+    detail = "high" if fine_grained else "low"
+    path = _cache_path(url, max_side)
+
+    jpeg: Optional[bytes] = None
+    if path and os.path.exists(path):
+        try:
+            with open(path, "rb") as f:
+                jpeg = f.read()
+        except OSError:
+            jpeg = None
+
+    if jpeg is None:
+        try:
+            r = get_session().get(url, timeout=split_timeout(timeout))
+            r.raise_for_status()
+            jpeg = downscale_jpeg(r.content, max_side)
+        except Exception as e:
+            print(f"[vision_preprocess] prepare_image ERROR url={url}, err={e}")
+            return {"url": url, "detail": detail}
+
+        if path:
+            try:
+                os.makedirs(VISION_CACHE_DIR, exist_ok=True)
+                # 동시에 같은 URL 을 쓰는 경우를 대비해 임시 파일에 쓰고 교체
+                tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(jpeg)
+                os.replace(tmp, path)
+            except OSError as e:
+                print(f"[vision_preprocess] cache write ERROR path={path}, err={e}")
+
+    b64 = base64.b64encode(jpeg).decode("ascii")
+    return {"url": f"data:image/jpeg;base64,{b64}", "detail": detail}
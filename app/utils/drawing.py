@@ -0,0 +1,23 @@
+# app/utils/drawing.py
+# -*- coding: utf-8 -*-
+"""
+MediaPipe drawing 스타일 헬퍼.
+
+- 기존 draw_debug 는 BGR → RGB 복사본에 그린 뒤 다시 BGR 로 변환했다 (풀 해상도 복사 2번).
+- 같은 결과를 BGR 버퍼에 바로 그리려면 DrawingSpec.color 의 앞/뒤 채널만 바꿔주면 된다.
+"""
+from __future__ import annotations
+
+import dataclasses
+from typing import Dict, Union
+
+from mediapipe.python.solutions.drawing_utils import DrawingSpec
+
+Style = Union[DrawingSpec, Dict[object, DrawingSpec]]
+
+
+def swap_rb(style: Style) -> Style:
+    """DrawingSpec 또는 {key: DrawingSpec} 스타일의 color (c0, c1, c2) → (c2, c1, c0)."""
+    if isinstance(style, DrawingSpec):
+        return dataclasses.replace(style, color=style.color[::-1])
+    return {k: swap_rb(spec) for k, spec in style.items()}
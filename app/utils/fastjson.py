@@ -0,0 +1,39 @@
+# app/utils/fastjson.py
+# -*- coding: utf-8 -*-
+"""
+orjson 이 설치돼 있으면 orjson, 없으면 표준 json 을 쓰는 loads / dumps.
+(GPT 응답 파싱, 프롬프트용 입력 직렬화, 캐시 파일 저장 등에서 사용)
+
+- loads(str | bytes) → 객체. 깨진 JSON 이면 JSONDecodeError (ValueError 하위 클래스)
+- dumps(obj) → str. 한글 등 비 ASCII 문자는 escape 하지 않음 (json.dumps(ensure_ascii=False) 와 같은 내용, 공백 없는 compact 형식)
+- dumps_pretty(obj) → str. dumps 와 같지만 2칸 들여쓰기 (CLI / 벤치마크 출력용)
+"""
+from __future__ import annotations
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson.JSONDecodeError 도 json.JSONDecodeError 를 상속하므로 이것 하나로 둘 다 잡힘
+JSONDecodeError = json.JSONDecodeError
+
+if orjson is not None:
+    loads = orjson.loads
+
+    def dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+
+    def dumps_pretty(obj: Any) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode("utf-8")
+else:
+    loads = json.loads
+
+    def dumps(obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+    def dumps_pretty(obj: Any) -> str:
+        return json.dumps(obj, ensure_ascii=False, indent=2)
@@ -1,34 +1,147 @@
-import sys, os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import os
 import io
+import threading
 import numpy as np
 from PIL import Image
 import cv2
 
+# JPEG 디코딩은 libjpeg-turbo(SIMD)가 있으면 그걸 사용, 없으면 PIL fallback
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR
+    _turbo = TurboJPEG()
+except (ImportError, RuntimeError, OSError):
+    # 패키지 미설치 / libturbojpeg 공유 라이브러리 못 찾음
+    _turbo = None
+
+_JPEG_MAGIC = b"\xff\xd8"
+
+# 디버그 오버레이 PNG 압축 레벨 (0~9). 무손실은 유지하되 zlib 비용이 큰 기본값(3) 대신 1
+DEBUG_PNG_LEVEL = int(os.getenv("DEBUG_PNG_LEVEL", "1"))
+# cv2.imencode / imwrite 에 그대로 넘기는 PNG 인코딩 파라미터 (호출마다 리스트 만들지 않도록)
+DEBUG_ENCODE_PARAMS = [int(cv2.IMWRITE_PNG_COMPRESSION), DEBUG_PNG_LEVEL]
+# 디버그 오버레이를 JPEG 로 저장할 때 품질 (배치 스크립트용, 눈으로 확인하는 용도라 85 면 충분)
+DEBUG_JPEG_QUALITY = int(os.getenv("DEBUG_JPEG_QUALITY", "85"))
+DEBUG_JPEG_PARAMS = [int(cv2.IMWRITE_JPEG_QUALITY), DEBUG_JPEG_QUALITY]
+
+# OpenCV 디코딩 플래그. EXIF 회전은 적용하지 않음 (TurboJPEG / PIL 경로와 같은 결과)
+_IMREAD_FLAGS = cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION
+# JPEG 축소 디코딩 (IDCT 단계에서 1/2, 1/4, 1/8 로 바로 줄여서 디코딩) 배율별 OpenCV 플래그
+_IMREAD_REDUCED = {
+    2: cv2.IMREAD_REDUCED_COLOR_2 | cv2.IMREAD_IGNORE_ORIENTATION,
+    4: cv2.IMREAD_REDUCED_COLOR_4 | cv2.IMREAD_IGNORE_ORIENTATION,
+    8: cv2.IMREAD_REDUCED_COLOR_8 | cv2.IMREAD_IGNORE_ORIENTATION,
+}
+
+def _pil_to_bgr(img: Image.Image) -> np.ndarray:
+    # cvtColor 결과는 연속(contiguous) 배열 ([:, :, ::-1] view 는 이후 OpenCV 호출마다 복사됨)
+    return cv2.cvtColor(np.asarray(img.convert("RGB")), cv2.COLOR_RGB2BGR)
+
 def load_image_bgr_from_path(path: str) -> np.ndarray:
     """Read image from path as BGR numpy array."""
-    img = Image.open(path).convert("RGB")
-    return np.array(img)[:, :, ::-1]  # RGB -> BGR
+    bgr = cv2.imread(path, _IMREAD_FLAGS)
+    if bgr is not None:
+        return bgr
+    # OpenCV 가 못 여는 경로/포맷 (비 ASCII 경로, 일부 GIF 등) 은 PIL 로
+    return _pil_to_bgr(Image.open(path))
+
+def _jpeg_reduce_factor(data: bytes, max_side: int) -> int:
+    """
+    축소 디코딩 배율 (1, 2, 4, 8). 줄인 결과의 긴 변이 max_side 이상으로 남는 가장 큰 배율.
+    크기는 JPEG 헤더만 읽어서 판단 (본문 디코딩 없음)
+    """
+    try:
+        if _turbo is not None:
+            w, h = _turbo.decode_header(data)[:2]
+        else:
+            w, h = Image.open(io.BytesIO(data)).size
+    except Exception:
+        return 1
+    long_side = max(w, h)
+    r = 1
+    while r < 8 and long_side // (r * 2) >= max_side:
+        r *= 2
+    return r
 
-def load_image_bgr_from_bytes(data: bytes) -> np.ndarray:
-    """Read image from raw bytes as BGR numpy array."""
-    img = Image.open(io.BytesIO(data)).convert("RGB")
-    return np.array(img)[:, :, ::-1]
+def load_image_bgr_from_bytes(data: bytes, max_side: int = 0) -> np.ndarray:
+    """
+    Read image from raw bytes as BGR numpy array.
+    max_side > 0 이면 큰 JPEG 은 긴 변이 max_side 이상인 범위에서 1/2~1/8 로 줄여서 디코딩
+    (정확히 max_side 로 맞추는 건 호출부의 resize_max_side 몫, 풀 해상도 디코딩 + 큰 resize 를 생략하는 용도)
+    """
+    is_jpeg = data[:2] == _JPEG_MAGIC
+    reduce = _jpeg_reduce_factor(data, max_side) if is_jpeg and max_side > 0 else 1
+    if _turbo is not None and is_jpeg:
+        try:
+            if reduce > 1:
+                return _turbo.decode(data, pixel_format=TJPF_BGR, scaling_factor=(1, reduce))
+            return _turbo.decode(data, pixel_format=TJPF_BGR)
+        except Exception:
+            pass  # 깨진/특이한 JPEG 은 OpenCV 로 다시 시도
+    # libjpeg-turbo / libpng 로 바로 BGR 디코딩 (RGB 변환 + 채널 뒤집기 없음)
+    bgr = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), _IMREAD_REDUCED.get(reduce, _IMREAD_FLAGS))
+    if bgr is not None:
+        return bgr
+    # OpenCV 가 지원하지 않는 포맷은 PIL 로 (디코딩 불가면 PIL 예외 그대로)
+    return _pil_to_bgr(Image.open(io.BytesIO(data)))
 
 def to_rgb(bgr: np.ndarray) -> np.ndarray:
     return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
 
-def crop_safe(img: np.ndarray, x1:int, y1:int, x2:int, y2:int) -> np.ndarray: 
-    h, w = img.shape[:2] 
-    x1, y1 = max(0, x1), max(0, y1) 
-    x2, y2 = min(w, x2), min(h, y2) 
-    if x2 <= x1 or y2 <= y1: return img[0:0, 0:0] 
+# MediaPipe 입력 최대 변 길이 (모델 내부 입력은 256px 안팎이라 그 이상은 resize 비용만 듦)
+MAX_INFER_SIDE = int(os.getenv("MAX_INFER_SIDE", "768"))
+
+def resize_max_side(bgr: np.ndarray, max_side: int) -> np.ndarray:
+    """긴 변이 max_side 보다 크면 비율 유지하며 INTER_AREA 로 축소 (작으면 그대로 반환)."""
+    h, w = bgr.shape[:2]
+    scale = max_side / float(max(h, w))
+    if scale >= 1.0:
+        return bgr
+    size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+    return cv2.resize(bgr, size, interpolation=cv2.INTER_AREA)
+
+# to_rgb_for_inference 결과를 담는 스레드별 재사용 버퍼 (같은 크기면 매 호출 할당 안 함)
+_scratch = threading.local()
+
+def to_rgb_for_inference(bgr: np.ndarray, max_side: int = MAX_INFER_SIDE) -> np.ndarray:
+    """
+    MediaPipe process() 입력용 RGB.
+    긴 변이 max_side 보다 크면 먼저 INTER_AREA 로 줄이고 나서 RGB 변환.
+    (landmark는 정규화 좌표라 호출 측에서 원본 w/h 를 곱하면 원본 픽셀 단위 그대로)
+
+    주의: 반환 배열은 스레드별 scratch 버퍼라 같은 스레드에서 다음 호출 때 덮어써짐.
+          process() 는 입력을 복사해서 쓰므로 바로 넘기는 용도로만 사용.
+    """
+    bgr = resize_max_side(bgr, max_side)
+
+    buf = getattr(_scratch, "rgb", None)
+    if buf is None or buf.shape != bgr.shape or buf.dtype != bgr.dtype:
+        buf = np.empty_like(bgr)
+        _scratch.rgb = buf
+    return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB, dst=buf)
+
+def crop_safe(img: np.ndarray, x1:int, y1:int, x2:int, y2:int) -> np.ndarray:
+    # 얼굴/옷 영역마다 호출되므로 min/max 내장함수 호출 대신 조건식으로 경계 보정
+    h, w = img.shape[:2]
+    if x1 < 0: x1 = 0
+    if y1 < 0: y1 = 0
+    if x2 > w: x2 = w
+    if y2 > h: y2 = h
+    if x2 <= x1 or y2 <= y1: return img[0:0, 0:0]
     return img[y1:y2, x1:x2]
 
 def save_bgr(path: str, bgr: np.ndarray) -> None:
     # 디렉터리 자동 생성 없이 단순 저장 (필요하면 os.makedirs 추가)
-    cv2.imwrite(path, bgr)
+    # .png 는 디버그 이미지 저장용이라 오버레이와 같은 빠른 압축 레벨 사용
+    if path.lower().endswith(".png"):
+        cv2.imwrite(path, bgr, DEBUG_ENCODE_PARAMS)
+    else:
+        cv2.imwrite(path, bgr)
+
+def bgr_to_png_bytes(bgr: np.ndarray, params: list = DEBUG_ENCODE_PARAMS) -> bytes:
+    success, buf = cv2.imencode(".png", bgr, params)
+    return buf.tobytes() if success else b""
 
-def bgr_to_png_bytes(bgr: np.ndarray) -> bytes:
-    success, buf = cv2.imencode(".png", bgr)
+def bgr_to_jpeg_bytes(bgr: np.ndarray, params: list = DEBUG_JPEG_PARAMS) -> bytes:
+    # PNG(deflate) 보다 인코딩이 몇 배 빠르고 파일도 작음 (무손실이 필요 없는 디버그 저장용)
+    success, buf = cv2.imencode(".jpg", bgr, params)
     return buf.tobytes() if success else b""
@@ -0,0 +1,19 @@
+# app/utils/jit.py
+# -*- coding: utf-8 -*-
+"""
+numba 가 설치돼 있으면 numba.njit, 없으면 원래 Python 함수를 그대로 쓰는 데코레이터.
+(numba 없는 환경에서도 classifier import 가 깨지지 않도록)
+"""
+from __future__ import annotations
+
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        # @njit / @njit(cache=True) 두 형태 모두 지원
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+
+        def deco(fn):
+            return fn
+        return deco
@@ -0,0 +1,27 @@
+# app/utils/landmarks.py
+# -*- coding: utf-8 -*-
+"""
+MediaPipe NormalizedLandmark 리스트 → 픽셀 좌표 배열 변환.
+
+- 랜드마크마다 np.array 를 만들던 _P() 대신, 필요한 점들을 한 번에 (N, 2) 배열로 모은 뒤
+  (w, h) 를 한 번에 곱한다.
+"""
+from __future__ import annotations
+
+from typing import Any, Optional, Sequence
+
+import numpy as np
+
+
+def landmarks_xy(lm: Sequence[Any], w: int, h: int,
+                 idx: Optional[Sequence[int]] = None) -> np.ndarray:
+    """
+    lm  : landmark 리스트 (res.pose_landmarks.landmark / face_lms.landmark)
+    idx : 필요한 landmark 인덱스만 뽑을 때 (None 이면 전체)
+    return: (N, 2) float64, 원본 이미지 픽셀 단위 (x, y)
+    """
+    pts = lm if idx is None else [lm[i] for i in idx]
+    xy = np.fromiter((c for p in pts for c in (p.x, p.y)),
+                     dtype=np.float64, count=2 * len(pts)).reshape(-1, 2)
+    xy *= (w, h)
+    return xy
@@ -0,0 +1,63 @@
+# app/utils/model_pool.py
+# -*- coding: utf-8 -*-
+"""
+MediaPipe solution(Pose/FaceMesh 등) 인스턴스 풀.
+
+- 요청마다 `with mp_xxx.Xxx(...)` 로 만들면 TFLite 그래프를 매번 다시 로드하므로
+  import 시점에 N개를 만들어 두고 재사용한다.
+- solution.process()는 thread-safe 하지 않으므로 한 번에 한 스레드만 한 인스턴스를 사용.
+
+환경변수:
+    MP_POOL_SIZE : 모듈당 인스턴스 개수 (기본 2)
+"""
+from __future__ import annotations
+
+import atexit
+import os
+import queue
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+POOL_SIZE = max(1, int(os.getenv("MP_POOL_SIZE", "2")))
+
+
+class ModelPool:
+    def __init__(self, factory: Callable[[], Any], size: int = POOL_SIZE):
+        self._q: "queue.Queue[Any]" = queue.Queue(maxsize=size)
+        for _ in range(size):
+            self._q.put(factory())
+        # 프로세스 종료 시 MediaPipe 그래프(네이티브 리소스) 정리
+        atexit.register(self.close)
+
+    @contextmanager
+    def acquire(self) -> Iterator[Any]:
+        """풀에서 인스턴스 하나를 빌려오고, 사용 후 반납."""
+        model = self._q.get()
+        try:
+            yield model
+        finally:
+            self._q.put(model)
+
+    def warmup(self, fn: Callable[[Any], Any]) -> None:
+        """
+        풀의 모든 인스턴스에 fn(model) 을 한 번씩 실행 (첫 process() 의 지연 초기화를 미리 소모).
+        전부 꺼내서 돌리고 다시 반납하므로 서버 시작 시점(요청 받기 전)에만 호출.
+        """
+        models = [self._q.get() for _ in range(self._q.maxsize)]
+        try:
+            for m in models:
+                fn(m)
+        finally:
+            for m in models:
+                self._q.put(m)
+
+    def close(self) -> None:
+        """풀에 남아 있는 인스턴스를 모두 꺼내서 close() (종료 시 atexit 로 호출)."""
+        while True:
+            try:
+                model = self._q.get_nowait()
+            except queue.Empty:
+                break
+            close = getattr(model, "close", None)
+            if close is not None:
+                close()
@@ -0,0 +1,53 @@
+# app/utils/result_cache.py
+# -*- coding: utf-8 -*-
+"""
+분석 결과 in-process LRU 캐시.
+
+- 같은 이미지(bytes) / 같은 URL 이 반복해서 들어오면 MediaPipe / GPT 를 다시 돌리지 않고
+  이전 결과를 그대로 돌려준다.
+- key = (namespace, content_key) : namespace 는 엔드포인트 이름 ("face", "clothes" 등)
+
+환경변수:
+    RESULT_CACHE_SIZE : 최대 보관 개수 (기본 512)
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from typing import Any, Hashable, Optional
+
+from cachetools import LRUCache
+
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "512"))
+
+_cache: LRUCache = LRUCache(maxsize=RESULT_CACHE_SIZE)
+_lock = threading.Lock()
+
+
+def content_key(*parts: bytes) -> str:
+    """이미지 bytes(여러 개 가능) → blake2b 해시 문자열."""
+    h = hashlib.blake2b(digest_size=16)
+    for p in parts:
+        # 길이를 같이 넣어서 (a+b, c) 와 (a, b+c) 가 같은 key 가 되지 않게
+        h.update(len(p).to_bytes(8, "little"))
+        h.update(p)
+    return h.hexdigest()
+
+
+def get_cached(namespace: str, key: Hashable) -> Optional[Any]:
+    with _lock:
+        return _cache.get((namespace, key))
+
+
+def set_cached(namespace: str, key: Hashable, value: Any) -> None:
+    with _lock:
+        _cache[(namespace, key)] = value
+
+
+def clear_cache() -> int:
+    """캐시 전체 삭제. 삭제된 항목 수 반환."""
+    with _lock:
+        n = len(_cache)
+        _cache.clear()
+    return n
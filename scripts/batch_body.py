@@ -1,24 +1,42 @@
 import argparse, os, glob
-from app.utils.image_io import load_image_bgr_from_path
-from app.classifiers import body
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+def _process(pth, out_dir):
+    # 워커 프로세스에서 처음 한 번만 import (MediaPipe 그래프는 워커마다 따로 생성, 부모는 로드 안 함)
+    from app.utils.image_io import load_image_bgr_from_path
+    from app.classifiers import body
+
+    # JPEG 입력은 디버그 이미지도 JPEG 로 (PNG 무손실 인코딩보다 빠르고 작음), PNG 입력은 PNG 유지
+    jpeg = pth.lower().endswith((".jpg", ".jpeg"))
+    bgr = load_image_bgr_from_path(pth)
+    res, dbg = body.classify(bgr, return_debug=True, debug_format="jpeg" if jpeg else "png")
+    if dbg:
+        out = os.path.join(out_dir, os.path.splitext(os.path.basename(pth))[0] + (".jpg" if jpeg else ".png"))
+        with open(out, "wb") as f:
+            f.write(dbg)
+    return pth, res
 
 def main():
     p = argparse.ArgumentParser()
     p.add_argument("--input_dir", required=True)
     p.add_argument("--out_dir", required=True)
     p.add_argument("--ext", default="jpg", help="jpg|jpeg|png")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="동시에 돌릴 프로세스 수")
     args = p.parse_args()
 
     os.makedirs(args.out_dir, exist_ok=True)
     paths = sorted(glob.glob(os.path.join(args.input_dir, f"*.{args.ext}")))
-    for i, pth in enumerate(paths, 1):
-        bgr = load_image_bgr_from_path(pth)
-        res, dbg = body.classify(bgr, return_debug=True)
-        print(f"[{i}/{len(paths)}] {os.path.basename(pth)} -> {res}")
-        if dbg:
-            out = os.path.join(args.out_dir, os.path.splitext(os.path.basename(pth))[0] + ".png")
-            with open(out, "wb") as f:
-                f.write(dbg)
+
+    # 워커는 이미지를 한 장씩 처리하므로 MediaPipe 풀 인스턴스 1개면 충분
+    os.environ.setdefault("MP_POOL_SIZE", "1")
+    # fork 는 부모의 스레드/네이티브 상태를 복사하므로 spawn 으로 깨끗한 프로세스 시작
+    with ProcessPoolExecutor(max_workers=max(1, args.workers), mp_context=mp.get_context("spawn")) as ex:
+        # 순서대로 결과를 받음, chunksize 로 이미지 여러 장을 한 번에 넘겨 IPC 횟수 줄임
+        results = ex.map(partial(_process, out_dir=args.out_dir), paths, chunksize=4)
+        for i, (pth, res) in enumerate(results, 1):
+            print(f"[{i}/{len(paths)}] {os.path.basename(pth)} -> {res}")
 
 if __name__ == "__main__":
     main()